@@ -0,0 +1,66 @@
+"""
+Бенчмарк импорта расходов: построчное добавление (add)
+против пакетного (add_many) для sqlite и памяти
+
+Запуск: python -m benchmarks.bulk_import --rows 10000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+def make_expenses(rows: int) -> list[Expense]:
+    """ Создает список расходов для импорта """
+    now = datetime(2023, 1, 1)
+    return [Expense(amount=float(i % 1000), category='продукты',
+                    expense_date=now, added_date=now, comment=f'row {i}')
+            for i in range(rows)]
+
+
+def measure(repo: AbstractRepository, import_func: Callable, rows: int) -> float:
+    """ Возвращает скорость импорта в строках в секунду """
+    expenses = make_expenses(rows)
+    start = time.perf_counter()
+    import_func(repo, expenses)
+    elapsed = time.perf_counter() - start
+    return rows / elapsed
+
+
+def per_row(repo: AbstractRepository, expenses: list[Expense]) -> None:
+    """ Импорт по одной записи """
+    for expense in expenses:
+        repo.add(expense)
+
+
+def bulk(repo: AbstractRepository, expenses: list[Expense]) -> None:
+    """ Импорт одной пачкой """
+    repo.add_many(expenses)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=10000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name, import_func in (('add', per_row), ('add_many', bulk)):
+            db_file = os.path.join(tmp_dir, f'{name}.sqlite.db')
+            repo = SQLiteRepository(Expense, db_file)
+            rate = measure(repo, import_func, args.rows)
+            repo.close()
+            print(f'sqlite {name:>8}: {rate:12.0f} rows/s')
+    for name, import_func in (('add', per_row), ('add_many', bulk)):
+        rate = measure(MemoryRepository[Expense](), import_func, args.rows)
+        print(f'memory {name:>8}: {rate:12.0f} rows/s')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Бенчмарк импорта дерева категорий из текста с отступами:
+построчное добавление (add) против пакетного по уровням (create_from_tree)
+для sqlite и памяти
+
+Запуск: python -m benchmarks.category_import --nodes 1000 10000 100000
+"""
+import argparse
+import os
+import tempfile
+import time
+from typing import Callable, Iterable, Iterator
+
+from bookkeeper.models.category import Category
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.utils import iter_tree
+
+
+def make_tree_lines(nodes: int, fanout: int = 10) -> Iterator[str]:
+    """
+    Выдает строки дерева из nodes категорий: у категории i потомки
+    fanout * i + 1 ... fanout * i + fanout (как в двоичной куче)
+    """
+    stack = [(0, 0)]
+    while stack:
+        node, depth = stack.pop()
+        yield '    ' * depth + f'категория {node}'
+        first = fanout * node + 1
+        children = range(min(first + fanout, nodes) - 1, first - 1, -1)
+        stack.extend((child, depth + 1) for child in children)
+
+
+def per_node(tree: Iterable[tuple[str, str | None]],
+             repo: AbstractRepository[Category]) -> None:
+    """ Импорт по одной категории """
+    created: dict[str, int] = {}
+    for child, parent in tree:
+        cat = Category(child, created[parent] if parent is not None else None)
+        created[child] = repo.add(cat)
+
+
+def bulk(tree: Iterable[tuple[str, str | None]],
+         repo: AbstractRepository[Category]) -> None:
+    """ Импорт пакетами по уровням """
+    Category.create_from_tree(tree, repo)
+
+
+def measure(repo: AbstractRepository[Category], import_func: Callable,
+            nodes: int) -> float:
+    """ Возвращает скорость разбора и импорта в узлах в секунду """
+    lines = list(make_tree_lines(nodes))
+    start = time.perf_counter()
+    import_func(iter_tree(lines), repo)
+    elapsed = time.perf_counter() - start
+    return nodes / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--nodes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--per-node-limit', type=int, default=10000,
+                        help='не замерять построчный импорт в sqlite на больших деревьях')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for nodes in args.nodes:
+            for name, import_func in (('add', per_node), ('bulk', bulk)):
+                if name == 'add' and nodes > args.per_node_limit:
+                    continue
+                db_file = os.path.join(tmp_dir, f'{name}_{nodes}.sqlite.db')
+                repo = SQLiteRepository(Category, db_file)
+                rate = measure(repo, import_func, nodes)
+                repo.close()
+                print(f'sqlite {name:>4} {nodes:>7}: {rate:12.0f} nodes/s')
+    for nodes in args.nodes:
+        for name, import_func in (('add', per_node), ('bulk', bulk)):
+            rate = measure(MemoryRepository[Category](), import_func, nodes)
+            print(f'memory {name:>4} {nodes:>7}: {rate:12.0f} nodes/s')
+
+
+if __name__ == "__main__":
+    main()
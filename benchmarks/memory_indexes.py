@@ -0,0 +1,62 @@
+"""
+Бенчмарк get_all в MemoryRepository: линейный просмотр
+против выборки по хэш-индексу и упорядоченному индексу
+
+Запуск: python -m benchmarks.memory_indexes --rows 100000
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Range
+
+
+CATEGORIES = [f'категория {i}' for i in range(100)]
+START = datetime(2023, 1, 1)
+
+
+def fill(repo: MemoryRepository[Expense], rows: int) -> None:
+    """ Заполняет репозиторий расходами """
+    repo.add_many(
+        Expense(amount=float(i % 1000), category=CATEGORIES[i % len(CATEGORIES)],
+                expense_date=START + timedelta(minutes=i), added_date=START)
+        for i in range(rows)
+    )
+
+
+def measure(repo: MemoryRepository[Expense], queries: list[dict]) -> float:
+    """ Возвращает среднее время одного запроса в миллисекундах """
+    start = time.perf_counter()
+    for where in queries:
+        repo.get_all(where)
+    return (time.perf_counter() - start) / len(queries) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--queries', type=int, default=100)
+    args = parser.parse_args()
+
+    scan_repo = MemoryRepository[Expense]()
+    indexed_repo = MemoryRepository[Expense](
+        hash_indexes=['category'], sorted_indexes=['expense_date']
+    )
+    fill(scan_repo, args.rows)
+    fill(indexed_repo, args.rows)
+
+    equality = [{'category': CATEGORIES[i % len(CATEGORIES)]}
+                for i in range(args.queries)]
+    ranges = [{'expense_date': Range(START + timedelta(minutes=i * 10),
+                                     START + timedelta(minutes=i * 10 + 60))}
+              for i in range(args.queries)]
+    for name, queries in (('equality', equality), ('range', ranges)):
+        scan = measure(scan_repo, queries)
+        indexed = measure(indexed_repo, queries)
+        print(f'{name:>8}: scan {scan:10.3f} ms, index {indexed:10.3f} ms')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Бенчмарк моделей: память и время создания объектов расходов
+для dataclass с __dict__ и со __slots__, создание из строки таблицы
+через словарь (cls(**dict(zip(...)))) и позиционно, загрузка из sqlite
+
+Запуск: python -m benchmarks.model_construction --rows 100000
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+import os
+import tempfile
+import time
+import tracemalloc
+from typing import Any, Callable
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+@dataclass
+class DictExpense:
+    """ Расход в виде dataclass без __slots__ (как раньше) """
+    amount: float
+    category: str
+    expense_date: datetime = datetime.now()
+    added_date: datetime = datetime.now()
+    comment: str = ''
+    pk: int = 0
+
+
+def make_rows(rows: int) -> list[tuple[Any, ...]]:
+    """ Создает строки таблицы расходов (pk первым, как в sqlite) """
+    now = datetime(2023, 1, 1)
+    return [(i, float(i % 1000), 'продукты', now, now, f'row {i}')
+            for i in range(1, rows + 1)]
+
+
+def by_dict(cls: type) -> Callable[[tuple[Any, ...]], Any]:
+    """ Создание объекта через словарь, как в прежнем __parse_query_to_class """
+    columns = ['pk', 'amount', 'category', 'expense_date', 'added_date', 'comment']
+    return lambda row: cls(**dict(zip(columns, row)))
+
+
+def positional(cls: type) -> Callable[[tuple[Any, ...]], Any]:
+    """ Позиционное создание объекта """
+    return lambda row: cls(*row[1:], row[0])
+
+
+def measure(factory: Callable, rows: list[tuple[Any, ...]]) -> tuple[float, float]:
+    """ Возвращает время создания в секундах и память в байтах на объект """
+    start = time.perf_counter()
+    objs = list(map(factory, rows))
+    elapsed = time.perf_counter() - start
+    del objs
+    tracemalloc.start()
+    objs = list(map(factory, rows))
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size / len(objs)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows)
+    for cls in (DictExpense, Expense):
+        for name, make_factory in (('dict', by_dict), ('positional', positional)):
+            elapsed, size = measure(make_factory(cls), rows)
+            print(f'{cls.__name__:>11} {name:>10}: {args.rows / elapsed:12.0f} obj/s, '
+                  f'{size:6.0f} bytes/obj')
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        repo = SQLiteRepository(Expense, os.path.join(tmp_dir, 'expenses.sqlite.db'))
+        repo.add_many(Expense(amount, category, expense_date, added_date, comment)
+                      for _, amount, category, expense_date, added_date, comment in rows)
+        start = time.perf_counter()
+        repo.get_all()
+        elapsed = time.perf_counter() - start
+        repo.close()
+        print(f'sqlite get_all: {args.rows / elapsed:12.0f} rows/s')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,295 @@
+"""
+Набор бенчмарков для отслеживания регрессий производительности:
+CRUD и get_all в SQLiteRepository и MemoryRepository, построение
+и разбор дерева категорий, подкатегории и обработчики презентера
+(set_budget, update_budgets) без графического интерфейса.
+
+Данные генерируются детерминированно по seed (см. bookkeeper.synthetic_data),
+поэтому замеры на разных версиях кода выполняются на одинаковых данных.
+Результаты (лучшее и медианное время из repeat повторов) пишутся в JSON
+и сравниваются с сохраненным базовым замером: замер медленнее базового
+больше чем на threshold считается регрессией (код возврата 1).
+
+Базовый замер в репозитории не хранится: время зависит от машины, поэтому
+его нужно один раз создать на той машине, где выполняется сравнение,
+с --update-baseline (файл benchmarks/baseline.json), на версии кода,
+принятой за эталон. Сравниваются только замеры с одинаковыми именами,
+поэтому размеры (--sizes) и seed при сравнении должны совпадать с базовыми
+(они записаны в разделе meta файла).
+
+Запуск:
+    python -m benchmarks.suite --sizes 10000 100000 --seed 0 --update-baseline
+    python -m benchmarks.suite --sizes 10000 100000 --seed 0 \
+        --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --sizes 10000 100000 1000000 --output result.json
+"""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+from typing import Any, Callable, Iterator
+
+from benchmarks.category_import import make_tree_lines
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Range
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.synthetic_data import generate_categories, iter_expenses
+from bookkeeper.utils import build_dict_tree_from_list, read_tree
+
+
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+GROUPS = ('repository', 'tree', 'presenter')
+START = datetime(2023, 1, 1)
+CATEGORIES = generate_categories(100)
+OPERATIONS = 1000
+
+
+@dataclass
+class Case:
+    """
+    Замер: run выполняет ops операций и получает результат setup,
+    который вызывается перед каждым повтором и в замер не входит
+    """
+    name: str
+    run: Callable[[Any], Any]
+    setup: Callable[[], Any] = lambda: None
+    ops: int = 1
+
+
+def make_expenses(rows: int, seed: int) -> list[Expense]:
+    """ Синтетические расходы за год по категориям CATEGORIES """
+    return list(iter_expenses(CATEGORIES, rows, START, 365, seed))
+
+
+def make_categories(nodes: int) -> list[Category]:
+    """ Дерево категорий с pk, как в make_tree_lines (корень - pk 1) """
+    return [Category(f'категория {i}', (i - 1) // 10 + 1 if i else None, i + 1)
+            for i in range(nodes)]
+
+
+def repository_cases(repo: AbstractRepository[Expense], size: int,
+                     seed: int) -> Iterator[Case]:
+    """ Замеры репозитория, заполненного size расходами """
+    rnd = random.Random(seed)
+    yield Case('add_many', lambda _: repo.add_many(make_expenses(size, seed)))
+    pks = [rnd.randint(1, size) for _ in range(OPERATIONS)]
+    yield Case('get', lambda _: [repo.get(pk) for pk in pks], ops=OPERATIONS)
+    yield Case('add', lambda objs: [repo.add(obj) for obj in objs],
+               setup=lambda: make_expenses(OPERATIONS, seed + 1), ops=OPERATIONS)
+
+    def changed() -> list[Expense]:
+        objs = [repo.get(pk) for pk in pks[:OPERATIONS // 10]]
+        for obj in objs:
+            obj.amount += 1
+        return objs
+    yield Case('update', lambda objs: [repo.update(obj) for obj in objs],
+               setup=changed, ops=OPERATIONS // 10)
+
+    def added() -> list[int]:
+        return repo.add_many(make_expenses(OPERATIONS // 10, seed + 2))
+    yield Case('delete', lambda new: [repo.delete(pk) for pk in new],
+               setup=added, ops=OPERATIONS // 10)
+    yield Case('get_all', lambda _: repo.get_all())
+    yield Case('get_all_category',
+               lambda _: [repo.get_all({'category': c.name}) for c in CATEGORIES[:10]],
+               ops=10)
+    days = [START + timedelta(days=rnd.randrange(358)) for _ in range(10)]
+    yield Case('get_all_week',
+               lambda _: [repo.get_all({'expense_date': Range(day, day + timedelta(7))})
+                          for day in days],
+               ops=10)
+
+
+def tree_cases(nodes: int) -> Iterator[Case]:
+    """ Замеры дерева категорий из nodes узлов """
+    categories = make_categories(nodes)
+    lines = list(make_tree_lines(nodes))
+    yield Case('build_dict_tree_from_list',
+               lambda _: build_dict_tree_from_list(categories))
+    yield Case('read_tree', lambda _: read_tree(lines))
+    root = categories[0]
+    memory = MemoryRepository[Category](hash_indexes=['parent'])
+    memory.add_many(Category(c.name, c.parent) for c in categories)
+    yield Case('get_subcategories_memory',
+               lambda _: list(root.get_subcategories(memory)))
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        sqlite = SQLiteRepository(Category, os.path.join(tmp_dir, 'tree.db'))
+        sqlite.add_many(Category(c.name, c.parent) for c in categories)
+        yield Case('get_subcategories_sqlite',
+                   lambda _: list(root.get_subcategories(sqlite)))
+        sqlite.close()
+
+
+class HeadlessView:
+    """ Представление без графического интерфейса для замеров презентера """
+
+    def __init__(self) -> None:
+        self.budgets: list[Budget] = []
+        self.window = SimpleNamespace(budget_page=SimpleNamespace(
+            budget_window=SimpleNamespace(set_budgets=self.set_budgets)
+        ))
+
+    def set_budgets(self, budgets_getter: Callable[[], list[Budget]]) -> None:
+        self.budgets = budgets_getter()
+
+    def start_app(self) -> None:
+        pass
+
+    def register_handlers(self, handlers: Any = None) -> None:
+        pass
+
+    def dispatch(self, callback: Callable[[], None]) -> None:
+        callback()
+
+    def show_error(self, message: str) -> None:
+        raise RuntimeError(message)
+
+
+def presenter_cases(size: int, seed: int, tmp_dir: str) -> Iterator[Case]:
+    """ Замеры обработчиков презентера на базе с size расходами """
+    # презентер импортирует модуль интерфейса (PySide6)
+    # pylint: disable-next=import-outside-toplevel
+    from bookkeeper.bookkeeper_app import Bookkeeper
+    repos = SQLiteRepository.repository_factory(
+        [Category, Expense, Budget], os.path.join(tmp_dir, f'presenter_{size}.db')
+    )
+    repos[Expense].add_many(make_expenses(size, seed))
+    app = Bookkeeper(HeadlessView(), repos)
+
+    def wait() -> None:
+        # задачи выполняются по очереди в одном потоке
+        app.executor.submit(lambda: None).result()
+
+    def set_budgets(_: Any) -> None:
+        for duration in ('День', 'Неделя', 'Месяц') * 10:
+            app.set_budget(10000, duration)
+        wait()
+    yield Case('set_budget', set_budgets, ops=30)
+
+    def update_budgets(_: Any) -> None:
+        for i in range(100):
+            app.update_budgets(1.0, datetime.now() - timedelta(hours=i))
+        wait()
+    yield Case('update_budgets', update_budgets, ops=100)
+    app.executor.shutdown()
+    repos[Expense].close()
+
+
+def measure(case: Case, repeat: int) -> dict[str, Any]:
+    """ Лучшее и медианное время одной операции в миллисекундах """
+    times = []
+    for _ in range(repeat):
+        state = case.setup()
+        start = time.perf_counter()
+        case.run(state)
+        times.append((time.perf_counter() - start) / case.ops * 1000)
+    return {'best_ms': min(times), 'median_ms': statistics.median(times),
+            'repeat': repeat, 'ops': case.ops}
+
+
+def run_group(group: str, sizes: list[int], seed: int,
+              repeat: int) -> Iterator[tuple[str, dict[str, Any]]]:
+    """ Выполняет замеры группы, выдает пары (имя замера, результат) """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for size in sizes:
+            if group == 'repository':
+                sqlite = SQLiteRepository(
+                    Expense, os.path.join(tmp_dir, f'expenses_{size}.db')
+                )
+                memory = MemoryRepository[Expense](
+                    hash_indexes=['category'], sorted_indexes=['expense_date']
+                )
+                for name, repo in (('sqlite', sqlite), ('memory', memory)):
+                    for case in repository_cases(repo, size, seed):
+                        # заполнение выполняется один раз
+                        times = 1 if case.name == 'add_many' else repeat
+                        yield f'{name}.{case.name}[{size}]', measure(case, times)
+                sqlite.close()
+            elif group == 'tree':
+                for case in tree_cases(size):
+                    yield f'tree.{case.name}[{size}]', measure(case, repeat)
+            else:
+                for case in presenter_cases(size, seed, tmp_dir):
+                    yield f'presenter.{case.name}[{size}]', measure(case, repeat)
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any],
+            threshold: float) -> list[str]:
+    """
+    Сравнивает лучшее время замеров с базовым, возвращает описания регрессий:
+    замеров, ставших медленнее больше чем в (1 + threshold) раз
+    """
+    regressions = []
+    for name, result in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        ratio = result['best_ms'] / base['best_ms'] if base['best_ms'] else 1.0
+        mark = ''
+        if ratio > 1 + threshold:
+            mark = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:<45} {base["best_ms"]:12.4f} -> {result["best_ms"]:12.4f} ms'
+              f' ({ratio:5.2f}x){mark}')
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[10000, 100000, 1000000])
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    parser.add_argument('--baseline', help='файл базового замера для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='допустимое замедление относительно базового замера')
+    parser.add_argument('--update-baseline', action='store_true',
+                        help=f'сохранить результаты как базовый замер ({BASELINE})')
+    args = parser.parse_args()
+    if args.baseline is not None and not os.path.exists(args.baseline):
+        parser.error(f'baseline {args.baseline} not found, create it first '
+                     f'with --update-baseline')
+
+    results: dict[str, Any] = {}
+    for group in args.groups:
+        for name, result in run_group(group, args.sizes, args.seed, args.repeat):
+            results[name] = result
+            print(f'{name:<45} {result["best_ms"]:12.4f} ms '
+                  f'(median {result["median_ms"]:.4f})', flush=True)
+    report = {
+        'meta': {'python': platform.python_version(), 'platform': platform.platform(),
+                 'seed': args.seed, 'sizes': args.sizes, 'repeat': args.repeat,
+                 'date': datetime.now().isoformat(timespec='seconds')},
+        'results': results,
+    }
+    for path in (args.output, BASELINE if args.update_baseline else None):
+        if path is not None:
+            with open(path, 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+    if args.baseline is not None:
+        with open(args.baseline, encoding='utf-8') as file:
+            baseline = json.load(file)['results']
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions over {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 from bookkeeper.bookkeeper_app import Bookkeeper
 from bookkeeper.view.app import View
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.connection_pool import WAL_PRAGMAS
 from bookkeeper.models.category import Category
 from bookkeeper.models.budget import Budget
 from bookkeeper.models.expense import Expense
@@ -10,6 +11,7 @@ if __name__ == "__main__":
     app = Bookkeeper(
         view=View(), repository_factory=SQLiteRepository.repository_factory(
             models=[Category, Expense, Budget],
-            db_file='bookkeeper/databases/client.sqlite.db'
+            db_file='bookkeeper/databases/client.sqlite.db',
+            cache_size=1024, pragmas=WAL_PRAGMAS
         )
     )
@@ -8,11 +8,15 @@ from dateutil import relativedelta
 
 from bookkeeper.view.app import View
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.connection_pool import WAL_PRAGMAS
 from bookkeeper.models.category import Category
 from bookkeeper.models.budget import Budget
 from bookkeeper.models.expense import Expense
-from bookkeeper.utils import build_dict_tree_from_list
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.executor import TaskExecutor
+from bookkeeper.utils import CategoryTree
 from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
 
 
 class AbstractView(Protocol):
@@ -29,6 +33,12 @@ class AbstractView(Protocol):
     ):
         pass
 
+    def dispatch(self, callback: Callable[[], None]) -> None:
+        pass
+
+    def show_error(self, message: str) -> None:
+        pass
+
 
 class Bookkeeper:
     """
@@ -50,6 +60,10 @@ class Bookkeeper:
         self.cat_repo = repository_factory[Category]
         self.budget_repo = repository_factory[Budget]
         self.expenses_repo = repository_factory[Expense]
+        self.budget_engine = BudgetEngine(self.budget_repo, self.expenses_repo)
+        # расход и суммы бюджетов сохраняются одной транзакцией
+        self.unit_of_work = UnitOfWork(repository_factory)
+        self.executor = TaskExecutor(dispatch=self.view.dispatch)
 
         self.view.start_app()
 
@@ -66,12 +80,10 @@ class Bookkeeper:
                 self.delete_category
             ],
             "expenses": [
-                self.get_expenses,
+                self.get_expenses_page,
                 self.get_categories_list,
                 self.add_expense,
-                self.edit_expenses,
-                self.update_budgets,
-                self.get_expense_from_repo
+                self.edit_expenses
             ],
             "budget": [
                 self.get_budget,
@@ -80,25 +92,23 @@ class Bookkeeper:
         }
         return handlers_dist
 
-    def get_category_tree(self) -> dict:
+    def get_category_tree(self) -> CategoryTree:
         """
         Строит и возвращает дерево существующих категорий
         """
-        categories_list = self.cat_repo.get_all()
-        categories_tree = build_dict_tree_from_list(categories_list)
-        return categories_tree
+        return CategoryTree.from_list(self.cat_repo.get_all())
 
     def add_new_category(
             self, category_name: str, parent_id: int | None = None
     ) -> None:
         """Добавление новой категории в репозиторий"""
-        self.cat_repo.add(Category(name=category_name.capitalize(), parent=parent_id))
-        self.view.window.categories_page.categories_list.set_tree(
-            category_tree_getter=self.get_category_tree
-        )
-        self.view.window.expenses_page.add_expense.choose_category.category_box.update_categories(
-            category_list_getter=self.get_categories_list
+        category = Category(name=category_name.capitalize(), parent=parent_id)
+        self.cat_repo.add(category)
+        self.view.window.categories_page.categories_list.category_added(
+            category.pk, category.name, category.parent
         )
+        choose_category = self.view.window.expenses_page.add_expense.choose_category
+        choose_category.category_box.add_category(category.name)
 
     def edit_existing_category(
             self, category_id: int,
@@ -106,43 +116,64 @@ class Bookkeeper:
             new_parent_id: int | None = None
     ) -> None:
         """
-        Редактирование существующей категории
+        Редактирование существующей категории.
+        Категорию нельзя сделать подкатегорией самой себя или своих подкатегорий
         """
+        old_category = self.cat_repo.get(category_id)
+        old_name = old_category.name
         if new_name is None:
-            new_name = self.cat_repo.get(category_id).name
-        self.cat_repo.update(
-            Category(name=new_name.capitalize(), parent=new_parent_id, pk=category_id)
-        )
-        self.view.window.categories_page.categories_list.set_tree(
-            category_tree_getter=self.get_category_tree
-        )
-        self.view.window.expenses_page.add_expense.choose_category.category_box.update_categories(
-            category_list_getter=self.get_categories_list
+            new_name = old_name
+        if new_parent_id is not None and any(
+                parent.pk == category_id
+                for parent in self.cat_repo.get_ancestors(new_parent_id,
+                                                          include_self=True)):
+            raise ValueError("Категорию нельзя перенести в ее подкатегорию")
+        category = Category(name=new_name.capitalize(), parent=new_parent_id,
+                            pk=category_id)
+        self.cat_repo.update(category)
+        self.view.window.categories_page.categories_list.category_changed(
+            category.pk, category.name, category.parent
         )
+        choose_category = self.view.window.expenses_page.add_expense.choose_category
+        choose_category.category_box.rename_category(old_name, category.name)
 
     def delete_category(self, category_id: int) -> None:
         """Удаление категории"""
+        category = self.cat_repo.get(category_id)
         self.cat_repo.delete(category_id)
-        self.view.window.categories_page.categories_list.set_tree(
-            category_tree_getter=self.get_category_tree
-        )
-        self.view.window.expenses_page.add_expense.choose_category.category_box.update_categories(
-            category_list_getter=self.get_categories_list
-        )
+        self.view.window.categories_page.categories_list.category_deleted(category_id)
+        choose_category = self.view.window.expenses_page.add_expense.choose_category
+        choose_category.category_box.remove_category(category.name)
 
     def get_expenses(self) -> list[Expense]:
         """Возвращает список расходов"""
         expenses = self.expenses_repo.get_all()
         return expenses
 
+    def get_expenses_page(self, after_pk: int, limit: int) -> list[Expense]:
+        """
+        Возвращает не более limit расходов с id больше after_pk в порядке id
+        (страница для ленивой загрузки таблицы расходов)
+        """
+        return list(self.expenses_repo.iter_all(
+            after_pk=after_pk, limit=limit, batch_size=limit
+        ))
+
     def edit_expenses(
             self, pk: int, amount: float, category: str,
-            expense_date: datetime, comment: str
+            expense_date: datetime, comment: str,
+            on_saved: Callable[[], None] | None = None,
+            on_error: Callable[[Exception], None] | None = None
     ) -> None:
         """
         Редактирование существующего расхода
         Если категория не входит в список существующих категорий,
-        то создается новая
+        то создается новая. Суммы бюджетов пересчитываются
+        с учетом старой и новой суммы и даты расхода.
+        Расход сохраняется в фоне; несколько правок одного расхода,
+        поступивших до начала сохранения, объединяются в одну.
+        on_saved и on_error вызываются в потоке интерфейса после сохранения
+        или ошибки (для объединенных правок - обработчики последней)
         """
         edit_expense = Expense(
             pk=pk, amount=amount, category=category,
@@ -151,18 +182,61 @@ class Bookkeeper:
         existing_categories = self.get_categories_list()
         if category not in existing_categories:
             self.add_new_category(category)
-        self.expenses_repo.update(edit_expense)
+
+        def saved(_: None) -> None:
+            if on_saved is not None:
+                on_saved()
+            self.refresh_budgets()
+
+        def failed(error: Exception) -> None:
+            if on_error is not None:
+                on_error(error)
+            self.show_error(error)
+
+        self.executor.submit(self._save_expense, edit_expense, key=('expense', pk),
+                             on_done=saved, on_error=failed)
+
+    def _save_expense(self, expense: Expense) -> None:
+        with self.unit_of_work:
+            old_expense = self.expenses_repo.get(expense.pk)
+            self.expenses_repo.update(expense)
+            self.budget_engine.expense_updated(old_expense, expense)
+
+    def _add_expense(self, expense: Expense) -> Expense:
+        with self.unit_of_work:
+            self.expenses_repo.add(expense)
+            self.budget_engine.expense_added(expense)
+        return expense
+
+    def _expense_added(self, expense: Expense) -> None:
+        self.view.window.expenses_page.expenses_list.expense_added(expense)
+        self.refresh_budgets()
+
+    def refresh_budgets(self) -> None:
+        """
+        Перечитать бюджеты в фоне и показать их.
+        Запросы, поступившие до начала чтения, объединяются в один
+        """
+        self.executor.submit(self.get_budget, key='budgets',
+                             on_done=self._show_budgets, on_error=self.show_error)
+
+    def _show_budgets(self, budgets: list[Budget]) -> None:
+        self.view.window.budget_page.budget_window.set_budgets(
+            budgets_getter=lambda: budgets
+        )
+
+    def show_error(self, error: Exception) -> None:
+        """Показать ошибку фоновой операции"""
+        self.view.show_error(str(error))
 
     def add_expense(
             self, amount: float, date: datetime, category: str, comment: str
     ) -> None:
-        """Добавление записи о расходе"""
-        self.expenses_repo.add(
-            Expense(amount=amount, category=category, expense_date=date, comment=comment)
-        )
-        self.view.window.expenses_page.expenses_list.set_expenses(
-            expenses_getter=self.get_expenses
-        )
+        """Добавление записи о расходе (в фоне) и учет ее в бюджетах"""
+        expense = Expense(amount=amount, category=category,
+                          expense_date=date, comment=comment)
+        self.executor.submit(self._add_expense, expense,
+                             on_done=self._expense_added, on_error=self.show_error)
 
     def get_categories_list(self) -> list[str]:
         """Получение списка существующих категорий"""
@@ -173,27 +247,26 @@ class Bookkeeper:
         return categories
 
     def get_budget(self) -> list[Budget]:
-        """Получение бюджетов на день, неделю и месяц"""
-        day_budgets = self.budget_repo.get_all(
-            subquery="WHERE expiration_date="
-                     "(SELECT MAX(expiration_date) FROM budget WHERE duration='День')")
-        week_budgets = self.budget_repo.get_all(
-            subquery="WHERE expiration_date="
-                     "(SELECT MAX(expiration_date) FROM budget WHERE duration='Неделя')")
-        month_budgets = self.budget_repo.get_all(
-            subquery="WHERE expiration_date="
-                     "(SELECT MAX(expiration_date) FROM budget WHERE duration='Месяц')")
-        return day_budgets + week_budgets + month_budgets
+        """
+        Получение бюджетов на день, неделю и месяц: для каждого периода -
+        все бюджеты с самой поздней датой окончания
+        """
+        latest = self.budget_repo.aggregate('expiration_date', 'max',
+                                            group_by='duration')
+        budgets = []
+        for duration in ('День', 'Неделя', 'Месяц'):
+            if (duration,) in latest:
+                budgets += self.budget_repo.get_all(where={
+                    'duration': duration, 'expiration_date': latest[(duration,)]
+                })
+        return budgets
 
     def get_expenses_from_data_range(
             self, end_date: datetime, start_date: datetime = datetime.now()
     ) -> list[Expense]:
         """Получение расходов за определенный промежуток времени"""
-        start_date_str = start_date.strftime("%Y-%m-%d %H:%M:%S")
-        end_date_str = end_date.strftime("%Y-%m-%d %H:%M:%S")
         expenses = self.expenses_repo.get_all(
-            subquery=f"WHERE expense_date <= '{end_date_str}'"
-                     f" AND expense_date > '{start_date_str}'"
+            where=BudgetEngine.expenses_between(start_date, end_date)
         )
         return expenses
 
@@ -201,48 +274,38 @@ class Bookkeeper:
         """Функция, задающая бюджет на период
         duration: "День", "Неделя", "Месяц"
         """
+        start_date = datetime.now()
         if duration == "День":
-            expiration_date = datetime.now() + timedelta(days=1)
+            expiration_date = start_date + timedelta(days=1)
         elif duration == "Неделя":
-            expiration_date = datetime.now() + timedelta(weeks=1)
+            expiration_date = start_date + timedelta(weeks=1)
         elif duration == "Месяц":
-            expiration_date = datetime.now() + relativedelta.relativedelta(months=1)
+            expiration_date = start_date + relativedelta.relativedelta(months=1)
         else:
             raise ValueError("Wrong duration, set День/Неделя/Месяц")
-        possible_expenses = self.get_expenses_from_data_range(
-            end_date=expiration_date
-        )
-        start_amount = 0.0
-        for expense in possible_expenses:
-            start_amount += expense.amount
-        budget = Budget(
-            amount=start_amount, limits=amount,
-            duration=duration, expiration_date=expiration_date
-        )
-        self.budget_repo.add(budget)
-        self.view.window.budget_page.budget_window.set_budgets(
-            budgets_getter=self.get_budget
+        self.executor.submit(
+            self.budget_engine.create_budget,
+            limits=amount, duration=duration,
+            start=start_date, expiration=expiration_date,
+            on_done=lambda _: self.refresh_budgets(), on_error=self.show_error
         )
 
     def get_budgets_with_appropriate_period(self, date: datetime) -> list[Budget]:
         """Получение бюджета, в период которого попадает дата"""
-        date_str = date.strftime("%Y-%m-%d %H:%M:%S")
         budgets = self.budget_repo.get_all(
-            subquery=f"WHERE start_date < '{date_str}'"
-                     f" AND expiration_date >= '{date_str}'"
+            where=BudgetEngine.budgets_containing(date)
         )
         return budgets
 
     def update_budgets(self, value: float, date: datetime) -> None:
-        """Обновление бюджета"""
-        budgets = self.get_budgets_with_appropriate_period(date=date)
-        for budget in budgets:
-            budget.amount += value
-            self.budget_repo.update(budget)
-
-        self.view.window.budget_page.budget_window.set_budgets(
-            budgets_getter=self.get_budget
-        )
+        """
+        Ручная корректировка бюджетов, в период которых попадает дата.
+        Добавление и редактирование расходов учитываются в бюджетах
+        автоматически, вызывать этот метод для них не нужно
+        """
+        self.executor.submit(self.budget_engine.adjust, date, value,
+                             on_done=lambda _: self.refresh_budgets(),
+                             on_error=self.show_error)
 
     def get_expense_from_repo(self, pk: int) -> Expense:
         """Получение расхода по его уникальному номеру"""
@@ -253,6 +316,7 @@ if __name__ == "__main__":
     app = Bookkeeper(
         view=View(), repository_factory=SQLiteRepository.repository_factory(
             models=[Category, Expense, Budget],
-            db_file='bookkeeper/databases/client.sqlite.db'
+            db_file='bookkeeper/databases/client.sqlite.db',
+            cache_size=1024, pragmas=WAL_PRAGMAS
         )
     )
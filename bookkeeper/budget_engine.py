@@ -0,0 +1,118 @@
+"""
+Учет расходов в бюджетах
+
+Сумма потраченного в бюджете (Budget.amount) ведется инкрементально:
+при добавлении, изменении или удалении расхода сумма изменяется одним запросом
+increment у всех бюджетов, в период которых попадает дата расхода, а при
+создании бюджета начальная сумма считается одним агрегирующим запросом total.
+Пересчитывать все расходы при каждом изменении не требуется.
+Пачка новых расходов (например, при импорте) учитывается одним чтением
+бюджетов и одним increment на каждый затронутый бюджет.
+"""
+from bisect import bisect_right
+from datetime import datetime
+from itertools import accumulate
+from typing import Any, Sequence, TYPE_CHECKING
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.query import Range
+
+if TYPE_CHECKING:
+    from bookkeeper.repository.columnar import ExpenseColumns
+
+
+class BudgetEngine:
+    """
+    Ведет суммы расходов в бюджетах.
+    Период бюджета - (start_date, expiration_date]: расход с датой, равной
+    дате начала бюджета, в бюджет не входит, с датой окончания - входит.
+    """
+
+    budget_repo: AbstractRepository[Budget]
+    expenses_repo: AbstractRepository[Expense]
+
+    def __init__(self,
+                 budget_repo: AbstractRepository[Budget],
+                 expenses_repo: AbstractRepository[Expense]) -> None:
+        self.budget_repo = budget_repo
+        self.expenses_repo = expenses_repo
+
+    @staticmethod
+    def budgets_containing(date: datetime) -> dict[str, Any]:
+        """ Условие выборки бюджетов, в период которых попадает дата """
+        return {'start_date': Range(upper=date),
+                'expiration_date': Range(lower=date)}
+
+    @staticmethod
+    def expenses_between(start: datetime, end: datetime) -> dict[str, Any]:
+        """ Условие выборки расходов, попадающих в период (start, end] """
+        return {'expense_date': Range(start, end,
+                                      include_lower=False, include_upper=True)}
+
+    def adjust(self, date: datetime, delta: float) -> None:
+        """ Изменить на delta суммы бюджетов, в период которых попадает дата """
+        if delta:
+            self.budget_repo.increment('amount', delta, self.budgets_containing(date))
+
+    def expense_added(self, expense: Expense) -> None:
+        """ Учесть новый расход """
+        self.adjust(expense.expense_date, expense.amount)
+
+    def expenses_added(self, expenses: Sequence[Expense]) -> None:
+        """
+        Учесть пачку новых расходов: бюджеты, пересекающиеся с периодом
+        пачки, читаются одним запросом, а сумма каждого из них изменяется
+        одним increment на всю пачку
+        """
+        if not expenses:
+            return
+        pairs = sorted((e.expense_date, e.amount) for e in expenses)
+        dates = [date for date, _ in pairs]
+        totals = [0.0, *accumulate(amount for _, amount in pairs)]
+        budgets = self.budget_repo.get_all(where={
+            'start_date': Range(upper=dates[-1]), 'expiration_date': Range(lower=dates[0])
+        })
+        for budget in budgets:
+            first = bisect_right(dates, budget.start_date)
+            last = bisect_right(dates, budget.expiration_date)
+            if last > first:
+                self.budget_repo.increment('amount', totals[last] - totals[first],
+                                           {'pk': budget.pk})
+
+    def expense_updated(self, old: Expense, new: Expense) -> None:
+        """ Учесть изменение суммы или даты расхода """
+        if old.expense_date == new.expense_date:
+            self.adjust(new.expense_date, new.amount - old.amount)
+        else:
+            self.adjust(old.expense_date, -old.amount)
+            self.adjust(new.expense_date, new.amount)
+
+    def expense_deleted(self, expense: Expense) -> None:
+        """ Учесть удаление расхода """
+        self.adjust(expense.expense_date, -expense.amount)
+
+    def spent(self, start: datetime, end: datetime,
+              columns: 'ExpenseColumns | None' = None) -> float:
+        """
+        Сумма расходов за период (start, end].
+        Если передан колоночный снимок расходов (см. repository.columnar),
+        сумма считается по нему, без запроса к репозиторию
+        """
+        if columns is not None:
+            return columns.between(start, end).total()
+        return self.expenses_repo.total('amount', self.expenses_between(start, end))
+
+    def create_budget(self, limits: float, duration: str,
+                      start: datetime, expiration: datetime,
+                      columns: 'ExpenseColumns | None' = None) -> Budget:
+        """
+        Создать бюджет на период (start, expiration] с суммой уже
+        учтенных в этом периоде расходов (columns - как в spent)
+        """
+        budget = Budget(amount=self.spent(start, expiration, columns), limits=limits,
+                        duration=duration, expiration_date=expiration,
+                        start_date=start)
+        self.budget_repo.add(budget)
+        return budget
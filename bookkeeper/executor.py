@@ -0,0 +1,105 @@
+"""
+Выполнение обработчиков презентера в фоновых потоках
+
+Обращения к репозиториям (запись в sqlite, агрегирующие запросы) выполняются
+вне потока интерфейса, а результат передается обратно функцией dispatch,
+которая вызывает обработчик результата в потоке интерфейса (для Qt - через
+сигнал, см. bookkeeper.view.app.View.dispatch).
+"""
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from functools import partial
+import threading
+from typing import Any, Callable, Hashable
+
+
+@dataclass
+class _Task:
+    func: Callable[..., Any]
+    args: tuple[Any, ...]
+    kwargs: dict[str, Any]
+    on_done: Callable[[Any], None] | None = None
+    on_error: Callable[[Exception], None] | None = None
+    key: Hashable | None = None
+    future: Future = field(default_factory=Future)
+
+
+class TaskExecutor:
+    """
+    Исполнитель задач в фоновых потоках с объединением запросов.
+    Задача с ключом key, которая еще не начала выполняться, заменяется новой
+    задачей с тем же ключом: выполняется только последний запрос, а все
+    объединенные запросы получают один и тот же Future. Так быстрые
+    повторные правки или перезагрузки не накапливаются в очереди.
+    По умолчанию используется один поток, поэтому задачи выполняются
+    в порядке поступления и не обращаются к репозиториям одновременно.
+    """
+
+    coalesced: int
+
+    def __init__(self,
+                 dispatch: Callable[[Callable[[], None]], None] | None = None,
+                 max_workers: int = 1) -> None:
+        """
+        :param dispatch: функция, вызывающая переданную функцию в потоке
+            интерфейса; по умолчанию обработчики результата вызываются
+            в фоновом потоке
+        :param max_workers: число фоновых потоков
+        """
+        self._pool = ThreadPoolExecutor(max_workers=max_workers,
+                                        thread_name_prefix='bookkeeper')
+        self._dispatch = dispatch if dispatch is not None else self._call
+        self._lock = threading.Lock()
+        self._pending: dict[Hashable, _Task] = {}
+        self.coalesced = 0
+
+    @staticmethod
+    def _call(callback: Callable[[], None]) -> None:
+        callback()
+
+    def submit(self, func: Callable[..., Any], *args: Any,
+               key: Hashable | None = None,
+               on_done: Callable[[Any], None] | None = None,
+               on_error: Callable[[Exception], None] | None = None,
+               **kwargs: Any) -> Future:
+        """
+        Поставить вызов func(*args, **kwargs) в очередь
+
+        :param key: ключ объединения запросов (None - не объединять)
+        :param on_done: обработчик результата (вызывается через dispatch)
+        :param on_error: обработчик исключения (вызывается через dispatch)
+        :return: Future с результатом вызова
+        """
+        with self._lock:
+            task = self._pending.get(key) if key is not None else None
+            if task is not None:
+                task.func, task.args, task.kwargs = func, args, kwargs
+                task.on_done, task.on_error = on_done, on_error
+                self.coalesced += 1
+                return task.future
+            task = _Task(func, args, kwargs, on_done, on_error, key)
+            if key is not None:
+                self._pending[key] = task
+        self._pool.submit(self._run, task)
+        return task.future
+
+    def _run(self, task: _Task) -> None:
+        with self._lock:
+            if task.key is not None and self._pending.get(task.key) is task:
+                del self._pending[task.key]
+            func, args, kwargs = task.func, task.args, task.kwargs
+            on_done, on_error = task.on_done, task.on_error
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:  # pylint: disable=broad-except
+            task.future.set_exception(exc)
+            if on_error is not None:
+                self._dispatch(partial(on_error, exc))
+            return
+        task.future.set_result(result)
+        if on_done is not None:
+            self._dispatch(partial(on_done, result))
+
+    def shutdown(self, wait: bool = True) -> None:
+        """ Остановить потоки, дождавшись выполнения поставленных задач """
+        self._pool.shutdown(wait=wait)
@@ -0,0 +1,280 @@
+"""
+Импорт расходов из CSV (например, из банковской выписки)
+
+Файл обрабатывается потоково, цепочкой генераторов:
+    read_records - строки CSV -> (номер строки, запись по столбцам)
+    parse_records - записи -> расходы (Expense) или ошибки разбора
+    batched - расходы -> пачки по batch_size
+Каждая пачка записывается одной транзакцией (UnitOfWork): расходы - одним
+add_many, суммы бюджетов - одним чтением и increment на каждый затронутый
+бюджет (BudgetEngine.expenses_added), а не на каждый расход.
+Названия категорий сопоставляются с существующими категориями по словарю
+в памяти (без учета регистра), запросов к базе на каждую строку нет.
+
+Запуск: python -m bookkeeper.importer statement.csv --amount Сумма --date Дата
+"""
+import argparse
+import csv
+from dataclasses import dataclass, field
+from datetime import datetime
+from itertools import islice
+import time
+from typing import Any, Callable, Iterable, Iterator
+
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import DB_FILE, SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+
+
+@dataclass
+class CsvFormat:
+    """
+    Формат файла: названия столбцов (или номера, если заголовка нет),
+    форматы дат (пробуются по порядку), разделители и знак расходов.
+    amount, date - обязательные столбцы, category и comment - необязательные.
+    Если в выписке расходы отрицательные (expenses_negative), их знак
+    меняется, а строки с положительной суммой (поступления) пропускаются.
+    Строки без категории или с неизвестной категорией получают
+    default_category; если она не задана, такие строки считаются ошибками
+    """
+    amount: str | int
+    date: str | int
+    category: str | int | None = None
+    comment: str | int | None = None
+    date_formats: tuple[str, ...] = ('%Y-%m-%d', '%d.%m.%Y', '%Y-%m-%d %H:%M:%S')
+    decimal_separator: str = '.'
+    thousands_separator: str = ''
+    delimiter: str = ','
+    has_header: bool = True
+    expenses_negative: bool = False
+    default_category: str | None = None
+
+
+@dataclass
+class ImportReport:
+    """
+    Итоги импорта: число прочитанных строк, добавленных расходов,
+    пропущенных поступлений, ошибки разбора (номер строки, описание),
+    число пачек и время импорта в секундах
+    """
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    errors: list[tuple[int, str]] = field(default_factory=list)
+    batches: int = 0
+    seconds: float = 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        """ Скорость импорта в строках в секунду """
+        return self.rows / self.seconds if self.seconds else 0.0
+
+
+class RowError(ValueError):
+    """ Ошибка разбора строки файла """
+
+
+def read_records(lines: Iterable[str],
+                 fmt: CsvFormat) -> Iterator[tuple[int, dict[str | int, str]]]:
+    """
+    Выдает записи CSV с номерами строк файла. Ключи записи - названия
+    столбцов из заголовка или номера столбцов, если заголовка нет
+    """
+    reader = csv.reader(lines, delimiter=fmt.delimiter)
+    names: list[str | int] | None = None
+    if fmt.has_header:
+        header = next(reader, None)
+        if header is None:
+            return
+        names = [name.strip() for name in header]
+    for row in reader:
+        if not any(value.strip() for value in row):
+            continue
+        keys = names if names is not None else range(len(row))
+        yield reader.line_num, dict(zip(keys, row))
+
+
+def make_amount_parser(fmt: CsvFormat) -> Callable[[str], float]:
+    """ Функция разбора суммы с учетом разделителей формата """
+    def parse(value: str) -> float:
+        value = value.strip().replace('\xa0', '').replace(' ', '')
+        if fmt.thousands_separator:
+            value = value.replace(fmt.thousands_separator, '')
+        if fmt.decimal_separator != '.':
+            value = value.replace(fmt.decimal_separator, '.')
+        try:
+            return float(value)
+        except ValueError:
+            raise RowError(f'wrong amount {value!r}') from None
+    return parse
+
+
+def make_date_parser(fmt: CsvFormat) -> Callable[[str], datetime]:
+    """
+    Функция разбора даты. Первым пробуется формат,
+    подошедший к предыдущей дате (в файле обычно один формат)
+    """
+    formats = list(fmt.date_formats)
+
+    def parse(value: str) -> datetime:
+        value = value.strip()
+        for i, date_format in enumerate(formats):
+            try:
+                date = datetime.strptime(value, date_format)
+            except ValueError:
+                continue
+            if i:
+                formats.insert(0, formats.pop(i))
+            return date
+        raise RowError(f'wrong date {value!r}, expected one of {fmt.date_formats}')
+    return parse
+
+
+def category_map(categories: Iterable[Category]) -> dict[str, str]:
+    """ Словарь 'название в нижнем регистре' -> название категории """
+    return {category.name.strip().lower(): category.name for category in categories}
+
+
+def parse_records(records: Iterable[tuple[int, dict[str | int, str]]],
+                  fmt: CsvFormat, categories: dict[str, str],
+                  report: ImportReport) -> Iterator[Expense]:
+    """
+    Выдает расходы из записей CSV. Ошибки разбора и пропущенные
+    поступления учитываются в отчете report
+    """
+    parse_amount = make_amount_parser(fmt)
+    parse_date = make_date_parser(fmt)
+    default = None
+    if fmt.default_category is not None:
+        default = categories.get(fmt.default_category.strip().lower())
+        if default is None:
+            raise KeyError(f'unknown default category {fmt.default_category}')
+    for line, record in records:
+        report.rows += 1
+        try:
+            amount = parse_amount(_column(record, fmt.amount))
+            if fmt.expenses_negative:
+                if amount >= 0:
+                    report.skipped += 1
+                    continue
+                amount = -amount
+            date = parse_date(_column(record, fmt.date))
+            name = ''
+            if fmt.category is not None:
+                name = record.get(fmt.category, '').strip()
+            category = categories.get(name.lower(), default)
+            if category is None:
+                raise RowError(f'unknown category {name!r}')
+        except RowError as exc:
+            report.errors.append((line, str(exc)))
+            continue
+        comment = '' if fmt.comment is None else record.get(fmt.comment, '').strip()
+        yield Expense(amount=round(amount, 2), category=category,
+                      expense_date=date, added_date=datetime.now(), comment=comment)
+
+
+def _column(record: dict[str | int, str], name: str | int) -> str:
+    try:
+        return record[name]
+    except KeyError:
+        raise RowError(f'no column {name!r}') from None
+
+
+def batched(objs: Iterable[Any], size: int) -> Iterator[list[Any]]:
+    """ Разбивает поток объектов на списки по size """
+    iterator = iter(objs)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_expenses(lines: Iterable[str], fmt: CsvFormat,
+                    repos: dict[type, AbstractRepository],
+                    batch_size: int = 1000,
+                    progress: Callable[[ImportReport], None] | None = None
+                    ) -> ImportReport:
+    """
+    Импортирует расходы из строк CSV в репозитории фабрики repos
+    (нужны репозитории Category, Expense и Budget).
+    Пачка записывается целиком или не записывается вовсе; пачки,
+    записанные до ошибки записи, остаются в базе.
+    progress вызывается после записи каждой пачки
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be positive')
+    report = ImportReport()
+    started = time.perf_counter()
+    engine = BudgetEngine(repos[Budget], repos[Expense])
+    unit_of_work = UnitOfWork(repos)
+    categories = category_map(repos[Category].get_all())
+    expenses = parse_records(read_records(lines, fmt), fmt, categories, report)
+    for batch in batched(expenses, batch_size):
+        with unit_of_work:
+            repos[Expense].add_many(batch)
+            engine.expenses_added(batch)
+        report.imported += len(batch)
+        report.batches += 1
+        report.seconds = time.perf_counter() - started
+        if progress is not None:
+            progress(report)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+def _column_arg(value: str) -> str | int:
+    return int(value) if value.isdigit() else value
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('file')
+    parser.add_argument('--db-file', default=DB_FILE)
+    parser.add_argument('--amount', type=_column_arg, required=True,
+                        help='столбец суммы (название или номер)')
+    parser.add_argument('--date', type=_column_arg, required=True)
+    parser.add_argument('--category', type=_column_arg)
+    parser.add_argument('--comment', type=_column_arg)
+    parser.add_argument('--date-format', action='append', dest='date_formats',
+                        help='формат даты для strptime (можно указать несколько)')
+    parser.add_argument('--decimal', default='.')
+    parser.add_argument('--thousands', default='')
+    parser.add_argument('--delimiter', default=',')
+    parser.add_argument('--encoding', default='utf-8')
+    parser.add_argument('--no-header', action='store_true')
+    parser.add_argument('--negative', action='store_true',
+                        help='расходы в выписке отрицательные')
+    parser.add_argument('--default-category')
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    fmt = CsvFormat(
+        amount=args.amount, date=args.date, category=args.category,
+        comment=args.comment, decimal_separator=args.decimal,
+        thousands_separator=args.thousands, delimiter=args.delimiter,
+        has_header=not args.no_header, expenses_negative=args.negative,
+        default_category=args.default_category
+    )
+    if args.date_formats:
+        fmt.date_formats = tuple(args.date_formats)
+    repos = SQLiteRepository.repository_factory([Category, Expense, Budget],
+                                                args.db_file)
+
+    def progress(report: ImportReport) -> None:
+        print(f'\r{report.rows} rows, {report.rows_per_second:.0f} rows/s',
+              end='', flush=True)
+
+    with open(args.file, encoding=args.encoding, newline='') as file:
+        report = import_expenses(file, fmt, repos, args.batch_size, progress)
+    repos[Category].close()
+    print(f'\rimported {report.imported} of {report.rows} rows in '
+          f'{report.seconds:.1f} s ({report.rows_per_second:.0f} rows/s), '
+          f'{report.skipped} skipped, {len(report.errors)} errors')
+    for line, message in report.errors[:20]:
+        print(f'line {line}: {message}')
+
+
+if __name__ == "__main__":
+    main()
@@ -1,22 +1,24 @@
 """
 Модель бюджета по категории расходов
 """
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Budget:
     """
     Бюджет по категории товаров, хранит срок (duration), на который установлен бюджет,
     id категории, к которой относится бюджет (category),
     и сумма бюджета на данный срок (amount)
     pk - id записи в базе данных
+    Индексы: (duration, expiration_date) - поиск последнего бюджета на срок,
+    expiration_date - поиск бюджетов, в период которых попадает дата
     """
 
     amount: float
     limits: float
-    duration: str
-    expiration_date: datetime
+    duration: str = field(metadata={'index': ('duration', 'expiration_date')})
+    expiration_date: datetime = field(metadata={'index': True})
     start_date: datetime = datetime.now()
     pk: int = 0
@@ -1,22 +1,23 @@
 """
 Модель категории расходов
 """
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import Iterator
+from dataclasses import dataclass, field
+from typing import Iterable, Iterator
 
 from ..repository.abstract_repository import AbstractRepository
+from ..repository.unit_of_work import UnitOfWork
 
 
-@dataclass
+@dataclass(slots=True)
 class Category:
     """
     Категория расходов, хранит название в атрибуте name и ссылку (id) на
     родителя (категория, подкатегорией которой является данная) в атрибуте parent.
     У категорий верхнего уровня parent = None
+    Индексы: name - поиск категории по названию, parent - поиск подкатегорий
     """
-    name: str
-    parent: int | None = None
+    name: str = field(metadata={'index': True})
+    parent: int | None = field(default=None, metadata={'index': True})
     pk: int = 0
 
     def get_parent(self,
@@ -42,6 +43,7 @@ class Category:
                         ) -> Iterator['Category']:
         """
         Получить все категории верхнего уровня в иерархии.
+        Предки загружаются из репозитория одним запросом (см. get_ancestors)
 
         Parameters
         ----------
@@ -51,11 +53,9 @@ class Category:
         -------
         Объекты Category от родителя и выше до категории верхнего уровня
         """
-        parent = self.get_parent(repo)
-        if parent is None:
+        if self.parent is None:
             return
-        yield parent
-        yield from parent.get_all_parents(repo)
+        yield from repo.get_ancestors(self.parent, include_self=True)
 
     def get_subcategories(self,
                           repo: AbstractRepository['Category']
@@ -63,6 +63,8 @@ class Category:
         """
         Получить все подкатегории из иерархии, т.е. непосредственные
         подкатегории данной, все их подкатегории и т.д.
+        Подкатегории загружаются из репозитория одним запросом
+        (см. get_descendants)
 
         Parameters
         ----------
@@ -72,47 +74,59 @@ class Category:
         -------
         Объекты Category, являющиеся подкатегориями разного уровня ниже данной.
         """
-
-        def get_children(graph: dict[int | None, list['Category']],
-                         root: int) -> Iterator['Category']:
-            """ dfs in graph from root """
-            for x in graph[root]:
-                yield x
-                yield from get_children(graph, x.pk)
-
-        subcats = defaultdict(list)
-        for cat in repo.get_all():
-            subcats[cat.parent].append(cat)
-        return get_children(subcats, self.pk)
+        yield from repo.get_descendants(self.pk)
 
     @classmethod
     def create_from_tree(
             cls,
-            tree: list[tuple[str, str | None]],
+            tree: Iterable[tuple[str, str | None]],
             repo: AbstractRepository['Category']) -> list['Category']:
         """
-        Создать дерево категорий из списка пар "потомок-родитель".
-        Список должен быть топологически отсортирован, т.е. потомки
-        не должны встречаться раньше своего родителя.
-        Проверка корректности исходных данных не производится.
-        При использовании СУБД с проверкой внешних ключей, будет получена
-        ошибка (для sqlite3 - IntegrityError). При отсутствии проверки
-        со стороны СУБД, результат, возможно, будет корректным, если исходные
-        данные корректны за исключением сортировки. Если нет, то нет.
-        "Мусор на входе, мусор на выходе".
+        Создать дерево категорий из пар "потомок-родитель".
+        Пары должны быть топологически отсортированы, т.е. потомки
+        не должны встречаться раньше своего родителя. Родитель ищется
+        по названию среди уже прочитанных категорий (при повторении названия -
+        последняя из них), поэтому пары можно читать потоком из файла
+        (см. utils.iter_tree).
+        Сначала проверяется вся структура, затем категории добавляются
+        пакетами add_many, по одному пакету на уровень вложенности:
+        первичные ключи уровня назначаются разом и становятся ссылками
+        на родителя для следующего уровня.
+        Все уровни добавляются одной транзакцией (UnitOfWork): при ошибке
+        в данных или при записи ничего не сохраняется (в репозитории sqlite;
+        репозитории в памяти откат не поддерживают).
 
         Parameters
         ----------
-        tree - список пар "потомок-родитель"
+        tree - пары "потомок-родитель"
         repo - репозиторий для сохранения объектов
 
         Returns
         -------
-        Список созданных объектов Category
+        Список созданных объектов Category в порядке исходных пар
+
+        Raises
+        ------
+        KeyError - если родитель не встречался раньше потомка
         """
-        created: dict[str, Category] = {}
+        created: dict[str, tuple[Category, int]] = {}
+        levels: list[list[tuple[Category, Category | None]]] = []
+        result = []
         for child, parent in tree:
-            cat = cls(child, created[parent].pk if parent is not None else None)
-            repo.add(cat)
-            created[child] = cat
-        return list(created.values())
+            if parent is None:
+                parent_cat, level = None, 0
+            else:
+                parent_cat, parent_level = created[parent]
+                level = parent_level + 1
+            cat = cls(child)
+            if level == len(levels):
+                levels.append([])
+            levels[level].append((cat, parent_cat))
+            created[child] = (cat, level)
+            result.append(cat)
+        with UnitOfWork([repo]):
+            for nodes in levels:
+                for cat, parent_cat in nodes:
+                    cat.parent = parent_cat.pk if parent_cat is not None else None
+                repo.add_many(cat for cat, _ in nodes)
+        return result
@@ -2,11 +2,11 @@
 Описан класс, представляющий расходную операцию
 """
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime
 
 
-@dataclass
+@dataclass(slots=True)
 class Expense:
     """
     Расходная операция.
@@ -16,10 +16,11 @@ class Expense:
     added_date - дата добавления в бд
     comment - комментарий
     pk - id записи в базе данных
+    Индексы: expense_date - выборка расходов за период
     """
     amount: float
     category: str
-    expense_date: datetime = datetime.now()
+    expense_date: datetime = field(default=datetime.now(), metadata={'index': True})
     added_date: datetime = datetime.now()
     comment: str = ''
     pk: int = 0
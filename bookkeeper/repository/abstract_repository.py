@@ -8,7 +8,29 @@
 """
 
 from abc import ABC, abstractmethod
-from typing import Generic, TypeVar, Protocol, Any
+from typing import Generic, TypeVar, Protocol, Any, Callable, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.query import aggregate_objects
+
+
+def walk_tree(root: int, get_children: Callable[[int], Iterable[Any]]) -> list[Any]:
+    """
+    Обойти дерево в глубину от root, не включая его.
+    get_children возвращает непосредственных потомков по id родителя.
+    Уже посещенные записи повторно не обходятся (защита от циклов)
+    """
+    out = []
+    seen = {root}
+    stack = [iter(get_children(root))]
+    while stack:
+        obj = next(stack[-1], None)
+        if obj is None:
+            stack.pop()
+        elif obj.pk not in seen:
+            seen.add(obj.pk)
+            out.append(obj)
+            stack.append(iter(get_children(obj.pk)))
+    return out
 
 
 class Model(Protocol):  # pylint: disable=too-few-public-methods
@@ -30,6 +52,19 @@ class AbstractRepository(ABC, Generic[T]):
     get_all
     update
     delete
+    Пакетные методы (по умолчанию вызывают одиночные для каждого объекта):
+    add_many
+    update_many
+    delete_many
+    Потоковое чтение (по умолчанию использует get_all):
+    iter_all
+    Изменение поля и агрегаты по условию (по умолчанию через get_all):
+    increment
+    total
+    aggregate
+    Обход иерархии по полю-ссылке на родителя:
+    get_ancestors
+    get_descendants
     """
 
     @abstractmethod
@@ -44,11 +79,17 @@ class AbstractRepository(ABC, Generic[T]):
         """ Получить объект по id """
 
     @abstractmethod
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None) -> list[T]:
         """
         Получить все записи по некоторому условию
         where - условие в виде словаря {'название_поля': значение}
-        если условие не задано (по умолчанию), вернуть все записи
+        если условие не задано (по умолчанию), вернуть все записи.
+        Значением может быть условие Range или In (см. модуль query)
+        order_by - название поля или список названий для сортировки,
+        префикс "-" означает сортировку по убыванию
+        limit - максимальное число возвращаемых записей
         """
 
     @abstractmethod
@@ -59,8 +100,104 @@ class AbstractRepository(ABC, Generic[T]):
     def delete(self, pk: int) -> None:
         """ Удалить запись """
 
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000,
+                 after_pk: int = 0,
+                 limit: int | None = None) -> Iterator[T]:
+        """
+        Лениво перебрать записи по условию в порядке возрастания id
+        where - условие, как в get_all
+        batch_size - число записей, читаемых из хранилища за один раз
+        after_pk - вернуть только записи с id больше заданного
+        (постраничный перебор: передать id последней полученной записи)
+        limit - максимальное число возвращаемых записей
+        """
+        objs = [obj for obj in self.get_all(where) if obj.pk > after_pk]
+        objs.sort(key=lambda obj: obj.pk)
+        yield from objs[:limit]
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть список их id,
+        также записать id в атрибут pk каждого объекта.
+        """
+        return [self.add(obj) for obj in objs]
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновить данные о нескольких объектах """
+        for obj in objs:
+            self.update(obj)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удалить несколько записей по их id """
+        for pk in pks:
+            self.delete(pk)
+
+    def increment(self, name: str, delta: float,
+                  where: dict[str, Any] | None = None) -> int:
+        """
+        Прибавить delta к полю name у всех записей, удовлетворяющих
+        условию where (как в get_all). Вернуть число измененных записей
+        """
+        objs = self.get_all(where)
+        for obj in objs:
+            setattr(obj, name, getattr(obj, name) + delta)
+        self.update_many(objs)
+        return len(objs)
+
+    def total(self, name: str, where: dict[str, Any] | None = None) -> float:
+        """
+        Вернуть сумму значений поля name у записей,
+        удовлетворяющих условию where (как в get_all)
+        """
+        return float(sum(getattr(obj, name) for obj in self.get_all(where)))
+
+    def aggregate(self, name: str, func: str = 'sum',
+                  group_by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], float]:
+        """
+        Посчитать агрегат func ('sum', 'count', 'avg', 'min', 'max') по полю name
+        для записей, удовлетворяющих условию where (как в get_all),
+        с группировкой по полям group_by. Для полей-дат можно группировать
+        по периодам: 'expense_date:day', 'expense_date:week', 'expense_date:month'.
+        Вернуть словарь {ключ группы (кортеж значений group_by): значение},
+        упорядоченный по ключам; без группировки ключ - пустой кортеж
+        """
+        return aggregate_objects(self.get_all(where), name, func, group_by)
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent',
+                      include_self: bool = False) -> list[T]:
+        """
+        Получить предков записи в иерархии, заданной полем parent_field
+        (id родителя, None у записей верхнего уровня): от родителя
+        до записи верхнего уровня. include_self - начать список с самой записи
+        """
+        out: list[T] = []
+        seen: set[int] = set()
+        obj = self.get(pk)
+        while obj is not None and obj.pk not in seen:
+            seen.add(obj.pk)
+            out.append(obj)
+            parent = getattr(obj, parent_field)
+            obj = self.get(parent) if parent is not None else None
+        return out if include_self else out[1:]
+
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получить всех потомков записи в иерархии, заданной полем parent_field:
+        непосредственных потомков, их потомков и т.д. в порядке обхода
+        в глубину, потомки одного родителя - по возрастанию id
+        """
+        children: dict[Any, list[T]] = {}
+        for obj in self.get_all():
+            children.setdefault(getattr(obj, parent_field), []).append(obj)
+        return walk_tree(pk, lambda parent: sorted(
+            children.get(parent, []), key=lambda obj: obj.pk
+        ))
+
     @classmethod
     def repository_factory(
             cls, models: list[type], db_file: str | None = None
-    ) -> dict[type, type]:
+    ) -> dict[type, 'AbstractRepository[Any]']:
         """ создает словарь репозиториев для каждой из моделей"""
@@ -0,0 +1,225 @@
+"""
+Модуль описывает асинхронные репозитории для использования в asyncio
+
+Интерфейс повторяет AbstractRepository, но методы являются сопрограммами,
+а iter_all - асинхронным генератором. Репозиторий sqlite выполняет запросы
+в отдельных потоках, не блокируя цикл событий: все записи - в одном
+потоке-писателе (в порядке вызова), чтения - в пуле потоков-читателей,
+у каждого из которых свое соединение с базой данных.
+"""
+from abc import ABC, abstractmethod
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import Any, AsyncIterator, Callable, Generic, Iterable, Sequence, TypeVar
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import DB_FILE, SQLiteRepository
+
+R = TypeVar('R')
+
+
+class AsyncAbstractRepository(ABC, Generic[T]):
+    """
+    Абстрактный асинхронный репозиторий.
+    Абстрактные методы:
+    add
+    get
+    get_all
+    update
+    delete
+    Пакетное добавление (по умолчанию вызывает add для каждого объекта):
+    add_many
+    Потоковое чтение (по умолчанию использует get_all):
+    iter_all
+    """
+
+    @abstractmethod
+    async def add(self, obj: T) -> int:
+        """
+        Добавить объект в репозиторий, вернуть id объекта,
+        также записать id в атрибут pk.
+        """
+
+    @abstractmethod
+    async def get(self, pk: int) -> T | None:
+        """ Получить объект по id """
+
+    @abstractmethod
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | Sequence[str] | None = None,
+                      limit: int | None = None) -> list[T]:
+        """ Получить все записи по некоторому условию (см. AbstractRepository) """
+
+    @abstractmethod
+    async def update(self, obj: T) -> None:
+        """ Обновить данные об объекте. Объект должен содержать поле pk. """
+
+    @abstractmethod
+    async def delete(self, pk: int) -> None:
+        """ Удалить запись """
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавить несколько объектов в репозиторий, вернуть список их id,
+        также записать id в атрибут pk каждого объекта.
+        """
+        return [await self.add(obj) for obj in objs]
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = 1000,
+                       after_pk: int = 0,
+                       limit: int | None = None) -> AsyncIterator[T]:
+        """
+        Лениво перебрать записи по условию в порядке возрастания id
+        (параметры - как в AbstractRepository.iter_all)
+        """
+        objs = [obj for obj in await self.get_all(where) if obj.pk > after_pk]
+        objs.sort(key=lambda obj: obj.pk)
+        for obj in objs[:limit]:
+            yield obj
+
+    async def close(self) -> None:
+        """ Освободить ресурсы репозитория """
+
+
+class AsyncMemoryRepository(AsyncAbstractRepository[T]):
+    """
+    Асинхронный репозиторий в оперативной памяти (например, для тестов).
+    Операции выполняются сразу в цикле событий, без потоков.
+    Параметры индексов - как у MemoryRepository
+    """
+
+    def __init__(self, hash_indexes: Iterable[str] = (),
+                 sorted_indexes: Iterable[str] = ()) -> None:
+        self._repo: MemoryRepository[T] = MemoryRepository(hash_indexes, sorted_indexes)
+
+    async def add(self, obj: T) -> int:
+        return self._repo.add(obj)
+
+    async def get(self, pk: int) -> T | None:
+        return self._repo.get(pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | Sequence[str] | None = None,
+                      limit: int | None = None) -> list[T]:
+        return self._repo.get_all(where, order_by=order_by, limit=limit)
+
+    async def update(self, obj: T) -> None:
+        self._repo.update(obj)
+
+    async def delete(self, pk: int) -> None:
+        self._repo.delete(pk)
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        return self._repo.add_many(objs)
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = 1000,
+                       after_pk: int = 0,
+                       limit: int | None = None) -> AsyncIterator[T]:
+        for obj in self._repo.iter_all(where, after_pk=after_pk, limit=limit):
+            yield obj
+
+
+class ThreadedRepository(AsyncAbstractRepository[T]):
+    """
+    Асинхронная обертка над синхронным репозиторием.
+    Записи выполняются в одном потоке-писателе по очереди, в порядке вызова,
+    чтения - параллельно в пуле из readers потоков.
+    iter_all читает записи страницами по batch_size, каждая страница
+    читается отдельным запросом в потоке-читателе.
+    Исходный репозиторий должен допускать вызовы из разных потоков
+    """
+
+    backend: AbstractRepository[T]
+
+    def __init__(self, backend: AbstractRepository[T], readers: int = 4) -> None:
+        """
+        :param backend: синхронный репозиторий
+        :param readers: число потоков-читателей
+        """
+        self.backend = backend
+        self._writer = ThreadPoolExecutor(max_workers=1,
+                                          thread_name_prefix='repository-writer')
+        self._readers = ThreadPoolExecutor(max_workers=readers,
+                                           thread_name_prefix='repository-reader')
+
+    @staticmethod
+    async def _run(executor: ThreadPoolExecutor,
+                   func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, partial(func, *args, **kwargs))
+
+    async def add(self, obj: T) -> int:
+        return await self._run(self._writer, self.backend.add, obj)
+
+    async def get(self, pk: int) -> T | None:
+        return await self._run(self._readers, self.backend.get, pk)
+
+    async def get_all(self, where: dict[str, Any] | None = None,
+                      order_by: str | Sequence[str] | None = None,
+                      limit: int | None = None) -> list[T]:
+        return await self._run(self._readers, self.backend.get_all,
+                               where, order_by=order_by, limit=limit)
+
+    async def update(self, obj: T) -> None:
+        await self._run(self._writer, self.backend.update, obj)
+
+    async def delete(self, pk: int) -> None:
+        await self._run(self._writer, self.backend.delete, pk)
+
+    async def add_many(self, objs: Iterable[T]) -> list[int]:
+        return await self._run(self._writer, self.backend.add_many, list(objs))
+
+    def _read_page(self, where: dict[str, Any] | None,
+                   batch_size: int, after_pk: int) -> list[T]:
+        return list(self.backend.iter_all(where, batch_size=batch_size,
+                                          after_pk=after_pk, limit=batch_size))
+
+    async def iter_all(self, where: dict[str, Any] | None = None,
+                       batch_size: int = 1000,
+                       after_pk: int = 0,
+                       limit: int | None = None) -> AsyncIterator[T]:
+        left = limit
+        while left is None or left > 0:
+            size = batch_size if left is None else min(batch_size, left)
+            page = await self._run(self._readers, self._read_page,
+                                   where, size, after_pk)
+            for obj in page:
+                yield obj
+            if len(page) < size:
+                return
+            after_pk = page[-1].pk
+            if left is not None:
+                left -= len(page)
+
+    async def close(self) -> None:
+        """ Дождаться выполнения поставленных запросов и остановить потоки """
+        await asyncio.to_thread(self._writer.shutdown)
+        await asyncio.to_thread(self._readers.shutdown)
+
+
+class AsyncSQLiteRepository(ThreadedRepository[T]):
+    """
+    Асинхронный репозиторий, работающий с СУБД sqlite через SQLiteRepository.
+    Пул соединений рассчитан на всех читателей и писателя,
+    поэтому потокам не приходится ждать свободного соединения
+    """
+
+    backend: SQLiteRepository[T]
+
+    def __init__(self, cls: type, db_file: str = DB_FILE, readers: int = 4) -> None:
+        """
+        :param cls: класс модели
+        :param db_file: путь к файлу базы данных
+        :param readers: число потоков-читателей
+        """
+        pool = ConnectionPool(db_file, size=readers + 1)
+        super().__init__(SQLiteRepository(cls, db_file, pool), readers)
+
+    async def close(self) -> None:
+        await super().close()
+        self.backend.close()
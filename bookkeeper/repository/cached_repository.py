@@ -0,0 +1,199 @@
+"""
+Модуль описывает кэширующий репозиторий
+
+Кэширующий репозиторий оборачивает любой другой репозиторий: запись
+выполняется сразу в исходный репозиторий (write-through), чтение - из кэша,
+а при промахе - из исходного репозитория (read-through).
+"""
+from collections import OrderedDict
+import threading
+from typing import Any, Hashable, Iterable, Iterator, Sequence
+
+from bookkeeper.repository.abstract_repository import AbstractRepository, T
+
+
+class CachedRepository(AbstractRepository[T]):
+    """
+    Репозиторий-обертка с кэшем объектов (get) и результатов выборок (get_all).
+    Оба кэша вытесняют давно не использованные записи (LRU).
+    Любая запись сбрасывает кэш выборок, измененные и удаленные объекты
+    удаляются из кэша объектов.
+    Кэш возвращает те же экземпляры объектов, что хранит, поэтому изменения
+    объектов нужно сохранять через update.
+    Методы, которых нет в AbstractRepository (например, explain или close
+    у SQLiteRepository), передаются исходному репозиторию.
+    """
+
+    backend: AbstractRepository[T]
+    max_size: int
+    max_queries: int
+
+    def __init__(self, backend: AbstractRepository[T],
+                 max_size: int = 1024, max_queries: int = 128) -> None:
+        """
+        :param backend: исходный репозиторий
+        :param max_size: максимальное число объектов в кэше
+        :param max_queries: максимальное число выборок в кэше
+        """
+        self.backend = backend
+        self.max_size = max_size
+        self.max_queries = max_queries
+        self._objects: OrderedDict[int, T] = OrderedDict()
+        self._queries: OrderedDict[Hashable, list[T]] = OrderedDict()
+        self._lock = threading.RLock()
+        self._hits = 0
+        self._misses = 0
+        self._generation = 0
+
+    def __getattr__(self, name: str) -> Any:
+        if name == 'backend':
+            raise AttributeError(name)
+        return getattr(self.backend, name)
+
+    @staticmethod
+    def _put(cache: OrderedDict, key: Hashable, value: Any, max_size: int) -> None:
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_size:
+            cache.popitem(last=False)
+
+    @staticmethod
+    def _query_key(where: dict[str, Any] | None,
+                   order_by: str | Sequence[str] | None,
+                   limit: int | None) -> Hashable | None:
+        """ Ключ выборки в кэше, None - если условие нельзя хэшировать """
+        if isinstance(order_by, list):
+            order_by = tuple(order_by)
+        key = (tuple(sorted(where.items())) if where is not None else None,
+               order_by, limit)
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def _invalidate(self, pks: Iterable[int] = ()) -> None:
+        with self._lock:
+            self._generation += 1
+            self._queries.clear()
+            for pk in pks:
+                self._objects.pop(pk, None)
+
+    def stats(self) -> dict[str, int]:
+        """
+        Статистика кэша: число попаданий и промахов,
+        число объектов и выборок в кэше
+        """
+        with self._lock:
+            return {'hits': self._hits, 'misses': self._misses,
+                    'objects': len(self._objects), 'queries': len(self._queries)}
+
+    def reset_stats(self) -> None:
+        """ Обнулить счетчики попаданий и промахов """
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+
+    def clear(self) -> None:
+        """
+        Очистить кэш. Объекты, читаемые из исходного репозитория
+        в момент очистки, в кэш не попадут
+        """
+        with self._lock:
+            self._generation += 1
+            self._objects.clear()
+            self._queries.clear()
+
+    def add(self, obj: T) -> int:
+        pk = self.backend.add(obj)
+        with self._lock:
+            self._generation += 1
+            self._queries.clear()
+            self._put(self._objects, pk, obj, self.max_size)
+        return pk
+
+    def get(self, pk: int) -> T | None:
+        with self._lock:
+            if pk in self._objects:
+                self._hits += 1
+                self._objects.move_to_end(pk)
+                return self._objects[pk]
+            self._misses += 1
+            generation = self._generation
+        obj = self.backend.get(pk)
+        with self._lock:
+            if obj is not None and generation == self._generation:
+                self._put(self._objects, pk, obj, self.max_size)
+        return obj
+
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None) -> list[T]:
+        key = self._query_key(where, order_by, limit)
+        with self._lock:
+            if key is not None and key in self._queries:
+                self._hits += 1
+                self._queries.move_to_end(key)
+                return list(self._queries[key])
+            self._misses += 1
+            generation = self._generation
+        objs = self.backend.get_all(where, order_by=order_by, limit=limit)
+        with self._lock:
+            # выборку, прочитанную одновременно с записью, не кэшируем
+            if key is not None and generation == self._generation:
+                self._put(self._queries, key, objs, self.max_queries)
+        return list(objs)
+
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000,
+                 after_pk: int = 0,
+                 limit: int | None = None) -> Iterator[T]:
+        return self.backend.iter_all(where, batch_size=batch_size,
+                                     after_pk=after_pk, limit=limit)
+
+    def increment(self, name: str, delta: float,
+                  where: dict[str, Any] | None = None) -> int:
+        changed = self.backend.increment(name, delta, where)
+        with self._lock:
+            # какие именно объекты изменились, неизвестно
+            self.clear()
+        return changed
+
+    def total(self, name: str, where: dict[str, Any] | None = None) -> float:
+        return self.backend.total(name, where)
+
+    def aggregate(self, name: str, func: str = 'sum',
+                  group_by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], float]:
+        return self.backend.aggregate(name, func, group_by, where)
+
+    def get_ancestors(self, pk: int, parent_field: str = 'parent',
+                      include_self: bool = False) -> list[T]:
+        return self.backend.get_ancestors(pk, parent_field, include_self)
+
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        return self.backend.get_descendants(pk, parent_field)
+
+    def update(self, obj: T) -> None:
+        self.backend.update(obj)
+        self._invalidate([obj.pk])
+
+    def delete(self, pk: int) -> None:
+        self.backend.delete(pk)
+        self._invalidate([pk])
+
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        pks = self.backend.add_many(objs)
+        self._invalidate()
+        return pks
+
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        self.backend.update_many(objs)
+        self._invalidate(obj.pk for obj in objs)
+
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(pks)
+        self.backend.delete_many(pks)
+        self._invalidate(pks)
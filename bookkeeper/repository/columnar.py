@@ -0,0 +1,149 @@
+"""
+Модуль описывает колоночное представление расходов для отчетов
+
+Вместо списка объектов Expense расходы хранятся массивами NumPy по столбцам:
+id, сумма, дата (секунды от начала эпохи, как в sqlite) и код категории.
+Названия категорий закодированы словарем (код - номер в списке categories).
+Отбор по датам и категориям, суммы и группировки выполняются векторно,
+без создания объектов. Представление только для чтения: это снимок таблицы
+на момент построения.
+
+Требуется пакет numpy (необязательная зависимость, дополнение columnar).
+"""
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Sequence
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.query import PERIODS
+from bookkeeper.repository.sqlite_repository import (
+    EPOCH, SECONDS_IN_DAY, SECONDS_IN_WEEK, WEEK_OFFSET, SQLiteRepository,
+    adapt_datetime
+)
+
+
+def _require_numpy() -> None:
+    if np is None:
+        raise ImportError('ExpenseColumns requires numpy: '
+                          'poetry install --extras columnar')
+
+
+class ExpenseColumns:
+    """
+    Колоночный снимок расходов.
+    Атрибуты - массивы одинаковой длины:
+        pk - id расходов (int64)
+        amount - суммы (float64)
+        date - даты расходов в секундах от начала эпохи (int64)
+        category - коды категорий (int32), названия - в списке categories
+    Методы отбора возвращают новый снимок с тем же словарем категорий.
+    """
+
+    pk: Any
+    amount: Any
+    date: Any
+    category: Any
+    categories: list[str]
+
+    def __init__(self, pk: Any, amount: Any, date: Any, category: Any,
+                 categories: Sequence[str]) -> None:
+        _require_numpy()
+        self.pk = np.asarray(pk, dtype=np.int64)
+        self.amount = np.asarray(amount, dtype=np.float64)
+        self.date = np.asarray(date, dtype=np.int64)
+        self.category = np.asarray(category, dtype=np.int32)
+        self.categories = list(categories)
+        self._codes = {name: code for code, name in enumerate(self.categories)}
+
+    @classmethod
+    def _from_rows(cls, rows: Iterable[tuple[int, float, str, int]]) -> 'ExpenseColumns':
+        _require_numpy()
+        codes: dict[str, int] = {}
+        pks, amounts, dates, categories = [], [], [], []
+        for pk, amount, category, date in rows:
+            pks.append(pk)
+            amounts.append(amount)
+            dates.append(date)
+            categories.append(codes.setdefault(category, len(codes)))
+        return cls(pks, amounts, dates, categories, list(codes))
+
+    @classmethod
+    def from_repository(cls, repo: SQLiteRepository[Expense]) -> 'ExpenseColumns':
+        """
+        Построить снимок таблицы расходов одним запросом.
+        Даты читаются числами, без преобразования в datetime
+        """
+        query = (f'SELECT pk, amount, category, expense_date + 0 '
+                 f'FROM {repo.table_name} ORDER BY pk')
+        with repo.pool.connection() as con:
+            return cls._from_rows(con.execute(query))
+
+    @classmethod
+    def from_expenses(cls, expenses: Iterable[Expense]) -> 'ExpenseColumns':
+        """ Построить снимок из объектов Expense (например, из MemoryRepository) """
+        return cls._from_rows(
+            (e.pk, e.amount, e.category, adapt_datetime(e.expense_date))
+            for e in expenses
+        )
+
+    def __len__(self) -> int:
+        return len(self.pk)
+
+    def _select(self, mask: Any) -> 'ExpenseColumns':
+        return ExpenseColumns(self.pk[mask], self.amount[mask], self.date[mask],
+                              self.category[mask], self.categories)
+
+    def between(self, start: datetime | None = None,
+                end: datetime | None = None) -> 'ExpenseColumns':
+        """
+        Расходы за период (start, end], как в BudgetEngine.expenses_between.
+        Незаданная граница не ограничивает отбор
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if start is not None:
+            mask &= self.date > adapt_datetime(start)
+        if end is not None:
+            mask &= self.date <= adapt_datetime(end)
+        return self._select(mask)
+
+    def in_categories(self, names: Iterable[str]) -> 'ExpenseColumns':
+        """ Расходы из заданных категорий """
+        codes = [self._codes[name] for name in names if name in self._codes]
+        return self._select(np.isin(self.category, codes))
+
+    def total(self) -> float:
+        """ Сумма расходов """
+        return float(self.amount.sum())
+
+    def by_category(self) -> dict[str, float]:
+        """ Суммы расходов по категориям (только встречающиеся категории) """
+        sums = np.bincount(self.category, weights=self.amount,
+                           minlength=len(self.categories))
+        counts = np.bincount(self.category, minlength=len(self.categories))
+        return {name: float(sums[code])
+                for code, name in enumerate(self.categories) if counts[code]}
+
+    def _period_starts(self, period: str) -> Any:
+        """ Начала периодов дат в секундах от начала эпохи """
+        if period == 'day':
+            return self.date - self.date % SECONDS_IN_DAY
+        if period == 'week':
+            return self.date - (self.date - WEEK_OFFSET) % SECONDS_IN_WEEK
+        months = self.date.astype('datetime64[s]').astype('datetime64[M]')
+        return months.astype('datetime64[s]').astype(np.int64)
+
+    def by_period(self, period: str = 'day') -> dict[datetime, float]:
+        """
+        Суммы расходов по дням, неделям (с понедельника) или месяцам,
+        упорядоченные по дате, как aggregate('amount', group_by='expense_date:...')
+        """
+        if period not in PERIODS:
+            raise ValueError(f'unknown period {period}, use one of {PERIODS}')
+        starts, groups = np.unique(self._period_starts(period), return_inverse=True)
+        sums = np.bincount(groups, weights=self.amount, minlength=len(starts))
+        return {EPOCH + timedelta(seconds=int(start)): float(value)
+                for start, value in zip(starts, sums)}
@@ -0,0 +1,215 @@
+"""
+Модуль описывает пул соединений с СУБД sqlite
+
+Пул хранит открытые соединения с файлом базы данных и выдает их репозиториям
+по запросу, чтобы не открывать новое соединение на каждый вызов и сохранять
+прогретый кэш страниц sqlite между вызовами.
+
+Настройки соединения (PRAGMA) задаются профилем - словарем
+{'название': значение} и выполняются один раз при открытии соединения:
+    DEFAULT_PRAGMAS - проверка внешних ключей, остальное по умолчанию sqlite
+    WAL_PRAGMAS - журнал WAL (читатели не ждут писателя), synchronous=NORMAL,
+        увеличенный кэш страниц, отображение файла в память, временные
+        таблицы в памяти
+
+Если пулу подключено инструментирование (атрибут instrumentation), пул выдает
+соединения-обертки, учитывающие запросы, и учитывает время, на которое
+соединения заняты (см. instrumentation).
+"""
+from contextlib import contextmanager
+import queue
+import sqlite3
+import threading
+import time
+from typing import Any, Iterator, cast
+
+from bookkeeper.repository.instrumentation import (
+    Instrumentation, InstrumentedConnection
+)
+
+
+DEFAULT_PRAGMAS: dict[str, Any] = {
+    'foreign_keys': 'ON',
+}
+WAL_PRAGMAS: dict[str, Any] = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # в килобайтах
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'foreign_keys': 'ON',
+}
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений с одним файлом базы данных.
+    Соединение, выданное потоку, закрепляется за ним до конца блока
+    connection(), поэтому вложенные вызовы в одном потоке используют
+    одно и то же соединение и одну транзакцию.
+    Методы:
+        connection - контекстный менеджер, выдающий соединение
+        close - закрыть все соединения пула
+    """
+
+    db_file: str
+    size: int
+    timeout: float
+    health_check: bool
+    pragmas: dict[str, Any]
+    instrumentation: Instrumentation | None
+
+    def __init__(self, db_file: str, size: int = 5,
+                 timeout: float = 5.0, health_check: bool = True,
+                 pragmas: dict[str, Any] | None = None,
+                 instrumentation: Instrumentation | None = None) -> None:
+        """
+        :param db_file: путь к файлу базы данных
+        :param size: максимальное число одновременно открытых соединений
+        :param timeout: время ожидания свободного соединения, в секундах
+        :param health_check: проверять соединение перед выдачей
+        :param pragmas: профиль настроек соединения (по умолчанию DEFAULT_PRAGMAS)
+        :param instrumentation: сборщик статистики запросов и соединений
+        """
+        if size < 1:
+            raise ValueError('connection pool size must be positive')
+        self.db_file = db_file
+        self.size = size
+        self.timeout = timeout
+        self.health_check = health_check
+        self.pragmas = dict(DEFAULT_PRAGMAS if pragmas is None else pragmas)
+        self.instrumentation = instrumentation
+        self._idle: queue.LifoQueue[sqlite3.Connection] = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._closed = False
+
+    @property
+    def closed(self) -> bool:
+        """ Был ли пул закрыт методом close """
+        return self._closed
+
+    def _connect(self) -> sqlite3.Connection:
+        """
+        Открыть соединение в счет уже занятого места в пуле (_opened).
+        Если открыть или настроить соединение не удалось, место освобождается
+        """
+        con = None
+        try:
+            con = sqlite3.connect(
+                self.db_file, timeout=self.timeout, check_same_thread=False,
+                detect_types=sqlite3.PARSE_DECLTYPES
+            )
+            for name, value in self.pragmas.items():
+                con.execute(f'PRAGMA {name} = {value}')
+        except BaseException:
+            if con is not None:
+                con.close()
+            with self._lock:
+                self._opened -= 1
+            raise
+        return con
+
+    @staticmethod
+    def _is_alive(con: sqlite3.Connection) -> bool:
+        try:
+            con.execute('SELECT 1').fetchone()
+        except sqlite3.Error:
+            return False
+        return True
+
+    def _acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise RuntimeError('connection pool is closed')
+        try:
+            con = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                return self._connect()
+            try:
+                con = self._idle.get(timeout=self.timeout)
+            except queue.Empty as exc:
+                raise TimeoutError(
+                    f'no free connection to {self.db_file} '
+                    f'in {self.timeout} seconds'
+                ) from exc
+        if self.health_check and not self._is_alive(con):
+            con.close()
+            con = self._connect()
+        return con
+
+    def _release(self, con: sqlite3.Connection) -> None:
+        if self._closed:
+            con.close()
+            with self._lock:
+                self._opened -= 1
+            return
+        self._idle.put(con)
+
+    def holds_connection(self) -> bool:
+        """ Держит ли текущий поток соединение (находится ли внутри connection()) """
+        return getattr(self._local, 'connection', None) is not None
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        """
+        Выдать соединение текущему потоку. По выходе из блока транзакция
+        фиксируется (или откатывается при исключении), а соединение
+        возвращается в пул. Если поток уже держит соединение, выдается оно же,
+        а фиксацию выполняет внешний блок.
+        """
+        held = getattr(self._local, 'connection', None)
+        if held is not None:
+            yield held
+            return
+        instrumentation = self.instrumentation
+        if instrumentation is not None:
+            yield from self._instrumented_connection(instrumentation)
+            return
+        con = self._acquire()
+        self._local.connection = con
+        try:
+            with con:
+                yield con
+        finally:
+            self._local.connection = None
+            self._release(con)
+
+    def _instrumented_connection(
+            self, instrumentation: Instrumentation
+    ) -> Iterator[sqlite3.Connection]:
+        con = self._acquire()
+        started = time.perf_counter()
+        wrapper = InstrumentedConnection(con, instrumentation)
+        self._local.connection = wrapper
+        try:
+            with con:
+                try:
+                    # обертка повторяет интерфейс соединения
+                    yield cast(sqlite3.Connection, wrapper)
+                finally:
+                    wrapper.finish()
+        finally:
+            self._local.connection = None
+            self._release(con)
+            instrumentation.record_connection(time.perf_counter() - started)
+
+    def close(self) -> None:
+        """
+        Закрыть все свободные соединения. Соединения, занятые в данный момент,
+        закрываются при возврате в пул. После закрытия пул не выдает соединений.
+        """
+        self._closed = True
+        while True:
+            try:
+                con = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            con.close()
+            with self._lock:
+                self._opened -= 1
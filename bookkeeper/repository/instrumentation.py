@@ -0,0 +1,392 @@
+"""
+Модуль описывает инструментирование репозиториев: сбор статистики вызовов
+и запросов и журнал медленных запросов
+
+Объект Instrumentation подключается к репозиторию (атрибут instrumentation)
+и к пулу соединений sqlite (атрибут instrumentation пула). Собираются:
+    methods - вызовы методов репозиториев: число, задержки, возвращенные объекты
+    queries - sql-запросы по форме (текст запроса без значений параметров):
+        число, задержки (выполнение и чтение строк), строки
+    connections - время, на которое соединения пула были заняты
+Задержки копятся в гистограммах с фиксированными границами (в миллисекундах).
+Запросы дольше slow_query_ms записываются в журнал медленных запросов вместе
+с планом выполнения (EXPLAIN QUERY PLAN) и пишутся в лог bookkeeper.slow_query.
+
+Если инструментирование не подключено, методы и пул только проверяют,
+что атрибут instrumentation равен None.
+"""
+from bisect import bisect_left
+from collections import deque
+from functools import lru_cache, wraps
+import logging
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Iterator, Sequence, TypeVar
+
+HISTOGRAM_BOUNDS_MS = (0.1, 0.5, 1.0, 5.0, 10.0, 50.0, 100.0, 500.0, 1000.0)
+EXPLAINABLE = ('SELECT', 'WITH', 'INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+slow_query_log = logging.getLogger('bookkeeper.slow_query')
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+@lru_cache(maxsize=1024)
+def sql_shape(query: str) -> str:
+    """
+    Форма запроса: текст без лишних пробелов, списки параметров
+    (?, ?, ...) любой длины сводятся к одному виду
+    """
+    shape = ' '.join(query.split())
+    return re.sub(r'\?(?:\s*,\s*\?)+', '?, ...', shape)
+
+
+class Metric:
+    """
+    Статистика одного метода или формы запроса:
+    число вызовов, суммарная и максимальная задержка, число строк
+    и гистограмма задержек по границам HISTOGRAM_BOUNDS_MS
+    """
+
+    __slots__ = ('count', 'seconds', 'max_seconds', 'rows', 'histogram')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+        self.histogram = [0] * (len(HISTOGRAM_BOUNDS_MS) + 1)
+
+    def add(self, seconds: float, rows: int = 0) -> None:
+        """ Учесть один вызов """
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.rows += rows
+        self.histogram[bisect_left(HISTOGRAM_BOUNDS_MS, seconds * 1000)] += 1
+
+    def snapshot(self) -> dict[str, Any]:
+        """ Статистика в виде словаря (задержки - в миллисекундах) """
+        labels = [f'<={bound:g}ms' for bound in HISTOGRAM_BOUNDS_MS]
+        labels.append(f'>{HISTOGRAM_BOUNDS_MS[-1]:g}ms')
+        return {
+            'count': self.count,
+            'total_ms': self.seconds * 1000,
+            'mean_ms': self.seconds * 1000 / self.count if self.count else 0.0,
+            'max_ms': self.max_seconds * 1000,
+            'rows': self.rows,
+            'histogram': dict(zip(labels, self.histogram)),
+        }
+
+
+class Instrumentation:
+    """
+    Сборщик статистики репозиториев и пула соединений.
+    Один объект можно подключить к нескольким репозиториям и пулам,
+    запись статистики потокобезопасна.
+    Методы:
+        record_call, record_query, record_connection - учесть вызов
+        stats - снимок собранной статистики
+        reset - сбросить статистику и журнал медленных запросов
+    """
+
+    slow_query_ms: float | None
+    explain: bool
+
+    def __init__(self, slow_query_ms: float | None = None, explain: bool = True,
+                 max_slow_queries: int = 100) -> None:
+        """
+        :param slow_query_ms: порог медленного запроса в миллисекундах
+            (None - журнал медленных запросов не ведется)
+        :param explain: получать план выполнения медленных запросов
+        :param max_slow_queries: сколько последних медленных запросов хранить
+        """
+        self.slow_query_ms = slow_query_ms
+        self.explain = explain
+        self._lock = threading.Lock()
+        self._methods: dict[str, Metric] = {}
+        self._queries: dict[str, Metric] = {}
+        self._connections = Metric()
+        self._slow_queries: deque[dict[str, Any]] = deque(maxlen=max_slow_queries)
+
+    def record_call(self, name: str, seconds: float, rows: int = 0) -> None:
+        """ Учесть вызов метода репозитория name """
+        with self._lock:
+            metric = self._methods.get(name)
+            if metric is None:
+                metric = self._methods[name] = Metric()
+            metric.add(seconds, rows)
+
+    def record_query(self, query: str, seconds: float, rows: int = 0,
+                     con: sqlite3.Connection | None = None,
+                     params: Sequence[Any] | dict[str, Any] = ()) -> None:
+        """
+        Учесть выполнение запроса query. Если запрос медленный, а передано
+        соединение con, план выполнения получается на нем с параметрами params
+        """
+        shape = sql_shape(query)
+        with self._lock:
+            metric = self._queries.get(shape)
+            if metric is None:
+                metric = self._queries[shape] = Metric()
+            metric.add(seconds, rows)
+        if self.slow_query_ms is None or seconds * 1000 < self.slow_query_ms:
+            return
+        plan = self._explain(con, query, params) if self.explain else []
+        entry = {'sql': shape, 'ms': seconds * 1000, 'rows': rows, 'plan': plan}
+        with self._lock:
+            self._slow_queries.append(entry)
+        slow_query_log.warning('slow query (%.1f ms, %d rows): %s%s',
+                               entry['ms'], rows, shape,
+                               ''.join(f'\n    {line}' for line in plan))
+
+    @staticmethod
+    def _explain(con: sqlite3.Connection | None, query: str,
+                 params: Sequence[Any] | dict[str, Any]) -> list[str]:
+        if con is None or not query.lstrip().upper().startswith(EXPLAINABLE):
+            return []
+        try:
+            rows = con.execute(f'EXPLAIN QUERY PLAN {query}', params).fetchall()
+        except sqlite3.Error:
+            return []
+        return [row[-1] for row in rows]
+
+    def record_connection(self, seconds: float) -> None:
+        """ Учесть время, на которое было занято соединение пула """
+        with self._lock:
+            self._connections.add(seconds)
+
+    def stats(self) -> dict[str, Any]:
+        """
+        Снимок статистики:
+            {'methods': {метод: статистика}, 'queries': {форма запроса: статистика},
+             'connections': статистика, 'slow_queries': [медленные запросы]}
+        Статистика - словарь Metric.snapshot, медленный запрос - словарь
+        {'sql': форма запроса, 'ms': задержка, 'rows': строки, 'plan': [план]}
+        """
+        with self._lock:
+            return {
+                'methods': {name: metric.snapshot()
+                            for name, metric in self._methods.items()},
+                'queries': {shape: metric.snapshot()
+                            for shape, metric in self._queries.items()},
+                'connections': self._connections.snapshot(),
+                'slow_queries': [dict(entry) for entry in self._slow_queries],
+            }
+
+    def reset(self) -> None:
+        """ Сбросить статистику и журнал медленных запросов """
+        with self._lock:
+            self._methods.clear()
+            self._queries.clear()
+            self._connections = Metric()
+            self._slow_queries.clear()
+
+
+def _count_rows(result: Any) -> int:
+    if result is None:
+        return 0
+    if isinstance(result, (list, tuple, dict)):
+        return len(result)
+    return 1
+
+
+def _record_iteration(instrumentation: Instrumentation, name: str,
+                      iterator: Iterator[Any], started: float) -> Iterator[Any]:
+    """ Перебрать итератор, учитывая вызов по окончании перебора """
+    rows = 0
+    try:
+        for obj in iterator:
+            rows += 1
+            yield obj
+    finally:
+        instrumentation.record_call(name, time.perf_counter() - started, rows)
+
+
+def instrumented(method: F) -> F:
+    """
+    Декоратор метода репозитория: если к репозиторию подключено
+    инструментирование, учитывает задержку вызова и число возвращенных
+    объектов. Для итераторов (iter_all) вызов учитывается по окончании
+    перебора. Метод учитывается под именем '<таблица или класс>.<метод>'
+    """
+    @wraps(method)
+    def wrapper(self: Any, *args: Any, **kwargs: Any) -> Any:
+        instrumentation = self.instrumentation
+        if instrumentation is None:
+            return method(self, *args, **kwargs)
+        name = f"{getattr(self, 'table_name', type(self).__name__)}.{method.__name__}"
+        started = time.perf_counter()
+        try:
+            result = method(self, *args, **kwargs)
+        except BaseException:
+            instrumentation.record_call(name, time.perf_counter() - started)
+            raise
+        if isinstance(result, Iterator):
+            return _record_iteration(instrumentation, name, result, started)
+        instrumentation.record_call(name, time.perf_counter() - started,
+                                    _count_rows(result))
+        return result
+    return wrapper  # type: ignore[return-value]
+
+
+class InstrumentedCursor:
+    """
+    Курсор sqlite, учитывающий выполненные запросы.
+    Запрос учитывается, когда прочитаны все его строки, когда на курсоре
+    выполняется следующий запрос или когда соединение возвращается в пул.
+    Задержка запроса - время выполнения и чтения строк, для запросов
+    без результата число строк - rowcount
+    """
+
+    def __init__(self, cursor: sqlite3.Cursor,
+                 connection: 'InstrumentedConnection') -> None:
+        self._cursor = cursor
+        self._connection = connection
+        self._query: str | None = None
+        self._params: Sequence[Any] | dict[str, Any] = ()
+        self._seconds = 0.0
+        self._rows = 0
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._cursor, name)
+
+    def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._seconds += time.perf_counter() - started
+
+    def _start(self, query: str, params: Sequence[Any] | dict[str, Any]) -> None:
+        self.finish()
+        self._query = query
+        self._params = params
+        self._seconds = 0.0
+        self._rows = 0
+        self._connection.pending.add(self)
+
+    def _executed(self) -> 'InstrumentedCursor':
+        if self._cursor.description is None:
+            self._rows = max(self._cursor.rowcount, 0)
+            self.finish()
+        return self
+
+    def execute(self, query: str,
+                params: Sequence[Any] | dict[str, Any] = ()) -> 'InstrumentedCursor':
+        """ Выполнить запрос (см. sqlite3.Cursor.execute) """
+        self._start(query, params)
+        try:
+            self._run(self._cursor.execute, query, params)
+        except BaseException:
+            self.finish()
+            raise
+        return self._executed()
+
+    def executemany(self, query: str, seq_of_params: Any) -> 'InstrumentedCursor':
+        """
+        Выполнить запрос для каждого набора параметров.
+        План медленного запроса строится по первому набору
+        """
+        seq_of_params = list(seq_of_params)
+        self._start(query, seq_of_params[0] if seq_of_params else ())
+        try:
+            self._run(self._cursor.executemany, query, seq_of_params)
+        except BaseException:
+            self.finish()
+            raise
+        return self._executed()
+
+    def fetchone(self) -> Any:
+        """ Прочитать следующую строку """
+        row = self._run(self._cursor.fetchone)
+        if row is None:
+            self.finish()
+        else:
+            self._rows += 1
+        return row
+
+    def fetchmany(self, size: int | None = None) -> list[Any]:
+        """ Прочитать до size строк """
+        size = self._cursor.arraysize if size is None else size
+        rows = self._run(self._cursor.fetchmany, size)
+        self._rows += len(rows)
+        if len(rows) < size:
+            self.finish()
+        return rows
+
+    def fetchall(self) -> list[Any]:
+        """ Прочитать все оставшиеся строки """
+        rows = self._run(self._cursor.fetchall)
+        self._rows += len(rows)
+        self.finish()
+        return rows
+
+    def __iter__(self) -> 'InstrumentedCursor':
+        return self
+
+    def __next__(self) -> Any:
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def finish(self) -> None:
+        """ Учесть текущий запрос курсора, если он еще не учтен """
+        query = self._query
+        if query is None:
+            return
+        self._query = None
+        self._connection.pending.discard(self)
+        self._connection.instrumentation.record_query(
+            query, self._seconds, self._rows,
+            self._connection.raw, self._params
+        )
+
+
+class InstrumentedConnection:
+    """
+    Обертка над соединением sqlite, которую пул выдает при подключенном
+    инструментировании. Запросы через execute, executemany и курсоры
+    cursor() учитываются, остальное передается соединению
+    """
+
+    raw: sqlite3.Connection
+    instrumentation: Instrumentation
+    pending: set[InstrumentedCursor]
+
+    def __init__(self, raw: sqlite3.Connection,
+                 instrumentation: Instrumentation) -> None:
+        self.raw = raw
+        self.instrumentation = instrumentation
+        self.pending = set()
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.raw, name)
+
+    def __enter__(self) -> 'InstrumentedConnection':
+        self.raw.__enter__()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> Any:
+        return self.raw.__exit__(*exc_info)
+
+    def cursor(self) -> InstrumentedCursor:
+        """ Создать учитывающий запросы курсор """
+        return InstrumentedCursor(self.raw.cursor(), self)
+
+    def execute(self, query: str,
+                params: Sequence[Any] | dict[str, Any] = ()) -> InstrumentedCursor:
+        """ Выполнить запрос на новом курсоре """
+        return self.cursor().execute(query, params)
+
+    def executemany(self, query: str, seq_of_params: Any) -> InstrumentedCursor:
+        """ Выполнить запрос для каждого набора параметров на новом курсоре """
+        return self.cursor().executemany(query, seq_of_params)
+
+    def finish(self) -> None:
+        """ Учесть запросы, строки которых не были дочитаны """
+        for cursor in list(self.pending):
+            cursor.finish()
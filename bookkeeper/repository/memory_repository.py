@@ -2,42 +2,204 @@
 Модуль описывает репозиторий, работающий в оперативной памяти
 """
 
-from itertools import count
-from typing import Any
+from bisect import bisect_left, bisect_right, insort
+from itertools import count, islice
+from typing import Any, Iterable, Iterator, Sequence
 
-from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.abstract_repository import AbstractRepository, T, walk_tree
+from bookkeeper.repository.instrumentation import Instrumentation, instrumented
+from bookkeeper.repository.query import (
+    Condition, In, Range, matches, sort_objects
+)
 
 
 class MemoryRepository(AbstractRepository[T]):
     """
     Репозиторий, работающий в оперативной памяти. Хранит данные в словаре.
+
+    Для ускорения get_all можно включить вторичные индексы по полям:
+    hash_indexes - поля с хэш-индексом (поиск по равенству и In),
+    sorted_indexes - поля с упорядоченным индексом (поиск по Range).
+    Индексы обновляются в add, update и delete. Значения полей запоминаются
+    при записи в репозиторий, поэтому объект, измененный на месте, нужно
+    передать в update, чтобы индексы учли изменения.
+    Хэш-индекс по полю-ссылке на родителя (например, parent) используется
+    в get_descendants как индекс "родитель -> потомки".
+    Статистика вызовов собирается в instrumentation, если оно подключено.
     """
 
-    def __init__(self) -> None:
+    instrumentation: Instrumentation | None
+
+    def __init__(self, hash_indexes: Iterable[str] = (),
+                 sorted_indexes: Iterable[str] = (),
+                 instrumentation: Instrumentation | None = None) -> None:
+        self.instrumentation = instrumentation
         self._container: dict[int, T] = {}
         self._counter = count(1)
+        self._hash_indexes: dict[str, dict[Any, set[int]]] = {
+            name: {} for name in hash_indexes
+        }
+        self._sorted_indexes: dict[str, list[tuple[Any, int]]] = {
+            name: [] for name in sorted_indexes
+        }
+        self._indexed_values: dict[int, dict[str, Any]] = {}
+
+    def _index(self, pk: int, obj: T) -> None:
+        if not self._hash_indexes and not self._sorted_indexes:
+            return
+        values = {name: getattr(obj, name, None)
+                  for name in self._hash_indexes.keys() | self._sorted_indexes.keys()}
+        self._indexed_values[pk] = values
+        for name, index in self._hash_indexes.items():
+            index.setdefault(values[name], set()).add(pk)
+        for name, sorted_index in self._sorted_indexes.items():
+            if values[name] is not None:
+                insort(sorted_index, (values[name], pk))
+
+    def _unindex(self, pk: int) -> None:
+        values = self._indexed_values.pop(pk, None)
+        if values is None:
+            return
+        for name, index in self._hash_indexes.items():
+            pks = index[values[name]]
+            pks.discard(pk)
+            if not pks:
+                del index[values[name]]
+        for name, sorted_index in self._sorted_indexes.items():
+            if values[name] is not None:
+                position = bisect_left(sorted_index, (values[name], pk))
+                del sorted_index[position]
+
+    def _lookup(self, name: str, condition: Any) -> set[int] | None:
+        """
+        Найти по индексу id объектов, удовлетворяющих условию на поле name.
+        Возвращает None, если подходящего индекса нет
+        """
+        if name in self._hash_indexes and (
+                isinstance(condition, In) or not isinstance(condition, Condition)):
+            index = self._hash_indexes[name]
+            values = condition.values if isinstance(condition, In) else [condition]
+            return set().union(*(index.get(value, ()) for value in values))
+        if name in self._sorted_indexes and isinstance(condition, Range):
+            sorted_index = self._sorted_indexes[name]
+            start, stop = 0, len(sorted_index)
+            if condition.lower is not None:
+                bisect = bisect_left if condition.include_lower else bisect_right
+                start = bisect(sorted_index, condition.lower,
+                               key=lambda item: item[0])
+            if condition.upper is not None:
+                bisect = bisect_right if condition.include_upper else bisect_left
+                stop = bisect(sorted_index, condition.upper,
+                              key=lambda item: item[0])
+            return {pk for _, pk in sorted_index[start:stop]}
+        return None
+
+    def _select(self, where: dict[str, Any] | None) -> list[T]:
+        """
+        Выбрать объекты по условию, используя индексы, если они есть
+        """
+        if where is None:
+            return list(self._container.values())
+        candidates: set[int] | None = None
+        for name, condition in where.items():
+            pks = self._lookup(name, condition)
+            if pks is not None:
+                candidates = pks if candidates is None else candidates & pks
+        if candidates is None:
+            return [obj for obj in self._container.values() if matches(obj, where)]
+        objs = (self._container[pk] for pk in sorted(candidates))
+        return [obj for obj in objs if matches(obj, where)]
 
+    @instrumented
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
         pk = next(self._counter)
         self._container[pk] = obj
         obj.pk = pk
+        self._index(pk, obj)
         return pk
 
+    @instrumented
     def get(self, pk: int) -> T | None:
         return self._container.get(pk)
 
-    def get_all(self, where: dict[str, Any] | None = None) -> list[T]:
-        if where is None:
-            return list(self._container.values())
-        return [obj for obj in self._container.values()
-                if all(getattr(obj, attr) == value for attr, value in where.items())]
+    @instrumented
+    def get_all(self, where: dict[str, Any] | None = None,
+                order_by: str | Sequence[str] | None = None,
+                limit: int | None = None) -> list[T]:
+        objs = self._select(where)
+        sort_objects(objs, order_by)
+        return objs if limit is None else objs[:limit]
+
+    @instrumented
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000,
+                 after_pk: int = 0,
+                 limit: int | None = None) -> Iterator[T]:
+        # объекты уже в памяти, поэтому batch_size не используется
+        if where is not None:
+            objs = sorted(self._select(where), key=lambda obj: obj.pk)
+            yield from islice((obj for obj in objs if obj.pk > after_pk), limit)
+            return
+        pks = sorted(pk for pk in self._container if pk > after_pk)
+        yield from islice(
+            (self._container[pk] for pk in pks if pk in self._container), limit
+        )
+
+    @instrumented
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        index = self._hash_indexes.get(parent_field)
+        if index is None:
+            return super().get_descendants(pk, parent_field)
+        return walk_tree(pk, lambda parent: [
+            self._container[child] for child in sorted(index.get(parent, ()))
+        ])
 
+    @instrumented
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
+        self._unindex(obj.pk)
         self._container[obj.pk] = obj
+        self._index(obj.pk, obj)
 
+    @instrumented
     def delete(self, pk: int) -> None:
         self._container.pop(pk)
+        self._unindex(pk)
+
+    @instrumented
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        pks = []
+        for obj in objs:
+            pk = next(self._counter)
+            self._container[pk] = obj
+            obj.pk = pk
+            self._index(pk, obj)
+            pks.append(pk)
+        return pks
+
+    @instrumented
+    def update_many(self, objs: Iterable[T]) -> None:
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        for obj in objs:
+            self._unindex(obj.pk)
+            self._container[obj.pk] = obj
+            self._index(obj.pk, obj)
+
+    @instrumented
+    def delete_many(self, pks: Iterable[int]) -> None:
+        pks = list(dict.fromkeys(pks))
+        missing = [pk for pk in pks if pk not in self._container]
+        if missing:
+            raise KeyError(missing[0])
+        for pk in pks:
+            del self._container[pk]
+            self._unindex(pk)
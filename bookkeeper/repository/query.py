@@ -0,0 +1,259 @@
+"""
+Модуль описывает условия выборки для метода get_all репозиториев
+и построитель параметризованных sql-запросов
+
+Условие выборки задается словарем {'название_поля': значение}, где значение -
+либо конкретное значение поля (проверка на равенство, None - проверка на NULL),
+либо объект условия: Range (диапазон) или In (вхождение в набор значений).
+
+Построитель выдает sql-запросы с параметрами "?". Текст запроса зависит только
+от таблицы, набора полей и видов условий, но не от значений, поэтому sqlite
+повторно использует подготовленные выражения из своего кэша.
+"""
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Iterable, Sequence
+
+
+class Condition(ABC):
+    """
+    Условие на значение одного поля
+    """
+
+    @abstractmethod
+    def to_sql(self, name: str) -> tuple[str, list[Any]]:
+        """ Вернуть sql-выражение для поля name и список параметров """
+
+    @abstractmethod
+    def match(self, value: Any) -> bool:
+        """ Проверить, удовлетворяет ли значение поля условию """
+
+
+@dataclass(frozen=True)
+class Range(Condition):
+    """
+    Диапазон значений. Незаданная граница (None) не ограничивает выборку.
+    По умолчанию нижняя граница включается, верхняя - нет
+    """
+    lower: Any = None
+    upper: Any = None
+    include_lower: bool = True
+    include_upper: bool = False
+
+    def to_sql(self, name: str) -> tuple[str, list[Any]]:
+        parts = []
+        params = []
+        if self.lower is not None:
+            parts.append(f"{name} {'>=' if self.include_lower else '>'} ?")
+            params.append(self.lower)
+        if self.upper is not None:
+            parts.append(f"{name} {'<=' if self.include_upper else '<'} ?")
+            params.append(self.upper)
+        if not parts:
+            return '1', []
+        return ' AND '.join(parts), params
+
+    def match(self, value: Any) -> bool:
+        if value is None:
+            return False
+        if self.lower is not None:
+            if value < self.lower or (value == self.lower and not self.include_lower):
+                return False
+        if self.upper is not None:
+            if value > self.upper or (value == self.upper and not self.include_upper):
+                return False
+        return True
+
+
+@dataclass(frozen=True, init=False)
+class In(Condition):
+    """
+    Вхождение значения поля в набор значений
+    """
+    values: tuple[Any, ...]
+
+    def __init__(self, values: Iterable[Any]) -> None:
+        object.__setattr__(self, 'values', tuple(values))
+
+    def to_sql(self, name: str) -> tuple[str, list[Any]]:
+        if not self.values:
+            return '0', []
+        return f"{name} IN ({', '.join('?' * len(self.values))})", list(self.values)
+
+    def match(self, value: Any) -> bool:
+        return value in self.values
+
+
+def matches(obj: Any, where: dict[str, Any]) -> bool:
+    """
+    Проверить, удовлетворяет ли объект условию выборки
+    """
+    for name, condition in where.items():
+        value = getattr(obj, name)
+        if isinstance(condition, Condition):
+            if not condition.match(value):
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def parse_order_by(order_by: str | Sequence[str] | None) -> list[tuple[str, bool]]:
+    """
+    Разобрать порядок сортировки: название поля или список названий,
+    префикс "-" означает сортировку по убыванию.
+    Возвращает список пар (название_поля, по_убыванию)
+    """
+    if order_by is None:
+        return []
+    if isinstance(order_by, str):
+        order_by = [order_by]
+    return [(name[1:], True) if name.startswith('-') else (name, False)
+            for name in order_by]
+
+
+def sort_objects(objs: list[Any],
+                 order_by: str | Sequence[str] | None) -> list[Any]:
+    """
+    Отсортировать объекты в памяти в соответствии с order_by
+    """
+    for name, descending in reversed(parse_order_by(order_by)):
+        objs.sort(key=lambda obj, attr=name: getattr(obj, attr), reverse=descending)
+    return objs
+
+
+def build_where(where: dict[str, Any] | None) -> tuple[str, list[Any]]:
+    """
+    Построить условие WHERE (без ключевого слова) и список параметров.
+    Поля упорядочиваются по имени, чтобы текст запроса не зависел
+    от порядка ключей в словаре
+    """
+    if not where:
+        return '', []
+    parts = []
+    params: list[Any] = []
+    for name, condition in sorted(where.items()):
+        if isinstance(condition, Condition):
+            sql, condition_params = condition.to_sql(name)
+            parts.append(sql)
+            params.extend(condition_params)
+        elif condition is None:
+            parts.append(f'{name} IS NULL')
+        else:
+            parts.append(f'{name} = ?')
+            params.append(condition)
+    return ' AND '.join(parts), params
+
+
+def build_select(table: str,
+                 where: dict[str, Any] | None = None,
+                 order_by: str | Sequence[str] | None = None,
+                 limit: int | None = None,
+                 columns: str = '*') -> tuple[str, list[Any]]:
+    """
+    Построить параметризованный запрос SELECT
+
+    :param table: название таблицы
+    :param where: условие выборки
+    :param order_by: порядок сортировки (см. parse_order_by)
+    :param limit: максимальное число записей
+    :param columns: выбираемые столбцы
+    :return: текст запроса и список параметров
+    """
+    query = f'SELECT {columns} FROM {table}'
+    clause, params = build_where(where)
+    if clause:
+        query += f' WHERE {clause}'
+    order = parse_order_by(order_by)
+    if order:
+        query += ' ORDER BY ' + ', '.join(
+            f"{name} {'DESC' if descending else 'ASC'}" for name, descending in order
+        )
+    if limit is not None:
+        query += ' LIMIT ?'
+        params.append(limit)
+    return query, params
+
+
+AGGREGATES = ('sum', 'count', 'avg', 'min', 'max')
+PERIODS = ('day', 'week', 'month')
+
+
+def parse_group_by(
+        group_by: str | Sequence[str] | None) -> list[tuple[str, str | None]]:
+    """
+    Разобрать группировку: название поля или список названий.
+    Для полей-дат можно указать период через двоеточие:
+    'expense_date:day', 'expense_date:week' (с понедельника), 'expense_date:month'.
+    Возвращает список пар (название_поля, период или None)
+    """
+    if group_by is None:
+        return []
+    if isinstance(group_by, str):
+        group_by = [group_by]
+    out: list[tuple[str, str | None]] = []
+    for item in group_by:
+        name, _, period = item.partition(':')
+        if period and period not in PERIODS:
+            raise ValueError(f'unknown period {period}, use one of {PERIODS}')
+        out.append((name, period or None))
+    return out
+
+
+def truncate_date(value: datetime, period: str) -> datetime:
+    """ Округлить дату вниз до начала дня, недели (понедельник) или месяца """
+    day = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'day':
+        return day
+    if period == 'week':
+        return day - timedelta(days=day.weekday())
+    return day.replace(day=1)
+
+
+def aggregate_objects(objs: Iterable[Any], name: str, func: str = 'sum',
+                      group_by: str | Sequence[str] | None = None
+                      ) -> dict[tuple[Any, ...], float]:
+    """
+    Посчитать агрегат func (sum, count, avg, min, max) по полю name
+    за один проход по объектам с группировкой group_by (см. parse_group_by).
+    Возвращает словарь {ключ группы (кортеж): значение}, упорядоченный по ключам.
+    Без группировки ключ - пустой кортеж
+    """
+    if func not in AGGREGATES:
+        raise ValueError(f'unknown aggregate {func}, use one of {AGGREGATES}')
+    groups = parse_group_by(group_by)
+    sums: dict[tuple[Any, ...], float] = {}
+    counts: dict[tuple[Any, ...], int] = {}
+    extremes: dict[tuple[Any, ...], Any] = {}
+    pick = min if func == 'min' else max
+    for obj in objs:
+        key = tuple(
+            getattr(obj, field) if period is None
+            else truncate_date(getattr(obj, field), period)
+            for field, period in groups
+        )
+        value = getattr(obj, name)
+        if value is None:
+            continue
+        counts[key] = counts.get(key, 0) + 1
+        if func in ('sum', 'avg'):
+            sums[key] = sums.get(key, 0.0) + value
+        elif func in ('min', 'max'):
+            extremes[key] = pick(extremes[key], value) if key in extremes else value
+    if not groups and func in ('sum', 'count'):
+        # как в sql: сумма и число записей пустой выборки равны нулю
+        sums.setdefault((), 0.0)
+        counts.setdefault((), 0)
+    if func == 'count':
+        result: dict[tuple[Any, ...], Any] = counts
+    elif func == 'sum':
+        result = sums
+    elif func == 'avg':
+        result = {key: sums[key] / counts[key] for key in counts}
+    else:
+        result = extremes
+    # None (NULL) в ключах идет первым, как при сортировке в sqlite
+    return dict(sorted(result.items(), key=lambda item: tuple(
+        (value is not None, value) for value in item[0]
+    )))
@@ -1,22 +1,120 @@
 """
 Модель реализует репозиторий, работающий с СУБД sqlite
+
+Вторичные индексы таблицы задаются в модели через метаданные полей dataclass:
+    field(metadata={'index': True}) - индекс по одному полю
+    field(metadata={'index': ('duration', 'expiration_date')}) - составной индекс
+
+Столбцам таблицы назначаются типы по аннотациям модели (см. SQL_TYPES).
+Даты хранятся целым числом секунд от 1970-01-01 (наивные даты считаются
+заданными в UTC) и преобразуются зарегистрированными в sqlite3 адаптером
+и конвертером, поэтому сравнение дат в запросах - сравнение целых чисел.
+
+Если репозиторию передана очередь записи (WriteQueue), все методы записи
+выполняются через нее в потоке-писателе с групповой фиксацией транзакций.
+
+Статистика вызовов методов и запросов собирается, если репозиторию
+и его пулу подключено инструментирование (см. instrumentation).
 """
+from dataclasses import fields as dataclass_fields, is_dataclass
+from datetime import datetime, timedelta, timezone
+from functools import wraps
 from inspect import get_annotations
+from operator import itemgetter
 import sqlite3
-from typing import Any, Optional
+from types import NoneType
+from typing import (
+    Any, Callable, Iterable, Iterator, Optional, Sequence, TypeVar, get_args
+)
 
 from bookkeeper.repository.abstract_repository import AbstractRepository, T
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.connection_pool import ConnectionPool
+from bookkeeper.repository.instrumentation import Instrumentation, instrumented
+from bookkeeper.repository.write_queue import WriteQueue
+from bookkeeper.repository.query import (
+    Range, build_select, build_where, parse_group_by, parse_order_by
+)
 
 
 DB_FILE = 'bookkeeper/databases/client.sqlite.db'
 
+DATETIME_TYPE = 'DATETIME_INT'
+SQL_TYPES: dict[type, str] = {
+    bool: 'INTEGER',
+    int: 'INTEGER',
+    float: 'REAL',
+    str: 'TEXT',
+    datetime: DATETIME_TYPE,
+}
+EPOCH = datetime(1970, 1, 1)
+SECONDS_IN_DAY = 86400
+SECONDS_IN_WEEK = 7 * SECONDS_IN_DAY
+WEEK_OFFSET = 4 * SECONDS_IN_DAY  # 1970-01-05 - понедельник
+SQL_AGGREGATES = {'sum': 'TOTAL', 'count': 'COUNT', 'avg': 'AVG',
+                  'min': 'MIN', 'max': 'MAX'}
+
+
+def adapt_datetime(value: datetime) -> int:
+    """ Переводит дату в число секунд от начала эпохи """
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return (value - EPOCH) // timedelta(seconds=1)
+
+
+def convert_datetime(value: bytes) -> datetime:
+    """ Переводит число секунд от начала эпохи, прочитанное из базы, в дату """
+    return EPOCH + timedelta(seconds=int(value))
+
+
+sqlite3.register_adapter(datetime, adapt_datetime)
+sqlite3.register_converter(DATETIME_TYPE, convert_datetime)
+
+
+def get_sql_type(annotation: Any) -> str:
+    """
+    Возвращает тип столбца sqlite для аннотации поля модели.
+    Для аннотаций вида X | None используется тип X,
+    для неизвестных типов - пустая строка (без типа)
+    """
+    args = [arg for arg in get_args(annotation) if arg is not NoneType]
+    if len(args) == 1:
+        annotation = args[0]
+    return SQL_TYPES.get(annotation, '')
+
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+def queued(method: F) -> F:
+    """
+    Декоратор метода записи: если у репозитория задана очередь записи,
+    метод выполняется через нее. Если поток уже держит соединение пула
+    (идет его собственная транзакция), метод выполняется сразу в ней
+    """
+    @wraps(method)
+    def wrapper(self: 'SQLiteRepository', *args: Any, **kwargs: Any) -> Any:
+        if self.write_queue is None or self.pool.holds_connection():
+            return method(self, *args, **kwargs)
+        return self.write_queue.call(method, self, *args, **kwargs)
+    return wrapper  # type: ignore[return-value]
+
 
 class SQLiteRepository(AbstractRepository[T]):
     """
     Класс репозитория, работающий с sqlite
     Методы:
         CRUD - add, get, update, delete, get_all
-        Работа с таблицами - create_table, drop_table
+        Постраничное чтение - iter_all
+        Изменение и суммирование поля одним запросом - increment, total
+        Агрегаты с группировкой (GROUP BY) - aggregate
+        Обход иерархии рекурсивным запросом - get_ancestors, get_descendants
+        Пакетные операции в одной транзакции - add_many, update_many, delete_many
+        Работа с таблицами - create_table, drop_table, create_indexes
+        План выполнения запроса - explain
+        Работа с соединениями - close
+        Методы записи выполняются через очередь записи write_queue, если она задана
+        Статистика вызовов собирается в instrumentation, если оно подключено
         Адаптер для парсинга данных с СУБД - __parse_query_to_class
     """
 
@@ -24,144 +122,544 @@ class SQLiteRepository(AbstractRepository[T]):
     table_name: str
     cls: type
     fields: dict[str, type]
+    indexes: list[tuple[str, ...]]
+    pool: ConnectionPool
+    write_queue: WriteQueue | None
+    instrumentation: Instrumentation | None
 
-    def __init__(self, cls: type, db_file: str = DB_FILE) -> None:
+    def __init__(self, cls: type, db_file: str = DB_FILE,
+                 pool: ConnectionPool | None = None,
+                 write_queue: WriteQueue | None = None,
+                 instrumentation: Instrumentation | None = None) -> None:
+        """
+        :param cls: класс модели данных
+        :param db_file: относительный путь к СУБД
+        :param pool: пул соединений; если не задан, создается собственный
+        :param write_queue: очередь записи с групповой фиксацией (по тому же пулу)
+        :param instrumentation: сборщик статистики; подключается и к пулу
+        """
         self.db_file = db_file
+        self.pool = pool if pool is not None else ConnectionPool(db_file)
+        self._owns_pool = pool is None
+        self.write_queue = write_queue
+        self.instrumentation = instrumentation
+        if instrumentation is not None:
+            self.pool.instrumentation = instrumentation
         self.table_name = cls.__name__.lower()
         self.fields = get_annotations(cls, eval_str=True)
         self.fields.pop('pk')
         self.cls = cls
+        self.indexes = self.get_model_indexes(cls)
+        self._from_row = self._row_factory()
+        self._check_fields(name for index in self.indexes for name in index)
         self.create_table()
 
     def reset_db_file(self, db_file: str = DB_FILE) -> None:
         """
         Функия меняет файл для сохранения базы данных (БЕЗ переноса данных!)
+        Доступна только репозиторию с собственным пулом соединений: пул
+        и очередь записи, переданные извне (например, общие для репозиториев
+        repository_factory), используются и другими репозиториями
         """
+        if not self._owns_pool:
+            raise RuntimeError(
+                'cannot reset db file of a repository with a shared connection pool, '
+                'create new repositories instead'
+            )
         self.drop_table()
+        self.pool.close()
         self.db_file = db_file
+        self.pool = ConnectionPool(db_file, instrumentation=self.instrumentation)
         self.create_table()
 
     def create_table(self) -> None:
         """
         Создает таблицу в базе данных, если она не существует
         """
-        with sqlite3.connect(self.db_file) as con:
+        with self.pool.connection() as con:
             cur = con.cursor()
-            query = f"CREATE TABLE IF NOT EXISTS {self.table_name} "
-            query += "(pk INTEGER PRIMARY KEY, "
-            query += ', '.join(list(self.fields.keys())) + ')'
-            cur.execute(query)
-        con.close()
+            columns = {row[1]: row[2] for row in cur.execute(
+                f"PRAGMA table_info({self.table_name})"
+            )}
+            if columns:
+                self._migrate_table(cur, columns)
+            cur.execute(self._create_query())
+        self.create_indexes()
+
+    def _create_query(self) -> str:
+        query = f"CREATE TABLE IF NOT EXISTS {self.table_name} "
+        query += "(pk INTEGER PRIMARY KEY, "
+        query += ', '.join(
+            f'{name} {get_sql_type(annotation)}'.rstrip()
+            for name, annotation in self.fields.items()
+        ) + ')'
+        return query
+
+    def _migrate_table(self, cur: sqlite3.Cursor, columns: dict[str, str]) -> None:
+        """
+        Переносит данные из существующей таблицы, если ее столбцы
+        не совпадают с полями модели или их типами.
+        Даты, хранившиеся строками, переводятся в секунды от начала эпохи.
+        Перенос выполняется одной транзакцией: при ошибке таблица остается
+        прежней.
+
+        Raises
+        ------
+        ValueError - если в таблице есть даты, которые не удается разобрать
+        (перенос не выполняется, чтобы не потерять эти значения)
+        """
+        expected = {'pk': 'INTEGER'} | {
+            name: get_sql_type(annotation) for name, annotation in self.fields.items()
+        }
+        if columns == expected:
+            return
+        names = [name for name in expected if name in columns]
+        dates = [name for name in names if expected[name] == DATETIME_TYPE]
+        own_transaction = not cur.connection.in_transaction
+        if own_transaction:
+            cur.execute('BEGIN IMMEDIATE')
+        try:
+            for name in dates:
+                bad = cur.execute(
+                    f"SELECT count(*) FROM {self.table_name} WHERE typeof({name}) = "
+                    f"'text' AND strftime('%s', {name}) IS NULL"
+                ).fetchone()[0]
+                if bad:
+                    raise ValueError(f'cannot migrate table {self.table_name}: '
+                                     f'{bad} unparseable dates in column {name}')
+            old_table = f'{self.table_name}__old'
+            cur.execute(f"ALTER TABLE {self.table_name} RENAME TO {old_table}")
+            cur.execute(self._create_query())
+            values = [
+                f"CASE WHEN typeof({name}) = 'text' "
+                f"THEN CAST(strftime('%s', {name}) AS INTEGER) ELSE {name} END"
+                if name in dates else name
+                for name in names
+            ]
+            cur.execute(
+                f"INSERT INTO {self.table_name} ({', '.join(names)}) "
+                f"SELECT {', '.join(values)} FROM {old_table}"
+            )
+            cur.execute(f"DROP TABLE {old_table}")
+        except BaseException:
+            if own_transaction:
+                cur.execute('ROLLBACK')
+            raise
+        if own_transaction:
+            cur.execute('COMMIT')
+
+    @staticmethod
+    def get_model_indexes(model: type) -> list[tuple[str, ...]]:
+        """
+        Возвращает список индексов (кортежей названий полей),
+        объявленных в метаданных полей модели-dataclass
+        """
+        if not is_dataclass(model):
+            return []
+        indexes = []
+        for model_field in dataclass_fields(model):
+            index = model_field.metadata.get('index')
+            if index is True:
+                indexes.append((model_field.name,))
+            elif index:
+                indexes.append(tuple(index))
+        return indexes
+
+    def _index_name(self, index: tuple[str, ...]) -> str:
+        return f"idx_{self.table_name}_{'_'.join(index)}"
+
+    def create_indexes(self) -> None:
+        """
+        Создает объявленные в модели индексы и удаляет созданные ранее
+        индексы таблицы, которых больше нет в модели
+        """
+        declared = {self._index_name(index): index for index in self.indexes}
+        prefix = f'idx_{self.table_name}_'
+        with self.pool.connection() as con:
+            existing = {name for name, in con.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = ?",
+                (self.table_name,)
+            ) if name.startswith(prefix)}
+            for name in existing - declared.keys():
+                con.execute(f"DROP INDEX IF EXISTS {name}")
+            for name, index in declared.items():
+                con.execute(
+                    f"CREATE INDEX IF NOT EXISTS {name} "
+                    f"ON {self.table_name} ({', '.join(index)})"
+                )
+
+    def _row_factory(self) -> Callable[[Sequence[Any]], T]:
+        """
+        Возвращает функцию, создающую объект модели из строки таблицы.
+        Для dataclass значения передаются конструктору позиционно
+        (в порядке полей модели, без промежуточного словаря),
+        для прочих классов - именованными аргументами
+        """
+        cls = self.cls
+        columns = ['pk', *self.fields]
+        if not is_dataclass(cls) or any(not f.init for f in dataclass_fields(cls)):
+            return lambda row: cls(**dict(zip(columns, row)))
+        names = [f.name for f in dataclass_fields(cls)]
+        if sorted(names) != sorted(columns):
+            return lambda row: cls(**dict(zip(columns, row)))
+        if names == columns:
+            return lambda row: cls(*row)
+        getter = itemgetter(*(columns.index(name) for name in names))
+        return lambda row: cls(*getter(row))
 
     def __parse_query_to_class(self, query: tuple[Any] | None) -> Optional[T] | None:
-        if query is not None:
-            query_dict = dict(zip({"pk": int} | self.fields, query))
-            out = self.cls(**query_dict)
-        else:
-            out = None
-        return out
+        if query is None:
+            return None
+        return self._from_row(query)
 
     def drop_table(self) -> None:
         """
         Удаляет таблицу из базы данных
         """
-        with sqlite3.connect(self.db_file) as con:
+        with self.pool.connection() as con:
             cur = con.cursor()
             cur.execute(f"DROP TABLE IF EXISTS {self.table_name}")
-        con.close()
 
+    @instrumented
+    @queued
     def add(self, obj: T) -> int:
         if getattr(obj, 'pk', None) != 0:
             raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
         names = ', '.join(self.fields.keys())
         placeholders = ', '.join("?" * len(self.fields))
         values = [getattr(obj, x) for x in self.fields]
-        with sqlite3.connect(self.db_file) as con:
+        with self.pool.connection() as con:
             cur = con.cursor()
-            cur.execute('PRAGMA foreign_keys = ON')
             cur.execute(
                 f'INSERT INTO {self.table_name} ({names}) VALUES ({placeholders})',
                 values
             )
             obj.pk = cur.lastrowid
-        con.close()
         return obj.pk
 
+    @instrumented
     def get(self, pk: int) -> T | None:
-        with sqlite3.connect(self.db_file) as con:
+        with self.pool.connection() as con:
             cur = con.cursor()
             raw_res = cur.execute(
-                f"SELECT * FROM {self.table_name} WHERE pk={pk}"
+                f"SELECT * FROM {self.table_name} WHERE pk = ?", (pk,)
             )
             res = self.__parse_query_to_class(raw_res.fetchone())
-        con.close()
         return res
 
+    def _check_fields(self, names: Iterable[str]) -> None:
+        """
+        Проверяет, что поля есть в таблице (названия полей попадают
+        в текст запроса, значения передаются параметрами)
+        """
+        for name in names:
+            if name != 'pk' and name not in self.fields:
+                raise ValueError(f'unknown field {name} in table {self.table_name}')
+
+    @instrumented
     def get_all(
             self, where: dict[str, Any] | None = None,
-            subquery: str | None = None) -> list[Optional[T]]:
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            query = f"SELECT * FROM {self.table_name}"
-            if where is not None:
-                query += " WHERE " + ' AND '.join(
-                    [f"{key} = {value}"
-                     for key, value in where.items()
-                     if value is not None
-                     and isinstance(value, int) or isinstance(value, float)] +
-                    [f"{key} = '{value}'"
-                     for key, value in where.items()
-                     if value is not None
-                     and not (isinstance(value, int) or isinstance(value, float))]
-                )
-            if subquery is not None:
-                query += " " + subquery
+            order_by: str | Sequence[str] | None = None,
+            limit: int | None = None) -> list[T]:
+        """
+        Получить все записи по условию where (см. AbstractRepository.get_all)
+        """
+        self._check_fields(where or {})
+        self._check_fields(name for name, _ in parse_order_by(order_by))
+        query, params = build_select(self.table_name, where, order_by, limit)
+        with self.pool.connection() as con:
+            res = con.execute(query, params).fetchall()
+        return list(map(self._from_row, res))
+
+    @instrumented
+    def iter_all(self, where: dict[str, Any] | None = None,
+                 batch_size: int = 1000,
+                 after_pk: int = 0,
+                 limit: int | None = None) -> Iterator[T]:
+        """
+        Лениво перебирает записи пачками по batch_size, используя пагинацию
+        по ключу (WHERE pk > последний_id ORDER BY pk LIMIT batch_size).
+        Соединение берется из пула только на время чтения одной пачки,
+        поэтому приостановленный перебор не занимает соединение.
+        Условие на pk в where заменяется условием постраничного перебора
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be positive')
+        self._check_fields(where or {})
+        last_pk = after_pk
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            page_where = (where or {}) | {
+                'pk': Range(lower=last_pk, include_lower=False)
+            }
+            query, params = build_select(self.table_name, page_where, 'pk', size)
+            with self.pool.connection() as con:
+                rows = con.execute(query, params).fetchmany(size)
+            for row in rows:
+                yield self._from_row(row)
+            if len(rows) < size:
+                return
+            last_pk = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def explain(
+            self, where: dict[str, Any] | None = None,
+            order_by: str | Sequence[str] | None = None,
+            limit: int | None = None) -> list[str]:
+        """
+        Возвращает план выполнения (EXPLAIN QUERY PLAN) запроса,
+        который get_all выполнит с теми же аргументами
+        """
+        self._check_fields(where or {})
+        self._check_fields(name for name, _ in parse_order_by(order_by))
+        query, params = build_select(self.table_name, where, order_by, limit)
+        with self.pool.connection() as con:
+            plan = con.execute(f"EXPLAIN QUERY PLAN {query}", params).fetchall()
+        return [row[-1] for row in plan]
 
-            raw_res = cur.execute(query)
-            res = raw_res.fetchall()
-        con.close()
-        out = [self.__parse_query_to_class(res[pk]) for pk in range(len(res))]
-        return out
+    @instrumented
+    @queued
+    def increment(self, name: str, delta: float,
+                  where: dict[str, Any] | None = None) -> int:
+        """ Прибавляет delta к полю name одним запросом UPDATE """
+        self._check_fields([name, *(where or {})])
+        clause, params = build_where(where)
+        query = f"UPDATE {self.table_name} SET {name} = {name} + ?"
+        if clause:
+            query += f" WHERE {clause}"
+        with self.pool.connection() as con:
+            return con.execute(query, [delta, *params]).rowcount
 
+    @instrumented
+    def total(self, name: str, where: dict[str, Any] | None = None) -> float:
+        """ Считает сумму поля name одним запросом SELECT TOTAL(...) """
+        self._check_fields([name, *(where or {})])
+        query, params = build_select(self.table_name, where, columns=f"TOTAL({name})")
+        with self.pool.connection() as con:
+            return con.execute(query, params).fetchone()[0]
+
+    def _group_expression(self, name: str, period: str | None) -> str:
+        """ sql-выражение для группировки по полю или по периоду даты """
+        if period is None:
+            return name
+        if self.fields[name] is not datetime:
+            raise ValueError(f'field {name} is not a date, cannot group by {period}')
+        # % в sqlite округляет к нулю, для дат до 1970 года нужен остаток
+        # с округлением вниз, как в python: ((x % n) + n) % n
+        if period == 'day':
+            return (f"({name} - (({name} % {SECONDS_IN_DAY}) + {SECONDS_IN_DAY})"
+                    f" % {SECONDS_IN_DAY})")
+        if period == 'week':
+            shifted = f"({name} - {WEEK_OFFSET})"
+            return (f"({name} - (({shifted} % {SECONDS_IN_WEEK}) + {SECONDS_IN_WEEK})"
+                    f" % {SECONDS_IN_WEEK})")
+        return f"CAST(strftime('%s', {name}, 'unixepoch', 'start of month') AS INTEGER)"
+
+    @instrumented
+    def aggregate(self, name: str, func: str = 'sum',
+                  group_by: str | Sequence[str] | None = None,
+                  where: dict[str, Any] | None = None
+                  ) -> dict[tuple[Any, ...], float]:
+        """ Считает агрегат одним запросом SELECT ... GROUP BY """
+        if func not in SQL_AGGREGATES:
+            raise ValueError(
+                f'unknown aggregate {func}, use one of {tuple(SQL_AGGREGATES)}'
+            )
+        groups = parse_group_by(group_by)
+        self._check_fields([name, *(field for field, _ in groups), *(where or {})])
+        expressions = [self._group_expression(field, period) for field, period in groups]
+        columns = ', '.join([*expressions, f"{SQL_AGGREGATES[func]}({name})"])
+        query, params = build_select(self.table_name, where, columns=columns)
+        if expressions:
+            grouping = ', '.join(expressions)
+            query += f" GROUP BY {grouping} ORDER BY {grouping}"
+        with self.pool.connection() as con:
+            rows = con.execute(query, params).fetchall()
+        value_is_date = func in ('min', 'max') and self.fields.get(name) is datetime
+        result = {}
+        for *key, value in rows:
+            if value is None and not groups:
+                continue
+            key = [EPOCH + timedelta(seconds=item) if period is not None else item
+                   for item, (_, period) in zip(key, groups)]
+            if value_is_date and value is not None:
+                value = EPOCH + timedelta(seconds=value)
+            result[tuple(key)] = value
+        return result
+
+    @instrumented
+    def get_ancestors(self, pk: int, parent_field: str = 'parent',
+                      include_self: bool = False) -> list[T]:
+        """
+        Получает предков записи одним рекурсивным запросом (WITH RECURSIVE).
+        Пройденные id накапливаются в пути, поэтому при цикле в ссылках
+        на родителя каждая запись возвращается один раз
+        """
+        self._check_fields([parent_field])
+        query = f"""
+            WITH RECURSIVE ancestors(pk, depth, path) AS (
+                SELECT pk, 0, '/' || pk || '/' FROM {self.table_name} WHERE pk = ?
+                UNION ALL
+                SELECT t.{parent_field}, a.depth + 1, a.path || t.{parent_field} || '/'
+                FROM {self.table_name} t JOIN ancestors a ON t.pk = a.pk
+                WHERE t.{parent_field} IS NOT NULL
+                    AND instr(a.path, '/' || t.{parent_field} || '/') = 0
+            )
+            SELECT t.* FROM {self.table_name} t JOIN ancestors a ON t.pk = a.pk
+            WHERE a.depth >= ? ORDER BY a.depth
+        """
+        with self.pool.connection() as con:
+            rows = con.execute(query, (pk, 0 if include_self else 1)).fetchall()
+        return list(map(self._from_row, rows))
+
+    @instrumented
+    def get_descendants(self, pk: int, parent_field: str = 'parent') -> list[T]:
+        """
+        Получает потомков записи одним рекурсивным запросом (WITH RECURSIVE).
+        Порядок обхода в глубину задается путем из id, дополненных нулями;
+        запись, уже входящая в путь (цикл в ссылках на родителя),
+        повторно не обходится
+        """
+        self._check_fields([parent_field])
+        query = f"""
+            WITH RECURSIVE descendants(pk, path) AS (
+                SELECT pk, printf('%020d/%020d/', ?1, pk)
+                FROM {self.table_name} WHERE {parent_field} = ?1 AND pk != ?1
+                UNION ALL
+                SELECT t.pk, d.path || printf('%020d/', t.pk)
+                FROM {self.table_name} t JOIN descendants d ON t.{parent_field} = d.pk
+                WHERE instr(d.path, printf('%020d/', t.pk)) = 0
+            )
+            SELECT t.* FROM {self.table_name} t JOIN descendants d ON t.pk = d.pk
+            ORDER BY d.path
+        """
+        with self.pool.connection() as con:
+            rows = con.execute(query, (pk,)).fetchall()
+        return list(map(self._from_row, rows))
+
+    @instrumented
+    @queued
     def update(self, obj: T) -> None:
         if obj.pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        with sqlite3.connect(self.db_file) as con:
-            cur = con.cursor()
-            sql_query = f"UPDATE {self.table_name} SET "
-            sql_query += ','.join(
-                [f"{attr} = {val}"
-                 for attr, val in obj.__dict__.items()
-                 if attr != 'pk' and val is not None
-                 and isinstance(val, int) or isinstance(val, float)] +
-                [f"{attr} = '{val}'"
-                 for attr, val in obj.__dict__.items()
-                 if attr != 'pk' and val is not None
-                 and not (isinstance(val, int) or isinstance(val, float))]
+        assignments = ', '.join(f'{name} = ?' for name in self.fields)
+        values = [getattr(obj, x) for x in self.fields]
+        with self.pool.connection() as con:
+            con.execute(
+                f"UPDATE {self.table_name} SET {assignments} WHERE pk = ?",
+                [*values, obj.pk]
             )
-            sql_query += f" WHERE pk={obj.pk}"
-            cur.execute(sql_query)
-        con.close()
 
+    @instrumented
+    @queued
     def delete(self, pk: int) -> None:
         if pk == 0:
             raise ValueError('attempt to update object with unknown primary key')
-        with sqlite3.connect(self.db_file) as con:
+        with self.pool.connection() as con:
+            con.execute(f"DELETE FROM {self.table_name} WHERE pk = ?", (pk,))
+
+    @instrumented
+    @queued
+    def add_many(self, objs: Iterable[T]) -> list[int]:
+        """
+        Добавляет объекты одной транзакцией через executemany.
+        Первичные ключи назначаются подряд после максимального в таблице
+        и записываются в атрибут pk объектов после успешной вставки
+        """
+        objs = list(objs)
+        for obj in objs:
+            if getattr(obj, 'pk', None) != 0:
+                raise ValueError(f'trying to add object {obj} with filled `pk` attribute')
+        if not objs:
+            return []
+        names = ', '.join(['pk', *self.fields.keys()])
+        placeholders = ', '.join("?" * (len(self.fields) + 1))
+        with self.pool.connection() as con:
             cur = con.cursor()
-            cur.execute(
-                f"DELETE FROM {self.table_name} WHERE pk={pk}"
+            if not con.in_transaction:
+                cur.execute('BEGIN IMMEDIATE')
+            last_pk = cur.execute(
+                f'SELECT COALESCE(MAX(pk), 0) FROM {self.table_name}'
+            ).fetchone()[0]
+            pks = list(range(last_pk + 1, last_pk + len(objs) + 1))
+            cur.executemany(
+                f'INSERT INTO {self.table_name} ({names}) VALUES ({placeholders})',
+                [[pk, *(getattr(obj, x) for x in self.fields)]
+                 for pk, obj in zip(pks, objs)]
+            )
+        for pk, obj in zip(pks, objs):
+            obj.pk = pk
+        return pks
+
+    @instrumented
+    @queued
+    def update_many(self, objs: Iterable[T]) -> None:
+        """ Обновляет объекты одной транзакцией через executemany """
+        objs = list(objs)
+        if any(obj.pk == 0 for obj in objs):
+            raise ValueError('attempt to update object with unknown primary key')
+        assignments = ', '.join(f'{name} = ?' for name in self.fields)
+        with self.pool.connection() as con:
+            con.executemany(
+                f'UPDATE {self.table_name} SET {assignments} WHERE pk = ?',
+                [[*(getattr(obj, x) for x in self.fields), obj.pk] for obj in objs]
             )
-        con.close()
+
+    @instrumented
+    @queued
+    def delete_many(self, pks: Iterable[int]) -> None:
+        """ Удаляет записи по списку id одной транзакцией через executemany """
+        pks = list(pks)
+        if 0 in pks:
+            raise ValueError('attempt to delete object with unknown primary key')
+        with self.pool.connection() as con:
+            con.executemany(
+                f'DELETE FROM {self.table_name} WHERE pk = ?',
+                [(pk,) for pk in pks]
+            )
+
+    def close(self) -> None:
+        """
+        Закрывает очередь записи и пул соединений репозитория.
+        Пул и очередь общие для всех репозиториев, созданных одной фабрикой
+        """
+        if self.write_queue is not None:
+            self.write_queue.close()
+        self.pool.close()
 
     @classmethod
     def repository_factory(
-            cls, models: list[type], db_file: str | None = None
-    ) -> dict[type, type]:
+            cls, models: list[type], db_file: str | None = None,
+            pool_size: int = 5, cache_size: int | None = None,
+            pragmas: dict[str, Any] | None = None, group_commit: bool = False,
+            instrumentation: Instrumentation | None = None
+    ) -> dict[type, AbstractRepository[Any]]:
         """
         Создает хэш с таблицами по моделям данных (Паттерн AbstractFactory)
+        Все репозитории используют один общий пул соединений
 
         :param models: список классов, описывающих аннотацию типов в таблице
         :param db_file: относительный путь к СУБД
+        :param pool_size: максимальное число соединений в пуле
+        :param cache_size: если задан, репозитории оборачиваются
+            в CachedRepository с кэшем на cache_size объектов
+        :param pragmas: профиль настроек соединений (см. connection_pool)
+        :param group_commit: писать через общую очередь записи (WriteQueue)
+        :param instrumentation: общий сборщик статистики репозиториев и пула
         :return: хэш с репозиториями для классов-аннотаций
         """
-        return {model: cls(model, db_file) for model in models}
+        if db_file is None:
+            db_file = DB_FILE
+        pool = ConnectionPool(db_file, size=pool_size, pragmas=pragmas,
+                              instrumentation=instrumentation)
+        write_queue = WriteQueue(pool) if group_commit else None
+        repos: dict[type, AbstractRepository[Any]] = {
+            model: cls(model, db_file, pool, write_queue, instrumentation)
+            for model in models
+        }
+        if cache_size is not None:
+            return {model: CachedRepository(repo, max_size=cache_size)
+                    for model, repo in repos.items()}
+        return repos
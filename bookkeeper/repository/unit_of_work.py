@@ -0,0 +1,91 @@
+"""
+Модуль описывает единицу работы (unit of work) - транзакцию,
+охватывающую несколько репозиториев
+
+Репозитории sqlite, созданные одной фабрикой, используют общий пул соединений,
+а поток, получивший соединение пула, использует его во всех вложенных вызовах.
+Единица работы держит соединение пула на время блока with, поэтому все
+операции репозиториев в блоке выполняются в одной транзакции, которая
+фиксируется один раз в конце блока (одна запись на диск) или откатывается
+целиком при исключении.
+"""
+from contextlib import ExitStack
+import threading
+from types import TracebackType
+from typing import Any, Iterable
+
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.connection_pool import ConnectionPool
+
+
+class UnitOfWork:
+    """
+    Контекстный менеджер транзакции над репозиториями:
+        with UnitOfWork(repos):
+            expenses_repo.add(expense)
+            budget_repo.increment('amount', expense.amount, where)
+    Репозитории - список или словарь, который возвращает repository_factory
+    (в том числе с CachedRepository). Транзакция действует в текущем потоке.
+    Вложенные блоки входят во внешнюю транзакцию.
+    По окончании внешнего блока (фиксации или отката) кэши репозиториев
+    очищаются. При откате атрибуты pk у объектов, добавленных в блоке,
+    остаются заполненными.
+    Репозитории в памяти не поддерживают откат: их изменения сохраняются.
+    """
+
+    repositories: list[AbstractRepository]
+    pools: list[ConnectionPool]
+
+    def __init__(self, repositories: Iterable[AbstractRepository]
+                 | dict[type, AbstractRepository]) -> None:
+        if isinstance(repositories, dict):
+            repositories = repositories.values()
+        self.repositories = list(repositories)
+        pools: dict[int, ConnectionPool] = {}
+        for repo in self.repositories:
+            pool = getattr(repo, 'pool', None)
+            if isinstance(pool, ConnectionPool):
+                pools.setdefault(id(pool), pool)
+        self.pools = list(pools.values())
+        self._local = threading.local()
+
+    def __enter__(self) -> 'UnitOfWork':
+        stacks = self._stacks()
+        stack = ExitStack()
+        try:
+            for pool in self.pools:
+                con = stack.enter_context(pool.connection())
+                if not con.in_transaction:
+                    con.execute('BEGIN IMMEDIATE')
+        except BaseException:
+            stack.close()
+            raise
+        stacks.append(stack)
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None,
+                 exc: BaseException | None, traceback: TracebackType | None) -> Any:
+        stacks = self._stacks()
+        stack = stacks.pop()
+        try:
+            suppressed = stack.__exit__(exc_type, exc, traceback)
+        except BaseException:
+            # не удалось зафиксировать транзакцию
+            self._clear_caches()
+            raise
+        if exc_type is not None or not stacks:
+            # пока транзакция была открыта, другие потоки могли прочитать
+            # и закэшировать прежние версии измененных записей
+            self._clear_caches()
+        return suppressed
+
+    def _stacks(self) -> list[ExitStack]:
+        if not hasattr(self._local, 'stacks'):
+            self._local.stacks = []
+        return self._local.stacks
+
+    def _clear_caches(self) -> None:
+        for repo in self.repositories:
+            clear = getattr(repo, 'clear', None)
+            if callable(clear):
+                clear()
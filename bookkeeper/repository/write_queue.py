@@ -0,0 +1,135 @@
+"""
+Модуль описывает очередь записи в базу данных sqlite с групповой фиксацией
+
+В sqlite одновременно писать может только одно соединение, поэтому
+при записи из нескольких потоков соединения ждут друг друга и могут
+получить ошибку "database is locked", а каждая фиксация транзакции
+требует сброса данных на диск. Очередь записи выполняет все операции
+записи в одном потоке-писателе и объединяет операции, поступившие
+почти одновременно, в одну транзакцию (group commit).
+"""
+from concurrent.futures import Future
+import queue
+import threading
+import time
+from typing import Any, Callable
+
+from bookkeeper.repository.connection_pool import ConnectionPool
+
+
+class WriteQueue:
+    """
+    Очередь операций записи, выполняемых в отдельном потоке-писателе.
+    Писатель берет из очереди до max_batch операций (ожидая следующую
+    не дольше max_delay секунд) и выполняет их в одной транзакции,
+    каждую - в своей точке сохранения (SAVEPOINT): ошибка в операции
+    откатывает только ее и передается в ее Future, остальные операции
+    пачки фиксируются. Операции должны брать соединение из того же пула
+    (через pool.connection()), тогда они используют соединение писателя.
+    """
+
+    pool: ConnectionPool
+    max_batch: int
+    max_delay: float
+    batches: int
+
+    def __init__(self, pool: ConnectionPool,
+                 max_batch: int = 100, max_delay: float = 0.002) -> None:
+        """
+        :param pool: пул соединений с базой данных
+        :param max_batch: максимальное число операций в одной транзакции
+        :param max_delay: время ожидания следующей операции пачки, в секундах
+        """
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.batches = 0
+        self._queue: queue.Queue[tuple[Callable[[], Any], Future] | None] = \
+            queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='sqlite-writer',
+                                        daemon=True)
+        self._thread.start()
+
+    def in_writer_thread(self) -> bool:
+        """ Выполняется ли вызов в потоке-писателе """
+        return threading.current_thread() is self._thread
+
+    def submit(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+        """ Поставить операцию записи в очередь, вернуть Future с ее результатом """
+        if self._closed:
+            raise RuntimeError('write queue is closed')
+        future: Future = Future()
+        self._queue.put((lambda: func(*args, **kwargs), future))
+        return future
+
+    def call(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """
+        Выполнить операцию записи через очередь и дождаться результата.
+        В потоке-писателе операция выполняется сразу
+        """
+        if self.in_writer_thread():
+            return func(*args, **kwargs)
+        return self.submit(func, *args, **kwargs).result()
+
+    def _next_batch(self) -> list[tuple[Callable[[], Any], Future]] | None:
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+            if item is None:
+                # дописать пачку и остановиться
+                self._queue.put(None)
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._execute(batch)
+            except Exception as exc:  # pylint: disable=broad-except
+                # не удалось начать или зафиксировать транзакцию
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(exc)
+
+    def _execute(self, batch: list[tuple[Callable[[], Any], Future]]) -> None:
+        results: list[tuple[Future, bool, Any]] = []
+        with self.pool.connection() as con:
+            if not con.in_transaction:
+                con.execute('BEGIN IMMEDIATE')
+            for func, future in batch:
+                con.execute('SAVEPOINT write_queue')
+                try:
+                    result = func()
+                except Exception as exc:  # pylint: disable=broad-except
+                    con.execute('ROLLBACK TO write_queue')
+                    results.append((future, False, exc))
+                else:
+                    results.append((future, True, result))
+                con.execute('RELEASE write_queue')
+        self.batches += 1
+        # результаты сообщаются только после фиксации транзакции
+        for future, ok, value in results:
+            if ok:
+                future.set_result(value)
+            else:
+                future.set_exception(value)
+
+    def close(self) -> None:
+        """ Выполнить операции, уже поставленные в очередь, и остановить писателя """
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
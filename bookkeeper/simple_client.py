@@ -18,7 +18,7 @@ if MODE == "prod":
     exp_repo = SQLiteRepository(Expense)
 else:
     print("Development version")
-    cat_repo = MemoryRepository[Category]()
+    cat_repo = MemoryRepository[Category](hash_indexes=['name', 'parent'])
     exp_repo = MemoryRepository[Expense]()
 
 cats = '''
@@ -0,0 +1,252 @@
+"""
+Генератор синтетических данных для нагрузочного тестирования и замеров
+
+Данные похожи на настоящие и полностью определяются зерном seed:
+    категории - дерево заданной глубины, число потомков каждой категории
+        случайно и в среднем равно fanout
+    расходы - категории выбираются с распределением Ципфа (немногие
+        категории встречаются очень часто), даты - в пределах days дней
+        от start с плотностью, растущей к концу периода и выше в выходные,
+        суммы - логнормальные
+    бюджеты - дневные, недельные и месячные бюджеты с пересекающимися
+        периодами; сумма потраченного (amount) согласована с расходами
+Категории, расходы и бюджеты генерируются отдельными потоками случайных
+чисел, поэтому, например, число бюджетов не влияет на расходы.
+
+Данные записываются пакетами через add_many репозиториев (write_repositories)
+или напрямую в файл sqlite одной транзакцией (write_sqlite).
+
+Запуск: python -m bookkeeper.synthetic_data --db-file big.db --expenses 1000000
+"""
+import argparse
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from itertools import accumulate, islice
+import random
+import time
+from typing import Any, Iterable, Iterator, TypeVar, cast
+
+from dateutil.relativedelta import relativedelta
+
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.abstract_repository import AbstractRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository, adapt_datetime
+
+START = datetime(2022, 1, 1)
+WORDS = ('продукты', 'транспорт', 'жилье', 'связь', 'одежда', 'здоровье',
+         'книги', 'кафе', 'спорт', 'подарки', 'путешествия', 'техника')
+DURATIONS = {'День': relativedelta(days=1), 'Неделя': relativedelta(weeks=1),
+             'Месяц': relativedelta(months=1)}
+WEEKEND_WEIGHT = 2.0
+
+M = TypeVar('M')
+
+
+def generate_categories(count: int, depth: int = 4, fanout: int = 8,
+                        seed: int = 0) -> list[Category]:
+    """
+    Дерево из count категорий глубиной не больше depth уровней.
+    Категории упорядочены по уровням (родитель раньше потомков),
+    pk назначены подряд с 1, названия уникальны
+    """
+    if count and depth < 1:
+        raise ValueError('depth must be positive')
+    rnd = random.Random(f'{seed}:categories')
+    categories: list[Category] = []
+    level: list[int | None] = [None]
+    for _ in range(depth):
+        next_level: list[int | None] = []
+        for parent in level:
+            # корней столько же, сколько потомков у категории
+            for _ in range(rnd.randint(1, 2 * fanout - 1)):
+                if len(categories) == count:
+                    return categories
+                pk = len(categories) + 1
+                categories.append(Category(f'{rnd.choice(WORDS)} {pk}', parent, pk))
+                next_level.append(pk)
+        level = next_level
+        if not level:
+            break
+    # дерево заполнено до глубины depth, оставшиеся категории - корни
+    while len(categories) < count:
+        pk = len(categories) + 1
+        categories.append(Category(f'{rnd.choice(WORDS)} {pk}', None, pk))
+    return categories
+
+
+def zipf_weights(count: int, exponent: float = 1.1) -> list[float]:
+    """ Накопленные веса распределения Ципфа для count значений """
+    return list(accumulate(1 / rank ** exponent for rank in range(1, count + 1)))
+
+
+def iter_expenses(categories: list[Category], count: int,
+                  start: datetime = START, days: int = 365,
+                  seed: int = 0, exponent: float = 1.1) -> Iterator[Expense]:
+    """
+    Лениво выдает count расходов по категориям categories
+    (даты не упорядочены, pk не заполнен)
+    """
+    if not categories:
+        raise ValueError('expenses need at least one category')
+    rnd = random.Random(f'{seed}:expenses')
+    names = [category.name for category in categories]
+    rnd.shuffle(names)
+    cum_weights = zipf_weights(len(names), exponent)
+    span = days * 86400
+    while count > 0:
+        batch = min(count, 10000)
+        count -= batch
+        for name in rnd.choices(names, cum_weights=cum_weights, k=batch):
+            while True:
+                # плотность растет к концу периода, в выходные расходов больше
+                date = start + timedelta(seconds=int(span * rnd.random() ** 0.5))
+                if date.weekday() >= 5 or rnd.random() * WEEKEND_WEIGHT < 1:
+                    break
+            yield Expense(amount=round(rnd.lognormvariate(6, 1), 2), category=name,
+                          expense_date=date, added_date=date, comment='')
+
+
+def generate_budgets(count: int, start: datetime = START, days: int = 365,
+                     seed: int = 0) -> list[Budget]:
+    """
+    count бюджетов на день, неделю или месяц со случайными датами начала
+    в периоде; суммы потраченного нулевые (см. fill_budget_amounts)
+    """
+    rnd = random.Random(f'{seed}:budgets')
+    budgets = []
+    for _ in range(count):
+        duration = rnd.choice(tuple(DURATIONS))
+        begin = start + timedelta(seconds=rnd.randrange(max(days, 1) * 86400))
+        budgets.append(Budget(amount=0.0, limits=float(rnd.randrange(1, 100) * 1000),
+                              duration=duration,
+                              expiration_date=begin + DURATIONS[duration],
+                              start_date=begin))
+    return budgets
+
+
+def fill_budget_amounts(budgets: list[Budget],
+                        expenses: Iterable[tuple[int, float]]) -> None:
+    """
+    Записывает в бюджеты суммы расходов за их периоды (start_date, expiration_date].
+    expenses - пары (дата расхода в секундах от начала эпохи, сумма)
+    """
+    pairs = sorted(expenses)
+    dates = [date for date, _ in pairs]
+    totals = [0.0, *accumulate(amount for _, amount in pairs)]
+    for budget in budgets:
+        first = bisect_right(dates, adapt_datetime(budget.start_date))
+        last = bisect_right(dates, adapt_datetime(budget.expiration_date))
+        budget.amount = round(totals[last] - totals[first], 2)
+
+
+def _batches(objs: Iterable[M], size: int) -> Iterator[list[M]]:
+    iterator = iter(objs)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def write_repositories(repos: dict[type, AbstractRepository[Any]],
+                       categories: list[Category], expenses: Iterable[Expense],
+                       budgets: list[Budget], batch_size: int = 10000) -> None:
+    """
+    Записывает данные в пустые репозитории пакетами через add_many.
+    pk категорий, назначенные репозиторием, должны совпасть со сгенерированными
+    """
+    cat_repo = repos[Category]
+    for categories_batch in _batches(categories, batch_size):
+        expected = [category.pk for category in categories_batch]
+        for category in categories_batch:
+            category.pk = 0
+        if cat_repo.add_many(categories_batch) != expected:
+            raise ValueError('category repository is not empty')
+    seen: list[tuple[int, float]] = []
+    for expenses_batch in _batches(expenses, batch_size):
+        repos[Expense].add_many(expenses_batch)
+        seen.extend((adapt_datetime(e.expense_date), e.amount) for e in expenses_batch)
+    fill_budget_amounts(budgets, seen)
+    repos[Budget].add_many(budgets)
+
+
+def write_sqlite(db_file: str, categories: list[Category],
+                 expenses: Iterable[Expense], budgets: list[Budget],
+                 batch_size: int = 10000) -> None:
+    """
+    Записывает данные прямо в файл sqlite одной транзакцией, без создания
+    объектов репозиториев на каждую строку и без сброса на диск до конца
+    записи. Таблицы создаются по моделям, существующие данные удаляются.
+    Соединения закрываются в конце записи, поэтому отключенный сброс
+    на диск (synchronous = OFF) действует только на эту запись
+    """
+    repos = _sqlite_repositories(db_file)
+
+    def insert(model: type, rows: Iterable[tuple[Any, ...]]) -> None:
+        repo = repos[model]
+        names = ['pk', *repo.fields] if model is Category else list(repo.fields)
+        con.executemany(f"INSERT INTO {repo.table_name} ({', '.join(names)}) "
+                        f"VALUES ({', '.join('?' * len(names))})", rows)
+
+    with repos[Category].pool.connection() as con:
+        con.execute('PRAGMA synchronous = OFF')
+        con.execute('BEGIN IMMEDIATE')
+        for repo in repos.values():
+            con.execute(f'DELETE FROM {repo.table_name}')
+        insert(Category, ((c.pk, c.name, c.parent) for c in categories))
+        seen: list[tuple[int, float]] = []
+        for expenses_batch in _batches(expenses, batch_size):
+            rows = [(e.amount, e.category, adapt_datetime(e.expense_date),
+                     adapt_datetime(e.added_date), e.comment) for e in expenses_batch]
+            insert(Expense, rows)
+            seen.extend((row[2], row[0]) for row in rows)
+        fill_budget_amounts(budgets, seen)
+        insert(Budget, ((b.amount, b.limits, b.duration, b.expiration_date,
+                         b.start_date) for b in budgets))
+    # пул общий для репозиториев фабрики
+    repos[Category].close()
+
+
+def _sqlite_repositories(db_file: str) -> dict[type, SQLiteRepository[Any]]:
+    """ Репозитории sqlite с общим пулом соединений (без кэша) """
+    repos = SQLiteRepository.repository_factory([Category, Expense, Budget], db_file)
+    return {model: cast(SQLiteRepository[Any], repo) for model, repo in repos.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--db-file', required=True)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--categories', type=int, default=1000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--fanout', type=int, default=8)
+    parser.add_argument('--expenses', type=int, default=100000)
+    parser.add_argument('--budgets', type=int, default=300)
+    parser.add_argument('--start', type=datetime.fromisoformat, default=START)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--skew', type=float, default=1.1,
+                        help='показатель распределения Ципфа для категорий')
+    parser.add_argument('--batch-size', type=int, default=10000)
+    parser.add_argument('--through-repositories', action='store_true',
+                        help='писать через add_many репозиториев')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    categories = generate_categories(args.categories, args.depth, args.fanout,
+                                     args.seed)
+    expenses = iter_expenses(categories, args.expenses, args.start, args.days,
+                             args.seed, args.skew)
+    budgets = generate_budgets(args.budgets, args.start, args.days, args.seed)
+    if args.through_repositories:
+        repos = _sqlite_repositories(args.db_file)
+        write_repositories(dict(repos), categories, expenses, budgets,
+                           args.batch_size)
+        repos[Category].close()
+    else:
+        write_sqlite(args.db_file, categories, expenses, budgets, args.batch_size)
+    elapsed = time.perf_counter() - started
+    rows = args.categories + args.expenses + args.budgets
+    print(f'{rows} rows in {elapsed:.1f} s ({rows / elapsed:.0f} rows/s)')
+
+
+if __name__ == "__main__":
+    main()
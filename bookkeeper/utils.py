@@ -2,7 +2,8 @@
 Вспомогательные функции
 """
 
-from typing import Iterable, Iterator
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Iterator
 
 
 def _get_indent(line: str) -> int:
@@ -16,11 +17,12 @@ def _lines_with_indent(lines: Iterable[str]) -> Iterator[tuple[int, str]]:
         yield _get_indent(line), line.strip()
 
 
-def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
+def iter_tree(lines: Iterable[str]) -> Iterator[tuple[str, str | None]]:
     """
-    Прочитать структуру дерева из текста на основе отступов. Вернуть список
-    пар "потомок-родитель" в порядке топологической сортировки. Родитель
-    элемента верхнего уровня - None.
+    Прочитать структуру дерева из текста на основе отступов за один проход,
+    выдавая пары "потомок-родитель" по мере чтения строк в порядке
+    топологической сортировки. Родитель элемента верхнего уровня - None.
+    Файл не загружается в память целиком.
 
     Пример. Следующий текст:
     parent
@@ -38,14 +40,13 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     ----------
     lines - Итерируемый объект, содержащий строки текста (файл или список строк)
 
-    Returns
+    Yields
     -------
-    Список пар "потомок-родитель"
+    Пары "потомок-родитель"
     """
     parents: list[tuple[str | None, int]] = []
     last_indent = -1
     last_name = None
-    result: list[tuple[str, str | None]] = []
     for i, (indent, name) in enumerate(_lines_with_indent(lines)):
         if indent > last_indent:
             parents.append((last_name, last_indent))
@@ -57,92 +58,175 @@ def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
                     f'unindent does not match any outer indentation '
                     f'level in line {i}:\n'
                 )
-        result.append((name, parents[-1][0]))
+        yield name, parents[-1][0]
         last_name = name
         last_indent = indent
-    return result
 
 
-def build_dict_tree_from_list(sorted_list: list) -> dict:
+def read_tree(lines: Iterable[str]) -> list[tuple[str, str | None]]:
     """
-    Функция строит из массива записей вида (имя, родительский id, id)
-    дерево с json-подобной структурой (ключи - id)
+    Прочитать структуру дерева из текста на основе отступов. Вернуть список
+    пар "потомок-родитель" в порядке топологической сортировки (см. iter_tree)
     """
-    tree = {}
-    for element in sorted_list:
-        set_elem_in_tree(tree, element)
-    return tree
+    return list(iter_tree(lines))
 
 
-def get_elem_in_tree(tree: dict, pk: int) -> list | None:
+@dataclass
+class CategoryNode:
     """
-    Функция по id элемента ищет его в json-like дереве
+    Узел дерева категорий: id, название, id родителя и потомки (по id)
     """
-    for key, value in tree.items():
-        if key != pk and isinstance(key, int):
-            item = get_elem_in_tree(value, pk)
-            if item is not None:
-                return item
-        elif key == pk:
-            return value
+    pk: int
+    name: str
+    parent: int | None = None
+    children: dict[int, 'CategoryNode'] = field(default_factory=dict)
 
 
-def get_elem_parent(tree: dict, pk: int, prev_parent: int = None) -> int | None:
+class CategoryTree:
     """
-    Функция по id элемента ищет id его родителя в json-like дереве
+    Дерево категорий с индексом узлов по id.
+    Поиск, добавление, переименование и перенос узла выполняются за O(1),
+    удаление - за O(размер поддерева).
+    Узлы можно добавлять в любом порядке: узел, родитель которого еще
+    не добавлен, ждет его и присоединяется к нему при добавлении родителя.
+    Такие узлы не входят в дерево, пока родитель не появится.
     """
-    for key, value in tree.items():
-        if key != pk and isinstance(key, int):
-            parent = get_elem_parent(value, pk, key)
-            if parent is not None:
-                return parent
-        elif key == pk:
-            return prev_parent
 
-
-def set_elem_in_tree(tree: dict, elem: list[type]) -> None:
-    """
-    Функция по заданной записи вида (имя, родительский id, id) меняет элемент в дереве
+    def __init__(self) -> None:
+        self._nodes: dict[int, CategoryNode] = {}
+        self._roots: dict[int, CategoryNode] = {}
+        self._waiting: dict[int, dict[int, CategoryNode]] = {}
+
+    @classmethod
+    def from_list(cls, elements: Iterable[Any]) -> 'CategoryTree':
+        """
+        Построить дерево из записей с атрибутами name, parent и pk
+        (например, объектов Category) в любом порядке
+        """
+        tree = cls()
+        for element in elements:
+            tree.add(element.pk, element.name, element.parent)
+        return tree
+
+    def __contains__(self, pk: int) -> bool:
+        return pk in self._nodes
+
+    def __len__(self) -> int:
+        return len(self._nodes)
+
+    def get(self, pk: int) -> CategoryNode | None:
+        """ Найти узел по id """
+        return self._nodes.get(pk)
+
+    def get_parent(self, pk: int) -> int | None:
+        """ Найти id родителя узла """
+        return self._nodes[pk].parent
+
+    def roots(self) -> list[CategoryNode]:
+        """ Узлы верхнего уровня """
+        return list(self._roots.values())
+
+    def children(self, parent: int | None) -> dict[int, CategoryNode]:
+        """ Потомки узла (для None - узлы верхнего уровня) по id в порядке добавления """
+        return self._siblings(parent) if parent is None or parent in self._nodes else {}
+
+    def is_attached(self, pk: int) -> bool:
+        """
+        Входит ли узел в дерево, т.е. известны ли все его предки.
+        Проверка выполняется за O(глубина узла)
+        """
+        node = self._nodes.get(pk)
+        while node is not None:
+            if node.parent is None:
+                return True
+            node = self._nodes.get(node.parent)
+        return False
+
+    def _siblings(self, parent: int | None) -> dict[int, CategoryNode]:
+        if parent is None:
+            return self._roots
+        if parent in self._nodes:
+            return self._nodes[parent].children
+        return self._waiting.setdefault(parent, {})
+
+    def add(self, pk: int, name: str, parent: int | None = None) -> CategoryNode:
+        """ Добавить узел """
+        if pk in self._nodes:
+            raise KeyError(f'node {pk} already exists')
+        node = CategoryNode(pk, name, parent, self._waiting.pop(pk, {}))
+        self._nodes[pk] = node
+        self._siblings(parent)[pk] = node
+        return node
+
+    def rename(self, pk: int, name: str) -> None:
+        """ Переименовать узел """
+        self._nodes[pk].name = name
+
+    def move(self, pk: int, parent: int | None) -> None:
+        """ Перенести узел вместе с поддеревом к другому родителю """
+        node = self._nodes[pk]
+        ancestor = parent
+        while ancestor is not None and ancestor in self._nodes:
+            if ancestor == pk:
+                raise ValueError(f'cannot move node {pk} into its own subtree')
+            ancestor = self._nodes[ancestor].parent
+        del self._siblings(node.parent)[pk]
+        node.parent = parent
+        self._siblings(parent)[pk] = node
+
+    def delete(self, pk: int) -> list[int]:
+        """ Удалить узел вместе с поддеревом, вернуть id удаленных узлов """
+        node = self._nodes[pk]
+        del self._siblings(node.parent)[pk]
+        removed = []
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            removed.append(current.pk)
+            del self._nodes[current.pk]
+            stack.extend(current.children.values())
+        return removed
+
+    def to_dict(self) -> dict:
+        """
+        Выгрузить дерево в json-подобный словарь (ключи - id):
+        {id: {"name": название, id_потомка: {...}, ...}, ...}
+        """
+        def export(node: CategoryNode) -> dict:
+            out: dict = {"name": node.name}
+            for child in node.children.values():
+                out[child.pk] = export(child)
+            return out
+
+        return {pk: export(node) for pk, node in self._roots.items()}
+
+
+def build_dict_tree_from_list(sorted_list: Iterable[Any]) -> dict:
     """
-    if elem.parent is None:
-        tree[elem.pk] = {"name": elem.name}
-    else:
-        if isinstance(tree, dict):
-            for key, value in tree.items():
-                if key != elem.parent:
-                    set_elem_in_tree(value, elem)
-                else:
-                    value[elem.pk] = {"name": elem.name}
-                    break
-
-
-def delete_elem_from_tree(tree: dict, pk: int) -> None:
+    Функция строит из массива записей с атрибутами name, parent и pk
+    (например, объектов Category) дерево с json-подобной структурой (ключи - id).
+    Записи могут идти в любом порядке
     """
-    Функция по id элемента удаляет его из json-like дерева
-    """
-    for key, value in tree.items():
-        if key != pk and isinstance(key, int):
-            delete_elem_from_tree(value, pk)
-        elif key == pk:
-            del tree[key]
-            break
+    return CategoryTree.from_list(sorted_list).to_dict()
 
 
 if __name__ == "__main__":
+    from bookkeeper.models.category import Category
+
     example = [
-        ["продукты", None, 1],
-        ["мясо", 1, 2],
-        ["сырое мясо", 2, 3],
-        ["мясные продукты", 2, 4],
-        ["сладости", 1, 5],
-        ["книги", None, 6],
-        ["одежда", None, 7],
+        Category("мясные продукты", 2, 4),
+        Category("продукты", None, 1),
+        Category("мясо", 1, 2),
+        Category("сырое мясо", 2, 3),
+        Category("сладости", 1, 5),
+        Category("книги", None, 6),
+        Category("одежда", None, 7),
     ]
 
-    sample_tree = build_dict_tree_from_list(example)
-    set_elem_in_tree(sample_tree, ['почта', 5, 8])
-    set_elem_in_tree(sample_tree, ['пицца', 5, 8])
-    print(get_elem_parent(sample_tree, 6))
-    print(get_elem_in_tree(sample_tree, 8))
-    delete_elem_from_tree(sample_tree, 2)
-    print(sample_tree)
+    sample_tree = CategoryTree.from_list(example)
+    sample_tree.add(8, 'почта', 5)
+    sample_tree.rename(8, 'пицца')
+    print(sample_tree.get_parent(6))
+    print(sample_tree.get(8))
+    sample_tree.delete(2)
+    print(sample_tree.to_dict())
@@ -4,7 +4,7 @@
 import sys
 from functools import partial
 from typing import Optional, Callable
-from PySide6 import QtWidgets
+from PySide6 import QtCore, QtWidgets
 
 from bookkeeper.view.expenses_page import expensesPage
 from bookkeeper.view.categories_page import categoriesPage
@@ -57,8 +57,6 @@ class MainWindow(QtWidgets.QWidget):
     get_categories_handler: Optional[Callable]
     add_expense_handler: Optional[Callable]
     edit_expense_handler: Optional[Callable]
-    edit_budgets_handler: Optional[Callable]
-    get_db_expense_handler: Optional[Callable]
 
     get_budgets_handler: Optional[Callable]
     set_budgets_handler: Optional[Callable]
@@ -85,9 +83,7 @@ class MainWindow(QtWidgets.QWidget):
             get_handler=self.get_expenses_handler,
             get_categories_handler=self.get_categories_handler,
             add_handler=self.add_expense_handler,
-            edit_handler=self.edit_expense_handler,
-            edit_budgets_handler=self.edit_budgets_handler,
-            get_db_expense_handler=self.get_db_expense_handler
+            edit_handler=self.edit_expense_handler
         )
         self.categories_page = categoriesPage(
             get_handler=self.get_category_handler,
@@ -119,14 +115,28 @@ class MainWindow(QtWidgets.QWidget):
         self.get_categories_handler = handlers[1]
         self.add_expense_handler = handlers[2]
         self.edit_expense_handler = handlers[3]
-        self.edit_budgets_handler = handlers[4]
-        self.get_db_expense_handler = handlers[5]
 
     def register_budgets_handlers(self, handlers: list[Optional[Callable]]) -> None:
         self.get_budgets_handler = handlers[0]
         self.set_budgets_handler = handlers[1]
 
 
+class CallbackDispatcher(QtCore.QObject):
+    """
+    Передает функции из фоновых потоков в поток интерфейса:
+    сигнал, испущенный в другом потоке, доставляется через очередь событий
+    """
+    callback = QtCore.Signal(object)
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.callback.connect(self.run, QtCore.Qt.QueuedConnection)
+
+    @QtCore.Slot(object)
+    def run(self, callback: Callable[[], None]) -> None:
+        callback()
+
+
 class View:
     app: QtWidgets.QApplication
     window: MainWindow
@@ -136,6 +146,14 @@ class View:
 
     def __init__(self) -> None:
         self.app = QtWidgets.QApplication(sys.argv)
+        self.dispatcher = CallbackDispatcher()
+
+    def dispatch(self, callback: Callable[[], None]) -> None:
+        """ Вызвать функцию в потоке интерфейса (из любого потока) """
+        self.dispatcher.callback.emit(callback)
+
+    def show_error(self, message: str) -> None:
+        QtWidgets.QMessageBox.critical(self.window, 'Ошибка', message)
 
     def start_app(self) -> None:
         self.window = MainWindow(
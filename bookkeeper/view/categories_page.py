@@ -4,14 +4,174 @@
 from PySide6 import QtWidgets, QtCore
 from typing import Callable, Optional
 
+from bookkeeper.utils import CategoryTree
+
+
+class CategoryTreeModel(QtCore.QAbstractItemModel):
+    """
+    Модель дерева категорий поверх индексированного дерева CategoryTree.
+    Индекс элемента хранит id категории, поэтому родитель находится по индексу
+    дерева за O(1), а номер строки - по словарю id -> строка потомков родителя.
+    Изменения (добавление, переименование, перенос, удаление категории)
+    применяются к дереву точечно и сообщаются представлению сигналами
+    только для затронутых строк.
+    """
+    headers = ["Список категорий", "Id категории"]
+
+    def __init__(self, tree: CategoryTree, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.tree = tree
+        # списки id потомков и номера их строк, заполняются при первом обращении
+        self._rows: dict[int | None, list[int]] = {}
+        self._row_of: dict[int | None, dict[int, int]] = {}
+
+    def _children(self, parent: int | None) -> list[int]:
+        """ Список id потомков (кэшируется, изменения вносятся точечно) """
+        if parent not in self._rows:
+            children = list(self.tree.children(parent))
+            self._rows[parent] = children
+            self._row_of[parent] = {pk: row for row, pk in enumerate(children)}
+        return self._rows[parent]
+
+    def _row(self, pk: int) -> int:
+        parent = self.tree.get_parent(pk)
+        self._children(parent)
+        return self._row_of[parent][pk]
+
+    def _append_child(self, parent: int | None, pk: int) -> None:
+        """ Учесть новую последнюю строку потомков parent """
+        children = self._rows.get(parent)
+        if children is not None:
+            self._row_of[parent][pk] = len(children)
+            children.append(pk)
+
+    def _remove_child(self, parent: int | None, row: int) -> None:
+        """ Учесть удаление строки row потомков parent """
+        children = self._rows.get(parent)
+        if children is None:
+            return
+        row_of = self._row_of[parent]
+        del row_of[children.pop(row)]
+        for shifted in range(row, len(children)):
+            row_of[children[shifted]] = shifted
+
+    def _forget(self, pks: list[int]) -> None:
+        for pk in pks:
+            self._rows.pop(pk, None)
+            self._row_of.pop(pk, None)
+
+    def _index_of(self, pk: int | None) -> QtCore.QModelIndex:
+        if pk is None:
+            return QtCore.QModelIndex()
+        return self.createIndex(self._row(pk), 0, pk)
+
+    @staticmethod
+    def _pk(index: QtCore.QModelIndex) -> int | None:
+        return index.internalId() if index.isValid() else None
+
+    def index(self, row, column, parent=QtCore.QModelIndex()):
+        children = self._children(self._pk(parent))
+        if not 0 <= row < len(children) or not 0 <= column < len(self.headers):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, children[row])
+
+    def parent(self, index=QtCore.QModelIndex()):
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self._index_of(self.tree.get_parent(index.internalId()))
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        if parent.isValid() and parent.column() != 0:
+            return 0
+        return len(self._children(self._pk(parent)))
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return None
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role != QtCore.Qt.DisplayRole:
+            return None
+        node = self.tree.get(index.internalId())
+        return node.name if index.column() == 0 else str(node.pk)
+
+    def category_added(self, pk: int, name: str, parent: int | None) -> None:
+        """ Добавить категорию (строку в конец потомков родителя) """
+        if parent is not None and not self.tree.is_attached(parent):
+            self.tree.add(pk, name, parent)
+            return
+        row = len(self._children(parent))
+        self.beginInsertRows(self._index_of(parent), row, row)
+        self.tree.add(pk, name, parent)
+        self._append_child(parent, pk)
+        self._forget([pk])
+        self.endInsertRows()
+
+    def category_renamed(self, pk: int, name: str) -> None:
+        """ Переименовать категорию """
+        self.tree.rename(pk, name)
+        if self.tree.is_attached(pk):
+            index = self._index_of(pk)
+            self.dataChanged.emit(index, index)
+
+    def category_moved(self, pk: int, parent: int | None) -> None:
+        """ Перенести категорию с подкатегориями к другому родителю """
+        old_parent = self.tree.get_parent(pk)
+        if old_parent == parent:
+            return
+        was_attached = self.tree.is_attached(pk)
+        will_attach = parent is None or self.tree.is_attached(parent)
+        if was_attached and will_attach:
+            row = self._row(pk)
+            new_row = len(self._children(parent))
+            if not self.beginMoveRows(self._index_of(old_parent), row, row,
+                                      self._index_of(parent), new_row):
+                raise ValueError(f'cannot move category {pk} into its own subtree')
+            self.tree.move(pk, parent)
+            self._remove_child(old_parent, row)
+            self._append_child(parent, pk)
+            self.endMoveRows()
+        elif was_attached:
+            row = self._row(pk)
+            self.beginRemoveRows(self._index_of(old_parent), row, row)
+            self.tree.move(pk, parent)
+            self._remove_child(old_parent, row)
+            self.endRemoveRows()
+        elif will_attach:
+            row = len(self._children(parent))
+            self.beginInsertRows(self._index_of(parent), row, row)
+            self.tree.move(pk, parent)
+            self._append_child(parent, pk)
+            self.endInsertRows()
+        else:
+            self.tree.move(pk, parent)
+
+    def category_deleted(self, pk: int) -> None:
+        """ Удалить категорию вместе с подкатегориями """
+        parent = self.tree.get_parent(pk)
+        if not self.tree.is_attached(pk):
+            self.tree.delete(pk)
+            return
+        row = self._row(pk)
+        self.beginRemoveRows(self._index_of(parent), row, row)
+        removed = self.tree.delete(pk)
+        self._remove_child(parent, row)
+        self._forget(removed)
+        self.endRemoveRows()
+
 
 class categoriesList(QtWidgets.QWidget):
     """
     Элемент отображения дерева категорий
 
     Для отображения необходимо указать функцию,
-    которая будет возвращать дерево для отображения
-    (json-like объект)
+    которая будет возвращать дерево категорий (CategoryTree).
+    Дальнейшие изменения передаются методами category_added,
+    category_changed и category_deleted и применяются к модели точечно
     """
     def __init__(self, *args, category_getter: Optional[Callable], **kwargs) -> None:
         super().__init__(*args, **kwargs)
@@ -20,38 +180,21 @@ class categoriesList(QtWidgets.QWidget):
         self.layout = QtWidgets.QVBoxLayout()
         self.setLayout(self.layout)
 
-        self.category_tree = QtWidgets.QTreeWidget()
-        self.category_tree.setHeaderLabels(["Список категорий"])
-        self.category_tree.setColumnCount(1)
-
-        self.set_tree(category_tree_getter=category_getter)
-
-    def build_category_tree(self,
-                            data: dict[str, dict] | None = None,
-                            parent: QtWidgets.QTreeWidgetItem | QtWidgets.QTreeWidget | None = None
-                            ) -> None:
-        """Функия строит дерево в виджете,
-         на вход подается дерево категорий и родительский элемент в дереве"""
-        for key, value in data.items():
-            if not isinstance(key, str):
-                item = QtWidgets.QTreeWidgetItem(parent)
-                item.setText(0, value["name"])
-                item.setText(1, str(key))
-                if isinstance(value, dict):
-                    self.build_category_tree(data=value, parent=item)
-
-    def set_tree(self, category_tree_getter: Callable) -> None:
-        """Функция перерисовки дерева категорий"""
-        if self.category_tree.itemAt(0, 0) is not None:
-            self.layout.removeWidget(self.category_tree)
-
-        self.category_tree = QtWidgets.QTreeWidget()
-        self.category_tree.setHeaderLabels(["Список категорий", "Id категории"])
-        self.category_tree.setColumnCount(2)
-        tree_data = category_tree_getter()
-        self.build_category_tree(data=tree_data, parent=self.category_tree)
+        self.category_model = CategoryTreeModel(category_getter())
+        self.category_tree = QtWidgets.QTreeView()
+        self.category_tree.setModel(self.category_model)
         self.layout.addWidget(self.category_tree)
 
+    def category_added(self, pk: int, name: str, parent: int | None) -> None:
+        self.category_model.category_added(pk, name, parent)
+
+    def category_changed(self, pk: int, name: str, parent: int | None) -> None:
+        self.category_model.category_renamed(pk, name)
+        self.category_model.category_moved(pk, parent)
+
+    def category_deleted(self, pk: int) -> None:
+        self.category_model.category_deleted(pk)
+
 
 class addCategoryInput(QtWidgets.QWidget):
     """
@@ -1,7 +1,9 @@
 """
 Виджет для отображения страницы списка расходов в окне приложения
 """
+from dataclasses import replace
 from datetime import datetime
+from functools import partial
 from PySide6 import QtWidgets, QtCore
 from typing import Callable, Optional
 
@@ -28,81 +30,265 @@ class CategoryComboBox(QtWidgets.QWidget):
 
         self.layout.addWidget(self.category_box)
 
+    def add_category(self, name: str) -> None:
+        self.category_box.addItem(name)
+
+    def rename_category(self, old_name: str, new_name: str) -> None:
+        index = self.category_box.findText(old_name)
+        if index >= 0:
+            self.category_box.setItemText(index, new_name)
+
+    def remove_category(self, name: str) -> None:
+        index = self.category_box.findText(name)
+        if index >= 0:
+            self.category_box.removeItem(index)
+
+
+class ExpensesTableModel(QtCore.QAbstractTableModel):
+    """
+    Модель таблицы расходов с ленивой загрузкой.
+    Строки запрашиваются у презентера страницами по batch_size записей
+    (в порядке id) по мере прокрутки таблицы (canFetchMore/fetchMore).
+    В памяти хранится не больше max_pages страниц: при обращении к строке
+    выгруженной страницы она перечитывается по ключу (id последней строки
+    предыдущей страницы), а вытесняются страницы, дальше всех отстоящие
+    от нее. Изменения в таблице (правка ячейки, новый расход) сообщаются
+    представлению сигналами dataChanged/rowsInserted для затронутых строк,
+    без перестроения таблицы.
+    Страницы читаются синхронно, в потоке интерфейса (в том числе
+    перечитываются выгруженные при прокрутке к ним).
+    """
+    headers = "Дата Сумма Категория Комментарий".split()
+
+    def __init__(self, *args,
+                 page_getter: Callable[[int, int], list[Expense]],
+                 expenses_editor: Optional[Callable],
+                 error_handler: Optional[Callable[[str], None]] = None,
+                 batch_size: int = 200,
+                 max_pages: int = 10,
+                 **kwargs) -> None:
+        """
+        :param page_getter: функция (after_pk, limit) -> не более limit
+            расходов с id больше after_pk в порядке id
+        :param expenses_editor: функция сохранения измененного расхода
+            (pk, amount, category, expense_date, comment, on_saved, on_error),
+            on_saved и on_error вызываются по окончании сохранения в фоне
+        :param error_handler: функция показа ошибки ввода
+        :param batch_size: число строк, загружаемых за один раз
+        :param max_pages: число страниц, одновременно хранимых в памяти
+        """
+        super().__init__(*args, **kwargs)
+        self.page_getter = page_getter
+        self.editor = expenses_editor
+        self.error_handler = error_handler
+        self.batch_size = batch_size
+        self.max_pages = max(max_pages, 1)
+        self._count = 0
+        self._last_pk = 0
+        # after_pk каждой страницы: по нему страница перечитывается
+        self._page_keys: list[int] = []
+        self._pages: dict[int, list[Expense]] = {}
+        self._rows_by_pk: dict[int, int] = {}
+        # последние сохраненные версии расходов, правка которых еще сохраняется
+        self._saved: dict[int, Expense] = {}
+        self._exhausted = False
+
+    def rowCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else self._count
+
+    def columnCount(self, parent=QtCore.QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self.headers)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.DisplayRole):
+        if role == QtCore.Qt.DisplayRole and orientation == QtCore.Qt.Horizontal:
+            return self.headers[section]
+        return super().headerData(section, orientation, role)
+
+    def canFetchMore(self, parent=QtCore.QModelIndex()) -> bool:
+        return not parent.isValid() and not self._exhausted
+
+    def fetchMore(self, parent=QtCore.QModelIndex()) -> None:
+        if parent.isValid() or self._exhausted:
+            return
+        page = self.page_getter(self._last_pk, self.batch_size)
+        if len(page) < self.batch_size:
+            self._exhausted = True
+        if not page:
+            return
+        self._append(page)
+
+    def _append(self, expenses: list[Expense]) -> None:
+        first = self._count
+        self.beginInsertRows(QtCore.QModelIndex(), first, first + len(expenses) - 1)
+        for expense in expenses:
+            number, offset = divmod(self._count, self.batch_size)
+            if offset == 0:
+                self._page_keys.append(self._last_pk)
+                self._pages[number] = []
+            # последняя страница всегда в памяти
+            self._load(number).append(expense)
+            self._rows_by_pk[expense.pk] = self._count
+            self._count += 1
+            self._last_pk = expense.pk
+        self.endInsertRows()
+        self._evict(len(self._page_keys) - 1)
+
+    def _load(self, number: int) -> list[Expense]:
+        page = self._pages.get(number)
+        if page is None:
+            page = self.page_getter(self._page_keys[number], self.batch_size)
+            first = number * self.batch_size
+            for row, expense in enumerate(page, first):
+                self._rows_by_pk[expense.pk] = row
+            self._pages[number] = page
+            self._evict(number)
+        return page
+
+    def _evict(self, current: int) -> None:
+        """ Выгрузить страницы, дальше всех отстоящие от страницы current """
+        last = len(self._page_keys) - 1
+        while len(self._pages) > self.max_pages:
+            number = max((n for n in self._pages if n not in (current, last)),
+                         key=lambda n: abs(n - current), default=None)
+            if number is None:
+                break
+            for expense in self._pages.pop(number):
+                self._rows_by_pk.pop(expense.pk, None)
+
+    def _row(self, row: int) -> Expense | None:
+        number, offset = divmod(row, self.batch_size)
+        page = self._load(number)
+        # страница могла сократиться, если расходы удалены после загрузки
+        return page[offset] if offset < len(page) else None
+
+    def expense(self, row: int) -> Expense | None:
+        """ Расход, отображаемый в строке row """
+        return self._row(row)
+
+    def data(self, index, role=QtCore.Qt.DisplayRole):
+        if not index.isValid() or role not in (QtCore.Qt.DisplayRole,
+                                               QtCore.Qt.EditRole):
+            return None
+        expense = self._row(index.row())
+        if expense is None:
+            return None
+        column = index.column()
+        if column == 0:
+            return expense.expense_date.strftime("%d-%m-%Y")
+        if column == 1:
+            return str(expense.amount)
+        if column == 2:
+            return str(expense.category).capitalize()
+        return str(expense.comment)
+
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        return super().flags(index) | QtCore.Qt.ItemIsEditable
+
+    def setData(self, index, value, role=QtCore.Qt.EditRole) -> bool:
+        if not index.isValid() or role != QtCore.Qt.EditRole:
+            return False
+        old_value = self._row(index.row())
+        if old_value is None:
+            return False
+        try:
+            expense = self._edited(old_value, index.column(), value)
+        except ValueError as e:
+            if self.error_handler is not None:
+                self.error_handler(str(e))
+            return False
+        # сохранение идет в фоне, поэтому строка обновляется сразу,
+        # без повторного чтения расхода из репозитория; при ошибке
+        # сохранения возвращается последняя сохраненная версия
+        self._saved.setdefault(expense.pk, old_value)
+        self.expense_changed(expense)
+        try:
+            self.editor(expense.pk, expense.amount, expense.category,
+                        expense.expense_date, expense.comment,
+                        on_saved=partial(self._edit_saved, expense),
+                        on_error=partial(self._edit_failed, expense.pk))
+        except Exception:
+            self._edit_failed(expense.pk)
+            raise
+        return True
+
+    @staticmethod
+    def _edited(expense: Expense, column: int, value: str) -> Expense:
+        """
+        Расход с измененным значением столбца column.
+        ValueError - если значение не удается разобрать
+        """
+        if column == 0:
+            return replace(expense, expense_date=datetime.strptime(value, "%d-%m-%Y"))
+        if column == 1:
+            return replace(expense, amount=float(value))
+        if column == 2:
+            return replace(expense, category=value)
+        return replace(expense, comment=value)
+
+    def _edit_saved(self, expense: Expense) -> None:
+        saved = self._saved.get(expense.pk)
+        if saved is None:
+            # строка уже возвращена к прежней версии после ошибки
+            self.expense_changed(expense)
+        elif self._shown(expense.pk) in (expense, None):
+            del self._saved[expense.pk]
+        else:
+            # сохраняется более поздняя правка
+            self._saved[expense.pk] = expense
+
+    def _edit_failed(self, pk: int, _error: Exception | None = None) -> None:
+        saved = self._saved.pop(pk, None)
+        if saved is not None:
+            self.expense_changed(saved)
+
+    def _shown(self, pk: int) -> Expense | None:
+        row = self._rows_by_pk.get(pk)
+        return None if row is None else self._row(row)
+
+    def expense_changed(self, expense: Expense) -> None:
+        """ Обновить строку измененного расхода, если она загружена """
+        row = self._rows_by_pk.get(expense.pk)
+        if row is None:
+            return
+        number, offset = divmod(row, self.batch_size)
+        self._pages[number][offset] = expense
+        self.dataChanged.emit(self.index(row, 0),
+                              self.index(row, self.columnCount() - 1))
+
+    def expense_added(self, expense: Expense) -> None:
+        """
+        Показать новый расход. Если загружены еще не все строки,
+        расход появится при загрузке следующих страниц
+        """
+        if self._exhausted and expense.pk > self._last_pk:
+            self._append([expense])
+
 
 class expensesList(QtWidgets.QWidget):
-    expenses_table: QtWidgets.QTableWidget
+    expenses_table: QtWidgets.QTableView
+    expenses_model: ExpensesTableModel
 
     def __init__(self, *args,
                  expenses_getter: Optional[Callable],
                  expenses_editor: Optional[Callable],
-                 budgets_editor: Optional[Callable],
-                 db_expense_getter: Optional[Callable],
                  **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
-        self.editor = expenses_editor
-        self.setter = expenses_getter
-        self.budgets_editor = budgets_editor
-        self.db_expense_getter = db_expense_getter
-
         self.layout = QtWidgets.QVBoxLayout()
         self.setLayout(self.layout)
 
         self.expenses_title = QtWidgets.QLabel("Последние расходы")
         self.layout.addWidget(self.expenses_title)
 
-        self.expenses_table = QtWidgets.QTableWidget(4, 20)
-        self.expenses_table.setColumnCount(4)
-        self.expenses_table.setRowCount(20)
-        self.expenses_table.setHorizontalHeaderLabels(
-            "Дата Сумма Категория Комментарий".split()
-        )
-        self.header = self.expenses_table.horizontalHeader()
-        self.header.setSectionResizeMode(
-            0, QtWidgets.QHeaderView.ResizeToContents)
-        self.header.setSectionResizeMode(
-            1, QtWidgets.QHeaderView.ResizeToContents)
-        self.header.setSectionResizeMode(
-            2, QtWidgets.QHeaderView.ResizeToContents)
-        self.header.setSectionResizeMode(
-            3, QtWidgets.QHeaderView.Stretch)
-
-        self.set_expenses(expenses_getter)
-
-    def build_expenses(self, data: list[Expense]) -> None:
-        for i, row in enumerate(data):
-            self.expenses_table.setItem(
-                i, 0,
-                QtWidgets.QTableWidgetItem(
-                    datetime.strptime(
-                        row.expense_date, "%Y-%m-%d %H:%M:%S"
-                    ).strftime("%d-%m-%Y"))
-            )
-            self.expenses_table.setItem(
-                i, 1,
-                QtWidgets.QTableWidgetItem(str(row.amount))
-            )
-            self.expenses_table.setItem(
-                i, 2,
-                QtWidgets.QTableWidgetItem(str(row.category).capitalize())
-            )
-            self.expenses_table.setItem(
-                i, 3,
-                QtWidgets.QTableWidgetItem(str(row.comment))
-            )
-
-    def set_expenses(self, expenses_getter: Callable) -> None:
-        if self.expenses_table.itemAt(0, 0) is not None:
-            self.layout.removeWidget(self.expenses_table)
-
-        expenses_data = expenses_getter()
-
-        self.expenses_table = QtWidgets.QTableWidget(4, len(expenses_data))
-        self.expenses_table.setColumnCount(4)
-        self.expenses_table.setRowCount(len(expenses_data))
-        self.expenses_table.setHorizontalHeaderLabels(
-            "Дата Сумма Категория Комментарий".split()
+        self.expenses_model = ExpensesTableModel(
+            page_getter=expenses_getter,
+            expenses_editor=expenses_editor,
+            error_handler=self.show_error
         )
+        self.expenses_table = QtWidgets.QTableView()
+        self.expenses_table.setModel(self.expenses_model)
         self.header = self.expenses_table.horizontalHeader()
         self.header.setSectionResizeMode(
             0, QtWidgets.QHeaderView.ResizeToContents)
@@ -112,43 +298,13 @@ class expensesList(QtWidgets.QWidget):
             2, QtWidgets.QHeaderView.ResizeToContents)
         self.header.setSectionResizeMode(
             3, QtWidgets.QHeaderView.Stretch)
-
-        self.build_expenses(expenses_data)
-        self.expenses_table.itemChanged.connect(self.table_item_changed)
         self.layout.addWidget(self.expenses_table)
 
-    @QtCore.Slot()
-    def table_item_changed(self, item):
-        table_position = self.expenses_table.indexFromItem(item)
-        row, column = table_position.row(), table_position.column()
-
-        pk = row + 1
-        old_value = self.db_expense_getter(pk)
-        amount = old_value.amount
-        category = old_value.category
-        expense_date = old_value.expense_date
-        comment = old_value.comment
-
-        try:
-            amount = float(self.expenses_table.item(row, 1).text())
-            category = self.expenses_table.item(row, 2).text()
-            expense_date = datetime.strptime(
-                self.expenses_table.item(row, 0).text(), "%d-%m-%Y"
-            )
-            comment = self.expenses_table.item(row, 3).text()
-            if column == 1:
-                self.budgets_editor(value=-old_value.amount + amount, date=expense_date)
-            print("table item changed: ",
-                  pk, " with amount ", amount,
-                  " and category ", category,
-                  " and expense date ", expense_date,
-                  " and comment ", comment)
-        except ValueError as e:
-            self.set_expenses(self.setter)
-            QtWidgets.QMessageBox.critical(self, 'Ошибка', str(e))
+    def show_error(self, message: str) -> None:
+        QtWidgets.QMessageBox.critical(self, 'Ошибка', message)
 
-        finally:
-            self.editor(pk, amount, category, expense_date, comment)
+    def expense_added(self, expense: Expense) -> None:
+        self.expenses_model.expense_added(expense)
 
 
 class addAmountElement(QtWidgets.QWidget):
@@ -206,12 +362,10 @@ class elementAddExpense(QtWidgets.QWidget):
     def __init__(self, *args,
                  get_category_list: Callable,
                  adder: Callable,
-                 budgets_editor: Callable,
                  **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
         self.adder = adder
-        self.budgets_editor = budgets_editor
 
         self.layout = QtWidgets.QVBoxLayout()
         self.setLayout(self.layout)
@@ -251,7 +405,6 @@ class elementAddExpense(QtWidgets.QWidget):
                   " date ", date, " category ", category,
                   " comment ", comment)
             self.adder(amount, date, category, comment)
-            self.budgets_editor(value=amount, date=date)
         except ValueError as e:
             QtWidgets.QMessageBox.critical(self, 'Ошибка', str(e))
 
@@ -262,8 +415,6 @@ class expensesPage(QtWidgets.QWidget):
                  get_categories_handler: Optional[Callable],
                  add_handler: Optional[Callable],
                  edit_handler: Optional[Callable],
-                 edit_budgets_handler: Optional[Callable],
-                 get_db_expense_handler: Optional[Callable],
                  **kwargs) -> None:
         super().__init__(*args, **kwargs)
 
@@ -272,15 +423,12 @@ class expensesPage(QtWidgets.QWidget):
 
         self.expenses_list = expensesList(
             expenses_getter=get_handler,
-            expenses_editor=edit_handler,
-            budgets_editor=edit_budgets_handler,
-            db_expense_getter=get_db_expense_handler
+            expenses_editor=edit_handler
         )
         self.layout.addWidget(self.expenses_list)
 
         self.add_expense = elementAddExpense(
             get_category_list=get_categories_handler,
-            adder=add_handler,
-            budgets_editor=edit_budgets_handler
+            adder=add_handler
         )
         self.layout.addWidget(self.add_expense)
@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from bookkeeper.bookkeeper_app import Bookkeeper
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+class HeadlessView:
+    window = SimpleNamespace()
+
+    def start_app(self):
+        pass
+
+    def register_handlers(self, handlers=None):
+        pass
+
+    def dispatch(self, callback):
+        callback()
+
+    def show_error(self, message):
+        raise RuntimeError(message)
+
+
+@pytest.fixture
+def app(tmp_path):
+    repos = SQLiteRepository.repository_factory([Category, Expense, Budget],
+                                                str(tmp_path / 'app.db'))
+    app = Bookkeeper(HeadlessView(), repos)
+    yield app
+    app.executor.shutdown()
+    repos[Budget].close()
+
+
+def add_budget(app, duration, start, days):
+    budget = Budget(amount=0.0, limits=100.0, duration=duration,
+                    expiration_date=start + timedelta(days=days), start_date=start)
+    app.budget_repo.add(budget)
+    return budget
+
+
+def test_get_budget_returns_all_latest_budgets(app):
+    assert app.get_budget() == []
+    start = datetime(2023, 3, 1)
+    add_budget(app, 'День', start - timedelta(days=1), 1)
+    day = [add_budget(app, 'День', start, 1), add_budget(app, 'День', start, 1)]
+    # неделя, заканчивающаяся в тот же день, не попадает в дневные бюджеты
+    add_budget(app, 'Неделя', start - timedelta(days=10), 7)
+    week = add_budget(app, 'Неделя', start - timedelta(days=6), 7)
+    assert app.get_budget() == [*day, week]
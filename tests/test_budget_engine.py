@@ -0,0 +1,109 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+
+START = datetime(2023, 3, 1, 12, 0)
+
+
+@pytest.fixture(params=['memory', 'sqlite', 'cached'])
+def repos(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryRepository[Budget](), MemoryRepository[Expense]()
+        return
+    repos = SQLiteRepository.repository_factory(
+        models=[Budget, Expense], db_file=str(tmp_path / 'test.db'),
+        cache_size=10 if request.param == 'cached' else None
+    )
+    yield repos[Budget], repos[Expense]
+    repos[Budget].close()
+
+
+@pytest.fixture
+def engine(repos):
+    return BudgetEngine(*repos)
+
+
+def add_expense(engine, amount, date):
+    expense = Expense(amount, 'продукты', expense_date=date, added_date=date)
+    engine.expenses_repo.add(expense)
+    engine.expense_added(expense)
+    return expense
+
+
+def test_create_budget_counts_existing_expenses(engine):
+    add_expense(engine, 100, START + timedelta(hours=1))
+    add_expense(engine, 50, START + timedelta(days=2))
+    add_expense(engine, 10, START - timedelta(hours=1))
+    day = engine.create_budget(1000, 'День', START, START + timedelta(days=1))
+    week = engine.create_budget(5000, 'Неделя', START, START + timedelta(weeks=1))
+    assert day.amount == 100
+    assert week.amount == 150
+
+
+def test_added_expense_updates_budgets(engine):
+    day = engine.create_budget(1000, 'День', START, START + timedelta(days=1))
+    week = engine.create_budget(5000, 'Неделя', START, START + timedelta(weeks=1))
+    add_expense(engine, 100, START + timedelta(hours=1))
+    add_expense(engine, 30, START + timedelta(days=3))
+    assert engine.budget_repo.get(day.pk).amount == 100
+    assert engine.budget_repo.get(week.pk).amount == 130
+
+
+def test_edited_and_deleted_expense_updates_budgets(engine):
+    day = engine.create_budget(1000, 'День', START, START + timedelta(days=1))
+    week = engine.create_budget(5000, 'Неделя', START, START + timedelta(weeks=1))
+    expense = add_expense(engine, 100, START + timedelta(hours=1))
+
+    moved = Expense(70, 'продукты', expense_date=START + timedelta(days=3),
+                    added_date=START, pk=expense.pk)
+    engine.expenses_repo.update(moved)
+    engine.expense_updated(expense, moved)
+    assert engine.budget_repo.get(day.pk).amount == 0
+    assert engine.budget_repo.get(week.pk).amount == 70
+
+    engine.expenses_repo.delete(moved.pk)
+    engine.expense_deleted(moved)
+    assert engine.budget_repo.get(week.pk).amount == 0
+
+
+def test_backdated_expense(engine):
+    old = engine.create_budget(1000, 'День', START - timedelta(days=10),
+                               START - timedelta(days=9))
+    current = engine.create_budget(1000, 'День', START, START + timedelta(days=1))
+    add_expense(engine, 40, START - timedelta(days=9, hours=12))
+    assert engine.budget_repo.get(old.pk).amount == 40
+    assert engine.budget_repo.get(current.pk).amount == 0
+
+
+def test_totals_match_recount(engine):
+    week = engine.create_budget(5000, 'Неделя', START, START + timedelta(weeks=1))
+    for i in range(20):
+        add_expense(engine, i, START + timedelta(hours=10 * i))
+    assert engine.budget_repo.get(week.pk).amount == engine.spent(
+        START, START + timedelta(weeks=1))
+
+
+def test_expenses_added_batch(engine):
+    day = engine.create_budget(1000, 'День', START, START + timedelta(days=1))
+    week = engine.create_budget(5000, 'Неделя', START, START + timedelta(weeks=1))
+    old = engine.create_budget(1000, 'День', START - timedelta(days=2),
+                               START - timedelta(days=1))
+    expenses = [Expense(amount, 'продукты', expense_date=date, added_date=START)
+                for amount, date in ((10, START), (20, START + timedelta(hours=1)),
+                                     (30, START + timedelta(days=1)),
+                                     (40, START + timedelta(days=3)))]
+    engine.expenses_repo.add_many(expenses)
+    engine.expenses_added(expenses)
+    engine.expenses_added([])
+    assert engine.budget_repo.get(day.pk).amount == 50
+    assert engine.budget_repo.get(week.pk).amount == 90
+    assert engine.budget_repo.get(old.pk).amount == 0
+    assert engine.budget_repo.get(week.pk).amount == engine.spent(
+        START, START + timedelta(weeks=1))
@@ -0,0 +1,76 @@
+import threading
+
+import pytest
+
+from bookkeeper.executor import TaskExecutor
+
+
+@pytest.fixture
+def executor():
+    executor = TaskExecutor()
+    yield executor
+    executor.shutdown()
+
+
+def block(executor):
+    started = threading.Event()
+    release = threading.Event()
+
+    def wait():
+        started.set()
+        release.wait(5)
+
+    executor.submit(wait)
+    started.wait(5)
+    return release
+
+
+def test_submit_returns_result(executor):
+    assert executor.submit(lambda x, y=0: x + y, 1, y=2).result(5) == 3
+
+
+def test_callbacks_go_through_dispatch():
+    dispatched = []
+    executor = TaskExecutor(dispatch=dispatched.append)
+    results = []
+    errors = []
+    executor.submit(lambda: 42, on_done=results.append).result(5)
+    with pytest.raises(ZeroDivisionError):
+        executor.submit(lambda: 1 / 0, on_error=errors.append).result(5)
+    executor.shutdown()
+    assert results == [] and errors == []
+    for callback in dispatched:
+        callback()
+    assert results == [42]
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_pending_requests_with_same_key_are_coalesced(executor):
+    calls = []
+    release = block(executor)
+    futures = [executor.submit(calls.append, i, key='reload') for i in range(3)]
+    other = executor.submit(calls.append, 'other', key='other')
+    release.set()
+    other.result(5)
+    assert futures[0] is futures[1] is futures[2]
+    assert calls == [2, 'other']
+    assert executor.coalesced == 2
+
+
+def test_running_request_is_not_replaced(executor):
+    calls = []
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow(value):
+        started.set()
+        release.wait(5)
+        calls.append(value)
+
+    first = executor.submit(slow, 1, key='save')
+    started.wait(5)
+    second = executor.submit(slow, 2, key='save')
+    release.set()
+    second.result(5)
+    assert first is not second
+    assert calls == [1, 2]
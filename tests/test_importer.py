@@ -0,0 +1,131 @@
+from datetime import datetime
+
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.importer import (
+    CsvFormat, import_expenses, make_amount_parser, make_date_parser, RowError
+)
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+
+STATEMENT = '''Дата;Сумма;Категория;Описание
+01.03.2023;-1 234,50;Продукты;магазин
+2023-03-02;-100;книги;
+
+03.03.2023;5 000,00;Продукты;зарплата
+04.03.2023;-abc;Продукты;ошибка
+05.03.2023;-10,00;Машина;неизвестная категория
+31.02.2023;-10,00;Продукты;нет такой даты
+06.03.2023;-1,5;;
+'''.splitlines()
+
+FMT = CsvFormat(amount='Сумма', date='Дата', category='Категория',
+                comment='Описание', decimal_separator=',', delimiter=';',
+                expenses_negative=True)
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def repos(request, tmp_path):
+    if request.param == 'memory':
+        repos = {model: MemoryRepository() for model in (Category, Expense, Budget)}
+    else:
+        repos = SQLiteRepository.repository_factory(
+            [Category, Expense, Budget], str(tmp_path / 'import.db')
+        )
+    repos[Category].add_many([Category('продукты'), Category('Книги')])
+    yield repos
+    if request.param == 'sqlite':
+        repos[Category].close()
+
+
+def test_import(repos):
+    report = import_expenses(STATEMENT, FMT, repos, batch_size=1)
+    expenses = repos[Expense].get_all(order_by='expense_date')
+    assert [(e.amount, e.category, e.expense_date, e.comment) for e in expenses] == [
+        (1234.5, 'продукты', datetime(2023, 3, 1), 'магазин'),
+        (100.0, 'Книги', datetime(2023, 3, 2), ''),
+    ]
+    assert (report.rows, report.imported, report.skipped) == (7, 2, 1)
+    assert [line for line, _ in report.errors] == [6, 7, 8, 9]
+    assert report.batches == 2
+    assert report.rows_per_second > 0
+
+
+def test_default_category(repos):
+    fmt = CsvFormat(**{**FMT.__dict__, 'default_category': 'ПРОДУКТЫ'})
+    report = import_expenses(STATEMENT, fmt, repos)
+    assert report.imported == 4
+    assert report.batches == 1
+    assert repos[Expense].total('amount') == pytest.approx(1234.5 + 100 + 10 + 1.5)
+
+
+def test_unknown_default_category(repos):
+    fmt = CsvFormat(**{**FMT.__dict__, 'default_category': 'машина'})
+    with pytest.raises(KeyError):
+        import_expenses(STATEMENT, fmt, repos)
+
+
+def test_budgets_updated_per_batch(repos):
+    engine = BudgetEngine(repos[Budget], repos[Expense])
+    budget = engine.create_budget(10000, 'Неделя', datetime(2023, 2, 28),
+                                  datetime(2023, 3, 7))
+    lines = ['amount,date'] + [f'{i},2023-03-0{1 + i % 5}' for i in range(1, 101)]
+    progress = []
+    fmt = CsvFormat('amount', 'date', default_category='продукты')
+    report = import_expenses(lines, fmt, repos, batch_size=30,
+                             progress=progress.append)
+    assert report.imported == 100 and report.errors == [] and report.batches == 4
+    assert len(progress) == 4
+    assert repos[Budget].get(budget.pk).amount == sum(range(1, 101))
+
+
+def test_no_header_columns_by_number(repos):
+    lines = ['2023-03-01 10:00:00,12.5,книги,', '2023-03-02,7,,кофе']
+    fmt = CsvFormat(amount=1, date=0, category=2, comment=3, has_header=False,
+                    default_category='продукты')
+    report = import_expenses(lines, fmt, repos)
+    assert report.imported == 2
+    expenses = repos[Expense].get_all(order_by='expense_date')
+    assert [(e.category, e.comment) for e in expenses] == [('Книги', ''),
+                                                           ('продукты', 'кофе')]
+    assert expenses[0].expense_date == datetime(2023, 3, 1, 10)
+
+
+def test_failed_batch_rolled_back(tmp_path):
+    repos = SQLiteRepository.repository_factory(
+        [Category, Expense, Budget], str(tmp_path / 'rollback.db')
+    )
+    repos[Category].add(Category('продукты'))
+    lines = ['amount,date,category'] + ['1,2023-03-01,продукты'] * 5
+
+    def fail(report):
+        raise RuntimeError('stop')
+
+    with pytest.raises(RuntimeError):
+        import_expenses(lines, CsvFormat('amount', 'date', 'category'), repos,
+                        batch_size=2, progress=fail)
+    # пачка записана до вызова progress
+    assert len(repos[Expense].get_all()) == 2
+    repos[Category].close()
+
+
+def test_amount_parser():
+    parse = make_amount_parser(CsvFormat('a', 'd', decimal_separator=',',
+                                         thousands_separator='.'))
+    assert parse('1.234.567,89') == 1234567.89
+    assert parse('-1\xa0000,5') == -1000.5
+    with pytest.raises(RowError):
+        parse('')
+
+
+def test_date_parser_prefers_last_format():
+    parse = make_date_parser(CsvFormat('a', 'd', date_formats=('%Y-%m-%d', '%d/%m/%Y')))
+    assert parse('02/03/2023') == datetime(2023, 3, 2)
+    assert parse('2023-03-04') == datetime(2023, 3, 4)
+    with pytest.raises(RowError):
+        parse('March 1')
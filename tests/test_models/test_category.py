@@ -7,6 +7,7 @@ import pytest
 
 from bookkeeper.models.category import Category
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
 
 
 @pytest.fixture
@@ -106,3 +107,99 @@ def test_create_from_tree_error(repo):
     tree = [('1', 'parent'), ('parent', None)]
     with pytest.raises(KeyError):
         Category.create_from_tree(tree, repo)
+
+
+@pytest.fixture(params=['memory', 'indexed', 'sqlite'])
+def any_repo(request, tmp_path):
+    if request.param == 'memory':
+        yield MemoryRepository()
+    elif request.param == 'indexed':
+        yield MemoryRepository(hash_indexes=['parent'])
+    else:
+        repo = SQLiteRepository(Category, str(tmp_path / 'test.db'))
+        yield repo
+        repo.close()
+
+
+def test_hierarchy_in_any_repo(any_repo):
+    root = Category('0')
+    root_pk = any_repo.add(root)
+    pk1 = any_repo.add(Category('1', root_pk))
+    pk2 = any_repo.add(Category('2', root_pk))
+    pk3 = any_repo.add(Category('3', pk1))
+    any_repo.add(Category('4', pk3))
+    leaf = any_repo.get_all({'name': '4'})[0]
+    assert [c.name for c in leaf.get_all_parents(any_repo)] == ['3', '1', '0']
+    assert [c.name for c in root.get_subcategories(any_repo)] == ['1', '3', '4', '2']
+    assert [c.name for c in any_repo.get_descendants(pk2)] == []
+    assert [c.name for c in any_repo.get_ancestors(pk3, include_self=True)] == [
+        '3', '1', '0'
+    ]
+    assert list(root.get_all_parents(any_repo)) == []
+
+
+def test_create_from_tree_in_any_repo(any_repo):
+    tree = [('продукты', None), ('мясо', 'продукты'), ('сырое', 'мясо'),
+            ('книги', None), ('прочее', 'продукты'), ('прочее', 'книги'),
+            ('старые', 'прочее')]
+    cats = Category.create_from_tree(iter(tree), any_repo)
+    assert [c.name for c in cats] == [name for name, _ in tree]
+    assert all(c.pk != 0 for c in cats)
+    by_pk = {c.pk: c for c in any_repo.get_all()}
+    assert len(by_pk) == len(tree)
+    assert [(c.name, by_pk[c.parent].name if c.parent else None)
+            for c in cats] == tree
+    # родитель повторяющегося названия - последняя категория с этим названием
+    assert cats[-1].parent == cats[5].pk
+
+
+def test_create_from_tree_batches_by_level(repo, monkeypatch):
+    calls = []
+    add_many = repo.add_many
+    monkeypatch.setattr(repo, 'add_many', lambda objs: calls.append(
+        add_many(objs)))
+    tree = [('a', None), ('b', 'a'), ('c', None), ('d', 'b'), ('e', 'c')]
+    Category.create_from_tree(tree, repo)
+    assert [len(pks) for pks in calls] == [2, 2, 1]
+
+
+def test_create_from_tree_validates_before_insert(repo):
+    tree = [('parent', None), ('1', 'parent'), ('2', 'unknown')]
+    with pytest.raises(KeyError):
+        Category.create_from_tree(tree, repo)
+    assert repo.get_all() == []
+
+
+def test_create_from_tree_single_transaction(tmp_path, monkeypatch):
+    repo = SQLiteRepository(Category, str(tmp_path / 'tree.db'))
+    calls = []
+    add_many = repo.add_many
+
+    def failing_add_many(objs):
+        calls.append(1)
+        if len(calls) == 2:
+            raise RuntimeError('write failed')
+        return add_many(objs)
+
+    monkeypatch.setattr(repo, 'add_many', failing_add_many)
+    tree = [('a', None), ('b', 'a'), ('c', 'b')]
+    with pytest.raises(RuntimeError):
+        Category.create_from_tree(tree, repo)
+    assert len(calls) == 2
+    assert repo.get_all() == []
+    repo.close()
+
+
+def test_hierarchy_with_cycle_in_any_repo(any_repo):
+    # 1 -> 2 -> 3 -> 1: каждая категория возвращается один раз
+    for name in '123':
+        any_repo.add(Category(name))
+    for pk, parent in ((1, 3), (2, 1), (3, 2)):
+        any_repo.update(Category(str(pk), parent, pk))
+    any_repo.add(Category('4', 2))
+    assert [c.name for c in any_repo.get_ancestors(1)] == ['3', '2']
+    assert [c.name for c in any_repo.get_ancestors(2, include_self=True)] == [
+        '2', '1', '3'
+    ]
+    assert [c.name for c in any_repo.get_descendants(1)] == ['2', '3', '4']
+    assert [c.name for c in any_repo.get_descendants(3)] == ['1', '2', '4']
@@ -28,3 +28,10 @@ def test_can_add_to_repo(repo):
     e = Expense(100, 1)
     pk = repo.add(e)
     assert e.pk == pk
+
+
+def test_slots():
+    e = Expense(100, 1)
+    assert not hasattr(e, '__dict__')
+    with pytest.raises(AttributeError):
+        e.unknown = 1
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+
+from bookkeeper.repository.async_repository import (
+    AsyncAbstractRepository, AsyncMemoryRepository, AsyncSQLiteRepository,
+    ThreadedRepository
+)
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Range
+from bookkeeper.models.category import Category
+
+import pytest
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def make_repo(request, tmp_path):
+    if request.param == 'memory':
+        return AsyncMemoryRepository
+    return lambda: AsyncSQLiteRepository(Category, str(tmp_path / 'test.db'), readers=2)
+
+
+def test_crud(make_repo):
+    async def scenario():
+        repo = make_repo()
+        c = Category('name')
+        pk = await repo.add(c)
+        assert c.pk == pk
+        assert await repo.get(pk) == c
+        c2 = Category('other', pk=pk)
+        await repo.update(c2)
+        assert await repo.get(pk) == c2
+        await repo.delete(pk)
+        assert await repo.get(pk) is None
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_get_all_and_iter_all(make_repo):
+    async def scenario():
+        repo = make_repo()
+        pks = await repo.add_many(Category(str(i), parent=i % 2) for i in range(10))
+        assert len(pks) == 10
+        odd = await repo.get_all({'parent': 1}, order_by='-pk', limit=3)
+        assert [c.name for c in odd] == ['9', '7', '5']
+        names = [c.name async for c in repo.iter_all(batch_size=3)]
+        assert names == [str(i) for i in range(10)]
+        page = [c.name async for c in repo.iter_all(
+            {'pk': Range(lower=3)}, batch_size=2, after_pk=pks[3], limit=3
+        )]
+        assert page == ['4', '5', '6']
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_writers(make_repo):
+    async def scenario():
+        repo = make_repo()
+        await asyncio.gather(*(repo.add(Category(str(i))) for i in range(20)))
+        objs = await repo.get_all()
+        assert sorted(c.pk for c in objs) == list(range(1, 21))
+        await repo.close()
+
+    asyncio.run(scenario())
+
+
+def test_threaded_repository_uses_writer_and_readers():
+    threads = {}
+
+    class RecordingRepository(MemoryRepository):
+        def add(self, obj):
+            threads.setdefault('add', set()).add(threading.current_thread().name)
+            return super().add(obj)
+
+        def get(self, pk):
+            threads.setdefault('get', set()).add(threading.current_thread().name)
+            return super().get(pk)
+
+    async def scenario():
+        repo = ThreadedRepository(RecordingRepository(), readers=2)
+        for i in range(5):
+            await repo.add(Category(str(i)))
+        await asyncio.gather(*(repo.get(pk) for pk in range(1, 6)))
+        await repo.close()
+
+    asyncio.run(scenario())
+    assert len(threads['add']) == 1
+    assert all(name.startswith('repository-writer') for name in threads['add'])
+    assert all(name.startswith('repository-reader') for name in threads['get'])
+
+
+def test_can_create_subclass():
+    class Test(AsyncAbstractRepository):
+        async def add(self, obj): pass
+        async def get(self, pk): pass
+        async def get_all(self, where=None, order_by=None, limit=None): return []
+        async def update(self, obj): pass
+        async def delete(self, pk): pass
+
+    async def scenario():
+        repo = Test()
+        assert [obj async for obj in repo.iter_all()] == []
+        await repo.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,105 @@
+from bookkeeper.repository.cached_repository import CachedRepository
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.query import Range
+from bookkeeper.models.category import Category
+
+import pytest
+
+
+class CountingRepository(MemoryRepository):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def get(self, pk):
+        self.calls += 1
+        return super().get(pk)
+
+    def get_all(self, where=None, order_by=None, limit=None):
+        self.calls += 1
+        return super().get_all(where, order_by, limit)
+
+
+@pytest.fixture
+def backend():
+    return CountingRepository()
+
+
+@pytest.fixture
+def repo(backend):
+    return CachedRepository(backend, max_size=2)
+
+
+def test_crud(repo):
+    c = Category('name')
+    pk = repo.add(c)
+    assert repo.get(pk) == c
+    c2 = Category('other', pk=pk)
+    repo.update(c2)
+    assert repo.get(pk) == c2
+    repo.delete(pk)
+    assert repo.get(pk) is None
+
+
+def test_get_is_cached(repo, backend):
+    pk = backend.add(Category('name'))
+    repo.get(pk)
+    repo.get(pk)
+    assert backend.calls == 1
+    assert repo.stats()['hits'] == 1
+    assert repo.stats()['misses'] == 1
+
+
+def test_lru_eviction(repo, backend):
+    pks = [backend.add(Category(str(i))) for i in range(3)]
+    for pk in pks:
+        repo.get(pk)
+    assert repo.stats()['objects'] == 2
+    repo.get(pks[0])
+    assert backend.calls == 4
+
+
+def test_get_all_is_cached_and_invalidated(repo, backend):
+    repo.add(Category('a'))
+    assert len(repo.get_all({'name': 'a'})) == 1
+    assert len(repo.get_all({'name': 'a'})) == 1
+    assert backend.calls == 1
+    repo.add(Category('a'))
+    assert len(repo.get_all({'name': 'a'})) == 2
+    assert backend.calls == 2
+    repo.get_all({'pk': Range(lower=1)}, order_by=['-pk'], limit=1)
+    repo.get_all({'pk': Range(lower=1)}, order_by=['-pk'], limit=1)
+    assert backend.calls == 3
+
+
+def test_bulk_operations_invalidate(repo):
+    cats = [Category(str(i)) for i in range(3)]
+    repo.add_many(cats)
+    assert len(repo.get_all()) == 3
+    repo.delete_many([cats[0].pk])
+    assert len(repo.get_all()) == 2
+    cats[1].name = 'new'
+    repo.update_many([cats[1]])
+    assert repo.get_all({'name': 'new'}) == [cats[1]]
+
+
+def test_stats_reset_and_clear(repo):
+    pk = repo.add(Category('a'))
+    repo.get(pk)
+    repo.reset_stats()
+    assert repo.stats()['hits'] == 0
+    repo.clear()
+    assert repo.stats()['objects'] == 0
+
+
+def test_repository_factory_with_cache(tmp_path):
+    repos = SQLiteRepository.repository_factory(
+        models=[Category], db_file=str(tmp_path / 'test.db'), cache_size=10
+    )
+    repo = repos[Category]
+    assert isinstance(repo, CachedRepository)
+    pk = repo.add(Category('a'))
+    assert repo.get(pk) == Category('a', pk=pk)
+    assert repo.table_name == 'category'
+    repo.close()
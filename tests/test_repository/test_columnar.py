@@ -0,0 +1,71 @@
+from datetime import datetime
+
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository import columnar
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+
+import pytest
+
+
+def make_expenses():
+    return [Expense(float(i), ['food', 'books', 'rent'][i % 3],
+                    datetime(2024, 1, 1 + i % 40 // 2, i % 24)) for i in range(60)]
+
+
+def test_requires_numpy(monkeypatch):
+    monkeypatch.setattr(columnar, 'np', None)
+    with pytest.raises(ImportError):
+        columnar.ExpenseColumns.from_expenses([])
+
+
+@pytest.fixture(params=['memory', 'sqlite'])
+def sources(request, tmp_path):
+    pytest.importorskip('numpy')
+    if request.param == 'memory':
+        repo = MemoryRepository()
+        repo.add_many(make_expenses())
+        yield repo, columnar.ExpenseColumns.from_expenses(repo.get_all())
+    else:
+        repo = SQLiteRepository(Expense, str(tmp_path / 'columns.db'))
+        repo.add_many(make_expenses())
+        yield repo, columnar.ExpenseColumns.from_repository(repo)
+        repo.close()
+
+
+def test_columns(sources):
+    repo, columns = sources
+    assert len(columns) == 60
+    assert columns.categories == ['food', 'books', 'rent']
+    assert list(columns.pk) == [e.pk for e in repo.get_all(order_by='pk')]
+    assert columns.total() == repo.total('amount')
+
+
+def test_filters_match_repository(sources):
+    repo, columns = sources
+    start, end = datetime(2024, 1, 3), datetime(2024, 1, 10, 5)
+    assert columns.between(start, end).total() == repo.total(
+        'amount', BudgetEngine.expenses_between(start, end)
+    )
+    assert columns.in_categories(['food', 'unknown']).total() == repo.total(
+        'amount', {'category': 'food'}
+    )
+
+
+@pytest.mark.parametrize('period', ['day', 'week', 'month'])
+def test_grouping_matches_aggregate(sources, period):
+    repo, columns = sources
+    expected = repo.aggregate('amount', group_by=f'expense_date:{period}')
+    assert columns.by_period(period) == {key[0]: value for key, value in expected.items()}
+    expected = repo.aggregate('amount', group_by='category')
+    assert columns.by_category() == {key[0]: value for key, value in expected.items()}
+
+
+def test_budget_engine_uses_columns(sources):
+    repo, columns = sources
+    engine = BudgetEngine(MemoryRepository[Budget](), repo)
+    start, end = datetime(2024, 1, 1), datetime(2024, 1, 8)
+    budget = engine.create_budget(1000, 'Неделя', start, end, columns=columns)
+    assert budget.amount == engine.spent(start, end)
@@ -0,0 +1,145 @@
+import sqlite3
+import threading
+
+from bookkeeper.repository.connection_pool import ConnectionPool, WAL_PRAGMAS
+
+import pytest
+
+
+TEST_DB = 'bookkeeper/databases/test.sqlite.db'
+
+
+@pytest.fixture
+def pool():
+    pool = ConnectionPool(TEST_DB, size=2, timeout=0.1)
+    yield pool
+    pool.close()
+
+
+def test_connection_is_reused(pool):
+    with pool.connection() as con:
+        first = con
+    with pool.connection() as con:
+        assert con is first
+
+
+def test_nested_connection_in_same_thread(pool):
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+
+
+def test_threads_get_different_connections(pool):
+    seen = []
+
+    def worker(barrier):
+        with pool.connection() as con:
+            seen.append(con)
+            barrier.wait()
+
+    barrier = threading.Barrier(2)
+    threads = [threading.Thread(target=worker, args=(barrier,)) for _ in range(2)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert seen[0] is not seen[1]
+
+
+def test_pool_size_limit(pool):
+    with pool.connection():
+        done = threading.Event()
+
+        def worker():
+            with pool.connection():
+                done.wait()
+
+        t = threading.Thread(target=worker)
+        t.start()
+        try:
+            result = []
+
+            def third():
+                try:
+                    with pool.connection():
+                        pass
+                except TimeoutError:
+                    result.append('timeout')
+
+            t3 = threading.Thread(target=third)
+            t3.start()
+            t3.join()
+            assert result == ['timeout']
+        finally:
+            done.set()
+            t.join()
+
+
+def test_broken_connection_is_replaced(pool):
+    with pool.connection() as con:
+        broken = con
+    broken.close()
+    with pool.connection() as con:
+        assert con is not broken
+        assert con.execute('SELECT 1').fetchone() == (1,)
+
+
+def test_cannot_use_closed_pool(pool):
+    pool.close()
+    assert pool.closed
+    with pytest.raises(RuntimeError):
+        with pool.connection():
+            pass
+
+
+def test_wrong_size():
+    with pytest.raises(ValueError):
+        ConnectionPool(TEST_DB, size=0)
+
+
+def test_default_pragmas(pool):
+    with pool.connection() as con:
+        assert con.execute('PRAGMA foreign_keys').fetchone()[0] == 1
+
+
+def test_wal_pragmas(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'wal.db'), pragmas=WAL_PRAGMAS)
+    with pool.connection() as con:
+        assert con.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert con.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+        assert con.execute('PRAGMA temp_store').fetchone()[0] == 2  # MEMORY
+        assert con.execute('PRAGMA cache_size').fetchone()[0] == -64000
+    pool.close()
+
+
+def test_holds_connection(pool):
+    assert not pool.holds_connection()
+    with pool.connection():
+        assert pool.holds_connection()
+    assert not pool.holds_connection()
+
+
+def test_failed_connect_frees_slot(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'missing' / 'db.sqlite'), size=2,
+                          timeout=0.1)
+    for _ in range(3):
+        with pytest.raises(sqlite3.OperationalError):
+            with pool.connection():
+                pass
+    (tmp_path / 'missing').mkdir()
+    with pool.connection() as con:
+        assert con.execute('SELECT 1').fetchone() == (1,)
+    pool.close()
+
+
+def test_failed_pragma_frees_slot(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'db.sqlite'), size=1, timeout=0.1,
+                          pragmas={'no_such': '(('})
+    for _ in range(2):
+        with pytest.raises(sqlite3.OperationalError):
+            with pool.connection():
+                pass
+    pool.pragmas = {}
+    with pool.connection() as con:
+        assert con.execute('SELECT 1').fetchone() == (1,)
+    pool.close()
@@ -0,0 +1,155 @@
+import logging
+from dataclasses import dataclass
+
+from bookkeeper.repository.instrumentation import Instrumentation, sql_shape
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import In
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+
+import pytest
+
+
+@dataclass
+class Custom:
+    name: str = ''
+    value: int = 0
+    pk: int = 0
+
+
+@pytest.fixture
+def instrumentation():
+    return Instrumentation()
+
+
+@pytest.fixture
+def repo(tmp_path, instrumentation):
+    repo = SQLiteRepository(Custom, str(tmp_path / 'stats.db'),
+                            instrumentation=instrumentation)
+    instrumentation.reset()
+    yield repo
+    repo.close()
+
+
+def test_disabled_by_default(tmp_path):
+    repo = SQLiteRepository(Custom, str(tmp_path / 'plain.db'))
+    assert repo.instrumentation is None
+    assert repo.pool.instrumentation is None
+    repo.add(Custom('a'))
+    with repo.pool.connection() as con:
+        assert con.__class__.__name__ == 'Connection'
+    repo.close()
+
+
+def test_method_stats(repo, instrumentation):
+    for i in range(3):
+        repo.add(Custom(str(i), i))
+    assert len(repo.get_all()) == 3
+    assert repo.get(100) is None
+    methods = instrumentation.stats()['methods']
+    assert methods['custom.add']['count'] == 3
+    assert methods['custom.get_all']['rows'] == 3
+    assert methods['custom.get']['rows'] == 0
+    histogram = methods['custom.add']['histogram']
+    assert sum(histogram.values()) == 3
+    assert methods['custom.add']['max_ms'] >= methods['custom.add']['mean_ms'] > 0
+
+
+def test_iter_all_counted_after_iteration(repo, instrumentation):
+    repo.add_many(Custom(str(i), i) for i in range(5))
+    objs = repo.iter_all(batch_size=2)
+    assert 'custom.iter_all' not in instrumentation.stats()['methods']
+    assert len(list(objs)) == 5
+    stats = instrumentation.stats()['methods']['custom.iter_all']
+    assert stats['count'] == 1
+    assert stats['rows'] == 5
+
+
+def test_query_shapes(repo, instrumentation):
+    repo.add_many(Custom(str(i), i) for i in range(5))
+    repo.get_all(where={'value': In([1, 2])})
+    repo.get_all(where={'value': In([1, 2, 3])})
+    queries = instrumentation.stats()['queries']
+    shape = 'SELECT * FROM custom WHERE value IN (?, ...)'
+    assert queries[shape]['count'] == 2
+    assert queries[shape]['rows'] == 5
+    inserts = [stats for query, stats in queries.items()
+               if query.startswith('INSERT INTO custom')]
+    assert inserts[0]['rows'] == 5
+
+
+def test_unread_rows_counted_on_release(repo, instrumentation):
+    repo.add_many(Custom(str(i), i) for i in range(3))
+    with repo.pool.connection() as con:
+        con.execute('SELECT value FROM custom').fetchone()
+    stats = instrumentation.stats()['queries']['SELECT value FROM custom']
+    assert (stats['count'], stats['rows']) == (1, 1)
+
+
+def test_connection_time(repo, instrumentation):
+    repo.get(1)
+    with UnitOfWork([repo]):
+        repo.add(Custom('a'))
+        repo.get(1)
+    assert instrumentation.stats()['connections']['count'] == 2
+
+
+def test_slow_query_log(tmp_path, caplog):
+    instrumentation = Instrumentation(slow_query_ms=0)
+    repo = SQLiteRepository(Expense, str(tmp_path / 'slow.db'),
+                            instrumentation=instrumentation)
+    instrumentation.reset()
+    with caplog.at_level(logging.WARNING, logger='bookkeeper.slow_query'):
+        repo.get_all(where={'comment': 'x'})
+    slow = instrumentation.stats()['slow_queries']
+    entry = next(entry for entry in slow if entry['sql'].startswith('SELECT'))
+    assert entry['sql'] == 'SELECT * FROM expense WHERE comment = ?'
+    assert any('SCAN' in line for line in entry['plan'])
+    assert 'slow query' in caplog.text
+    repo.close()
+
+
+def test_slow_query_threshold(repo, instrumentation):
+    instrumentation.slow_query_ms = 10_000
+    repo.add(Custom('a'))
+    assert instrumentation.stats()['slow_queries'] == []
+
+
+def test_reset(repo, instrumentation):
+    repo.add(Custom('a'))
+    instrumentation.reset()
+    stats = instrumentation.stats()
+    assert stats['methods'] == {} and stats['queries'] == {}
+    assert stats['connections']['count'] == 0
+
+
+def test_factory_shares_instrumentation(tmp_path):
+    instrumentation = Instrumentation()
+    repos = SQLiteRepository.repository_factory(
+        [Category, Expense], str(tmp_path / 'factory.db'),
+        cache_size=10, instrumentation=instrumentation
+    )
+    repos[Category].add(Category('food'))
+    repos[Expense].get_all()
+    methods = instrumentation.stats()['methods']
+    assert {'category.add', 'expense.get_all'} <= methods.keys()
+    repos[Category].close()
+
+
+def test_memory_repository():
+    instrumentation = Instrumentation()
+    repo = MemoryRepository(instrumentation=instrumentation)
+    repo.add_many([Custom('a'), Custom('b')])
+    repo.get_all()
+    assert list(repo.iter_all(limit=1))
+    methods = instrumentation.stats()['methods']
+    assert methods['MemoryRepository.add_many']['rows'] == 2
+    assert methods['MemoryRepository.get_all']['rows'] == 2
+    assert methods['MemoryRepository.iter_all']['rows'] == 1
+
+
+def test_sql_shape():
+    assert sql_shape('SELECT *\n   FROM t WHERE a IN (?,?, ?)') == \
+        'SELECT * FROM t WHERE a IN (?, ...)'
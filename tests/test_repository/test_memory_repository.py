@@ -1,4 +1,5 @@
 from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.query import Range, In
 
 import pytest
 
@@ -69,3 +70,123 @@ def test_get_all_with_condition(repo, custom_class):
         objects.append(o)
     assert repo.get_all({'name': '0'}) == [objects[0]]
     assert repo.get_all({'test': 'test'}) == objects
+
+
+def test_get_all_with_conditions_order_and_limit(repo, custom_class):
+    objects = []
+    for i in range(10):
+        o = custom_class()
+        o.f = i
+        objects.append(o)
+    repo.add_many(objects)
+    assert repo.get_all({'f': Range(3, 6)}) == objects[3:6]
+    assert repo.get_all({'f': In([1, 8])}) == [objects[1], objects[8]]
+    assert repo.get_all(order_by='-f', limit=2) == [objects[9], objects[8]]
+
+
+def test_add_many(repo, custom_class):
+    objects = [custom_class() for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert repo.get_all() == objects
+
+
+def test_cannot_add_many_with_pk(repo, custom_class):
+    objects = [custom_class() for i in range(2)]
+    objects[1].pk = 1
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert repo.get_all() == []
+
+
+def test_update_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    pks = repo.add_many(objects)
+    new_objects = [custom_class() for i in range(3)]
+    for pk, o in zip(pks, new_objects):
+        o.pk = pk
+    repo.update_many(new_objects)
+    assert repo.get_all() == new_objects
+
+
+def test_delete_many(repo, custom_class):
+    objects = [custom_class() for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get_all() == objects[2:]
+    with pytest.raises(KeyError):
+        repo.delete_many([pks[0]])
+
+
+def test_iter_all(repo, custom_class):
+    objects = []
+    for i in range(10):
+        o = custom_class()
+        o.f = i % 2
+        objects.append(o)
+    repo.add_many(objects)
+    assert list(repo.iter_all()) == objects
+    assert list(repo.iter_all(where={'f': 1})) == objects[1::2]
+    assert list(repo.iter_all(after_pk=objects[4].pk, limit=3)) == objects[5:8]
+
+
+@pytest.fixture
+def indexed_repo():
+    return MemoryRepository(hash_indexes=['name'], sorted_indexes=['f'])
+
+
+def test_get_all_with_indexes(indexed_repo, custom_class):
+    objects = []
+    for i in range(10):
+        o = custom_class()
+        o.name = str(i % 3)
+        o.f = i
+        objects.append(o)
+    indexed_repo.add_many(objects)
+    assert indexed_repo.get_all({'name': '0'}) == objects[::3]
+    assert indexed_repo.get_all({'name': In(['1', '2'])}) == [
+        o for o in objects if o.name != '0'
+    ]
+    assert indexed_repo.get_all({'f': Range(2, 5)}) == objects[2:5]
+    assert indexed_repo.get_all({'f': Range(2, 5, include_lower=False,
+                                            include_upper=True)}) == objects[3:6]
+    assert indexed_repo.get_all({'name': '0', 'f': Range(lower=4)}) == [
+        objects[6], objects[9]
+    ]
+    assert indexed_repo.get_all({'name': 'unknown'}) == []
+
+
+def test_indexes_follow_changes(indexed_repo, custom_class):
+    objects = []
+    for i in range(3):
+        o = custom_class()
+        o.name = 'a'
+        o.f = i
+        objects.append(o)
+    indexed_repo.add_many(objects)
+    objects[0].name = 'b'
+    objects[0].f = 10
+    indexed_repo.update(objects[0])
+    assert indexed_repo.get_all({'name': 'a'}) == objects[1:]
+    assert indexed_repo.get_all({'name': 'b'}) == [objects[0]]
+    assert indexed_repo.get_all({'f': Range(lower=5)}) == [objects[0]]
+    indexed_repo.delete(objects[1].pk)
+    assert indexed_repo.get_all({'name': 'a'}) == [objects[2]]
+    assert indexed_repo.get_all({'f': Range(upper=5)}) == [objects[2]]
+    indexed_repo.delete_many([objects[0].pk, objects[2].pk])
+    assert indexed_repo.get_all({'name': In(['a', 'b'])}) == []
+    assert indexed_repo.get_all({'f': Range()}) == []
+
+
+def test_increment_and_total(indexed_repo, custom_class):
+    objects = []
+    for i in range(5):
+        o = custom_class()
+        o.name = 'a'
+        o.f = i
+        objects.append(o)
+    indexed_repo.add_many(objects)
+    assert indexed_repo.total('f') == 10
+    assert indexed_repo.increment('f', 10, {'f': Range(upper=2)}) == 2
+    assert [o.f for o in indexed_repo.get_all()] == [10, 11, 2, 3, 4]
+    assert indexed_repo.get_all({'f': Range(lower=10)}) == objects[:2]
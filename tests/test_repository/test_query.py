@@ -0,0 +1,100 @@
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.repository.query import (
+    Range, In, matches, build_where, build_select, parse_order_by,
+    parse_group_by, truncate_date, aggregate_objects
+)
+
+
+class Obj:
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+def test_range_match():
+    r = Range(1, 3)
+    assert not r.match(0)
+    assert r.match(1)
+    assert r.match(2)
+    assert not r.match(3)
+    r = Range(1, 3, include_lower=False, include_upper=True)
+    assert not r.match(1)
+    assert r.match(3)
+    assert Range(upper=5).match(-100)
+    assert not Range(lower=5).match(None)
+
+
+def test_in_match():
+    c = In([1, 2])
+    assert c.match(1)
+    assert not c.match(3)
+    assert In(x for x in 'ab') == In(['a', 'b'])
+
+
+def test_matches():
+    obj = Obj(a=1, b='x', c=None)
+    assert matches(obj, {'a': 1, 'b': 'x'})
+    assert matches(obj, {'a': Range(0, 2), 'b': In(['x', 'y']), 'c': None})
+    assert not matches(obj, {'a': Range(lower=2)})
+
+
+def test_build_where_is_stable():
+    sql_1, params_1 = build_where({'a': 1, 'b': Range(1, 5)})
+    sql_2, params_2 = build_where({'b': Range(10, 50), 'a': 2})
+    assert sql_1 == sql_2 == 'a = ? AND b >= ? AND b < ?'
+    assert params_1 == [1, 1, 5]
+    assert params_2 == [2, 10, 50]
+
+
+def test_build_where_special_values():
+    assert build_where({'a': None}) == ('a IS NULL', [])
+    assert build_where({'a': In([])}) == ('0', [])
+    assert build_where({'a': In([1, 2])}) == ('a IN (?, ?)', [1, 2])
+    assert build_where(None) == ('', [])
+
+
+def test_parse_order_by():
+    assert parse_order_by(None) == []
+    assert parse_order_by('a') == [('a', False)]
+    assert parse_order_by(['-a', 'b']) == [('a', True), ('b', False)]
+
+
+def test_build_select():
+    query, params = build_select('t', {'a': 1}, order_by='-b', limit=3)
+    assert query == 'SELECT * FROM t WHERE a = ? ORDER BY b DESC LIMIT ?'
+    assert params == [1, 3]
+
+
+def test_truncate_date():
+    date = datetime(2023, 3, 16, 15, 30)  # четверг
+    assert truncate_date(date, 'day') == datetime(2023, 3, 16)
+    assert truncate_date(date, 'week') == datetime(2023, 3, 13)
+    assert truncate_date(date, 'month') == datetime(2023, 3, 1)
+
+
+def test_parse_group_by():
+    assert parse_group_by(None) == []
+    assert parse_group_by(['a', 'b:day']) == [('a', None), ('b', 'day')]
+    with pytest.raises(ValueError):
+        parse_group_by('b:year')
+
+
+def test_aggregate_objects():
+    objs = [Obj(a=i, g='x' if i % 2 else 'y', d=datetime(2023, 1, 1 + i))
+            for i in range(6)]
+    assert aggregate_objects(objs, 'a') == {(): 15}
+    assert aggregate_objects([], 'a') == {(): 0}
+    assert aggregate_objects([], 'a', 'count') == {(): 0}
+    assert aggregate_objects([], 'a', 'avg') == {}
+    assert aggregate_objects(objs, 'a', 'count', 'g') == {('x',): 3, ('y',): 3}
+    assert aggregate_objects(objs, 'a', 'avg', 'g') == {('x',): 3, ('y',): 2}
+    assert aggregate_objects(objs, 'a', 'max', ['g', 'd:month']) == {
+        ('x', datetime(2023, 1, 1)): 5, ('y', datetime(2023, 1, 1)): 4
+    }
+    assert aggregate_objects(objs, 'a', 'sum', 'd:week') == {
+        (datetime(2022, 12, 26),): 0, (datetime(2023, 1, 2),): 15
+    }
+    with pytest.raises(ValueError):
+        aggregate_objects(objs, 'a', 'median')
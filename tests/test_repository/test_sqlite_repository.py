@@ -1,6 +1,14 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from inspect import isgenerator
+import sqlite3
 
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
 from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.query import Range, In
 import pytest
 
 
@@ -33,6 +41,47 @@ def test_repo_factory(repos, test_class):
            and repos[test_class].table_name == test_class.__name__.lower()
 
 
+def test_repos_share_pool(test_class):
+    @dataclass
+    class Other:
+        pk: int = 0
+        g: int = 1
+    repos = SQLiteRepository.repository_factory(
+        models=[test_class, Other], db_file=TEST_DB
+    )
+    assert repos[test_class].pool is repos[Other].pool
+    repos[Other].drop_table()
+    repos[Other].close()
+    assert repos[test_class].pool.closed
+
+
+def test_reset_db_file_refused_for_shared_pool(tmp_path, test_class):
+    @dataclass
+    class Other:
+        pk: int = 0
+        g: int = 1
+    repos = SQLiteRepository.repository_factory(
+        models=[test_class, Other], db_file=str(tmp_path / 'shared.db'),
+        group_commit=True
+    )
+    with pytest.raises(RuntimeError):
+        repos[test_class].reset_db_file(str(tmp_path / 'other.db'))
+    assert repos[Other].add(Other()) == 1
+    repos[Other].close()
+
+
+def test_reset_db_file(tmp_path, test_class):
+    repo = SQLiteRepository(test_class, str(tmp_path / 'old.db'))
+    repo.add(test_class())
+    old_pool = repo.pool
+    repo.reset_db_file(str(tmp_path / 'new.db'))
+    assert old_pool.closed
+    assert repo.db_file == str(tmp_path / 'new.db')
+    assert repo.get_all() == []
+    repo.add(test_class())
+    repo.close()
+
+
 def test_crud(repo, test_class):
     obj = test_class(f=2)
     pk = repo.add(obj)
@@ -86,6 +135,266 @@ def test_get_all_with_condition(repo, test_class):
     assert repo.get_all(where={"f": 10}) == objects_2
 
 
+def test_get_all_with_conditions_order_and_limit(repo, test_class):
+    objects = [test_class(f=i) for i in range(100, 110)]
+    repo.add_many(objects)
+    assert repo.get_all(where={'f': Range(103, 106)}) == objects[3:6]
+    assert repo.get_all(where={'f': In([101, 108])}) == [objects[1], objects[8]]
+    assert repo.get_all(where={'f': Range(lower=100)},
+                        order_by='-f', limit=2) == [objects[9], objects[8]]
+    repo.delete_many(o.pk for o in objects)
+
+
+def test_get_all_with_unknown_field(repo):
+    with pytest.raises(ValueError):
+        repo.get_all(where={'f = 1 OR 1': 1})
+    with pytest.raises(ValueError):
+        repo.get_all(order_by='g')
+
+
+def test_add_many(repo, test_class):
+    objects = [test_class(f=i) for i in range(5)]
+    pks = repo.add_many(objects)
+    assert pks == [o.pk for o in objects]
+    assert len(set(pks)) == 5
+    assert [repo.get(pk) for pk in pks] == objects
+
+
+def test_cannot_add_many_with_pk(repo, test_class):
+    objects = [test_class(f=1), test_class(f=2, pk=1)]
+    with pytest.raises(ValueError):
+        repo.add_many(objects)
+    assert objects[0].pk == 0
+
+
+def test_update_many(repo, test_class):
+    objects = [test_class(f=i) for i in range(3)]
+    repo.add_many(objects)
+    for o in objects:
+        o.f = 100
+    repo.update_many(objects)
+    assert [repo.get(o.pk).f for o in objects] == [100, 100, 100]
+
+
+def test_delete_many(repo, test_class):
+    objects = [test_class(f=i) for i in range(3)]
+    pks = repo.add_many(objects)
+    repo.delete_many(pks[:2])
+    assert repo.get(pks[0]) is None and repo.get(pks[1]) is None
+    assert repo.get(pks[2]) == objects[2]
+
+
 def test_drop_tables_in_repos(repos):
     for cls, repo in repos.items():
         repo.drop_table()
+
+
+def test_indexes_from_model_metadata(tmp_path):
+    @dataclass
+    class Indexed:
+        a: int = field(default=0, metadata={'index': True})
+        b: int = field(default=0, metadata={'index': ('b', 'c')})
+        c: int = 0
+        pk: int = 0
+
+    repo = SQLiteRepository(Indexed, str(tmp_path / 'test.db'))
+    assert repo.indexes == [('a',), ('b', 'c')]
+    with repo.pool.connection() as con:
+        names = {name for name, in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert names == {'idx_indexed_a', 'idx_indexed_b_c'}
+
+    repo.indexes = [('c',)]
+    repo.create_indexes()
+    with repo.pool.connection() as con:
+        names = {name for name, in con.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert names == {'idx_indexed_c'}
+    repo.close()
+
+
+def test_hot_queries_use_indexes(tmp_path):
+    repos = SQLiteRepository.repository_factory(
+        models=[Category, Expense, Budget], db_file=str(tmp_path / 'test.db')
+    )
+    date = datetime(2023, 1, 1)
+
+    def uses_index(plan):
+        return any('USING INDEX' in step or 'USING COVERING INDEX' in step
+                   for step in plan)
+
+    assert uses_index(repos[Expense].explain(
+        where={'expense_date': Range(date, date + timedelta(days=1))}))
+    assert uses_index(repos[Budget].explain(
+        where={'start_date': Range(upper=date),
+               'expiration_date': Range(lower=date)}))
+    plan = repos[Budget].explain(
+        where={'duration': 'День'}, order_by='-expiration_date', limit=1)
+    assert any('idx_budget_duration_expiration_date' in step for step in plan)
+    assert not any('TEMP B-TREE' in step for step in plan)
+    assert uses_index(repos[Category].explain(where={'parent': 1}))
+    assert uses_index(repos[Category].explain(where={'name': 'книги'}))
+    repos[Category].close()
+
+
+def test_typed_schema_and_dates(tmp_path):
+    repo = SQLiteRepository(Expense, str(tmp_path / 'test.db'))
+    with repo.pool.connection() as con:
+        types = {row[1]: row[2] for row in con.execute("PRAGMA table_info(expense)")}
+    assert types == {'pk': 'INTEGER', 'amount': 'REAL', 'category': 'TEXT',
+                     'expense_date': 'DATETIME_INT', 'added_date': 'DATETIME_INT',
+                     'comment': 'TEXT'}
+    date = datetime(2023, 3, 10, 12, 30, 15)
+    expense = Expense(100, 'продукты', expense_date=date, added_date=date)
+    repo.add(expense)
+    assert repo.get(expense.pk) == expense
+    with repo.pool.connection() as con:
+        stored = con.execute("SELECT expense_date + 0, typeof(expense_date) "
+                             "FROM expense").fetchone()
+    assert stored == (int((date - datetime(1970, 1, 1)).total_seconds()), 'integer')
+    assert repo.get_all(where={'expense_date': Range(lower=date)}) == [expense]
+    repo.close()
+
+
+def test_untyped_table_is_migrated(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    con = sqlite3.connect(db_file)
+    con.execute("CREATE TABLE budget (pk INTEGER PRIMARY KEY, amount, limits, "
+                "duration, expiration_date, start_date)")
+    con.execute("INSERT INTO budget VALUES (1, 0.0, 100.0, 'День', "
+                "'2023-03-09 18:20:00.897088', '2023-03-08 18:20:00')")
+    con.commit()
+    con.close()
+    repo = SQLiteRepository(Budget, db_file)
+    assert repo.get(1) == Budget(
+        amount=0.0, limits=100.0, duration='День',
+        expiration_date=datetime(2023, 3, 9, 18, 20),
+        start_date=datetime(2023, 3, 8, 18, 20), pk=1
+    )
+    repo.close()
+
+
+def test_migration_refuses_unparseable_dates(tmp_path):
+    db_file = str(tmp_path / 'test.db')
+    con = sqlite3.connect(db_file)
+    con.execute("CREATE TABLE budget (pk INTEGER PRIMARY KEY, amount, limits, "
+                "duration, expiration_date, start_date)")
+    con.execute("INSERT INTO budget VALUES (1, 0.0, 100.0, 'День', "
+                "'2023-03-09 18:20:00', 'вчера')")
+    con.commit()
+    con.close()
+    with pytest.raises(ValueError, match='start_date'):
+        SQLiteRepository(Budget, db_file)
+    con = sqlite3.connect(db_file)
+    tables = [row[0] for row in con.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert tables == ['budget']
+    assert con.execute("SELECT start_date FROM budget").fetchone() == ('вчера',)
+    con.close()
+
+
+def test_migration_is_atomic(tmp_path, monkeypatch):
+    db_file = str(tmp_path / 'test.db')
+    con = sqlite3.connect(db_file)
+    con.execute("CREATE TABLE budget (pk INTEGER PRIMARY KEY, amount, limits, "
+                "duration, expiration_date, start_date)")
+    con.execute("INSERT INTO budget VALUES (1, 0.0, 100.0, 'День', "
+                "'2023-03-09 18:20:00', '2023-03-08 18:20:00')")
+    con.commit()
+    con.close()
+    # ошибка после переименования таблицы
+    monkeypatch.setattr(SQLiteRepository, '_create_query',
+                        lambda self: 'CREATE TABLE broken (')
+    with pytest.raises(sqlite3.OperationalError):
+        SQLiteRepository(Budget, db_file)
+    con = sqlite3.connect(db_file)
+    tables = [row[0] for row in con.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert tables == ['budget']
+    assert con.execute("SELECT count(*) FROM budget").fetchone() == (1,)
+    con.close()
+
+
+def test_iter_all(tmp_path, test_class):
+    repo = SQLiteRepository(test_class, str(tmp_path / 'test.db'))
+    objects = [test_class(f=i % 2) for i in range(10)]
+    repo.add_many(objects)
+    gen = repo.iter_all(batch_size=3)
+    assert isgenerator(gen)
+    assert list(gen) == objects
+    assert list(repo.iter_all(where={'f': 1}, batch_size=2)) == objects[1::2]
+    assert list(repo.iter_all(after_pk=objects[4].pk, limit=3)) == objects[5:8]
+    assert list(repo.iter_all(batch_size=4, limit=5)) == objects[:5]
+    with pytest.raises(ValueError):
+        list(repo.iter_all(batch_size=0))
+    repo.close()
+
+
+def test_increment_and_total(tmp_path, test_class):
+    repo = SQLiteRepository(test_class, str(tmp_path / 'test.db'))
+    objects = [test_class(f=i) for i in range(5)]
+    repo.add_many(objects)
+    assert repo.total('f') == 10
+    assert repo.total('f', where={'f': Range(lower=3)}) == 7
+    assert repo.increment('f', 10, where={'f': Range(upper=2)}) == 2
+    assert [o.f for o in repo.get_all()] == [10, 11, 2, 3, 4]
+    assert repo.total('f', where={'f': 100}) == 0
+    repo.close()
+
+
+@pytest.mark.parametrize('func', ['sum', 'count', 'avg', 'min', 'max'])
+@pytest.mark.parametrize('group_by', [
+    None, 'category', 'expense_date:day', 'expense_date:week',
+    ['category', 'expense_date:month']
+])
+# даты до 1970 года - отрицательные секунды
+@pytest.mark.parametrize('start', [datetime(2023, 1, 1), datetime(1969, 11, 20)])
+def test_aggregate_matches_memory(tmp_path, func, group_by, start):
+    repo = SQLiteRepository(Expense, str(tmp_path / 'test.db'))
+    memory_repo = MemoryRepository()
+    for i in range(100):
+        date = start + timedelta(hours=17 * i)
+        for r in (repo, memory_repo):
+            r.add(Expense(float(i % 7), f'c{i % 3}', expense_date=date, added_date=date))
+    where = {'expense_date': Range(start + timedelta(days=3), start + timedelta(days=60))}
+    expected = memory_repo.aggregate('amount', func, group_by, where)
+    assert repo.aggregate('amount', func, group_by, where) == pytest.approx(expected)
+    repo.close()
+
+
+def test_aggregate_errors(tmp_path):
+    repo = SQLiteRepository(Expense, str(tmp_path / 'test.db'))
+    with pytest.raises(ValueError):
+        repo.aggregate('amount', 'median')
+    with pytest.raises(ValueError):
+        repo.aggregate('amount', group_by='category:day')
+    assert repo.aggregate('amount') == {(): 0.0}
+    assert repo.aggregate('amount', 'avg') == {}
+    assert repo.aggregate('expense_date', 'max') == {}
+    repo.close()
+
+
+def test_rows_to_objects_in_field_order(tmp_path):
+    @dataclass
+    class PkFirst:
+        pk: int = 0
+        name: str = ''
+
+    class Plain:
+        def __init__(self, name, pk=0):
+            self.name = name
+            self.pk = pk
+
+    Plain.__annotations__ = {'name': str, 'pk': int}
+
+    for model, obj in ((PkFirst, PkFirst(name='a')), (Plain, Plain('a'))):
+        repo = SQLiteRepository(model, str(tmp_path / f'{model.__name__}.db'))
+        pk = repo.add(obj)
+        loaded = repo.get(pk)
+        assert (loaded.pk, loaded.name) == (pk, 'a')
+        repo.close()
+    repo = SQLiteRepository(Expense, str(tmp_path / 'expense.db'))
+    expense = Expense(10, 'food', datetime(2024, 1, 2), datetime(2024, 1, 3), 'x')
+    repo.add(expense)
+    assert repo.get_all() == [expense]
+    repo.close()
@@ -0,0 +1,96 @@
+import sqlite3
+import threading
+from datetime import datetime
+
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.unit_of_work import UnitOfWork
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.expense import Expense
+
+import pytest
+
+
+@pytest.fixture(params=[None, 16])
+def repos(request, tmp_path):
+    repos = SQLiteRepository.repository_factory(
+        models=[Expense, Budget], db_file=str(tmp_path / 'uow.db'),
+        cache_size=request.param
+    )
+    yield repos
+    repos[Expense].close()
+
+
+def count(db_file, table):
+    with sqlite3.connect(db_file) as con:
+        return con.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+
+def test_commit_once_at_end(repos, tmp_path):
+    db_file = str(tmp_path / 'uow.db')
+    uow = UnitOfWork(repos)
+    assert len(uow.pools) == 1
+    with uow:
+        repos[Expense].add(Expense(1, 'a'))
+        repos[Budget].add(Budget(0, 100, 'День', datetime(2024, 1, 2)))
+        repos[Budget].increment('amount', 1)
+        # другое соединение не видит незафиксированных изменений
+        assert count(db_file, 'expense') == 0
+    assert count(db_file, 'expense') == 1
+    assert repos[Budget].get_all()[0].amount == 1
+
+
+def test_rollback_on_error(repos):
+    repos[Budget].add(Budget(0, 100, 'День', datetime(2024, 1, 2)))
+    with pytest.raises(RuntimeError):
+        with UnitOfWork(repos):
+            repos[Expense].add(Expense(1, 'a'))
+            repos[Budget].increment('amount', 1)
+            assert len(repos[Expense].get_all()) == 1
+            raise RuntimeError
+    assert repos[Expense].get_all() == []
+    assert repos[Budget].get_all()[0].amount == 0
+
+
+def test_nested_units_share_transaction(repos):
+    uow = UnitOfWork(repos)
+    with pytest.raises(RuntimeError):
+        with uow:
+            with uow:
+                repos[Expense].add(Expense(1, 'a'))
+            raise RuntimeError
+    assert repos[Expense].get_all() == []
+    with uow:
+        with uow:
+            repos[Expense].add(Expense(2, 'b'))
+    assert [e.amount for e in repos[Expense].get_all()] == [2]
+
+
+def test_concurrent_reader_does_not_leave_stale_cache(repos):
+    expense = Expense(1, 'a')
+    repos[Expense].add(expense)
+    seen = []
+
+    def reader():
+        seen.append(repos[Expense].get(expense.pk).amount)
+        seen.append(repos[Expense].get_all()[0].amount)
+
+    with UnitOfWork(repos):
+        expense.amount = 99
+        repos[Expense].update(expense)
+        # другой поток читает зафиксированную версию и может ее закэшировать
+        thread = threading.Thread(target=reader)
+        thread.start()
+        thread.join()
+    assert seen == [1, 1]
+    assert repos[Expense].get(expense.pk).amount == 99
+    assert repos[Expense].get_all()[0].amount == 99
+
+
+def test_memory_repositories_are_accepted():
+    repo = MemoryRepository()
+    uow = UnitOfWork([repo])
+    assert uow.pools == []
+    with uow:
+        repo.add(Expense(1, 'a'))
+    assert len(repo.get_all()) == 1
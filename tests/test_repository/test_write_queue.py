@@ -0,0 +1,84 @@
+import sqlite3
+import threading
+
+from bookkeeper.repository.connection_pool import ConnectionPool, WAL_PRAGMAS
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.repository.write_queue import WriteQueue
+from bookkeeper.models.category import Category
+
+import pytest
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'queue.db'), pragmas=WAL_PRAGMAS)
+    with pool.connection() as con:
+        con.execute('CREATE TABLE t (value INTEGER UNIQUE)')
+    yield pool
+    pool.close()
+
+
+def insert(pool, value):
+    with pool.connection() as con:
+        con.execute('INSERT INTO t VALUES (?)', (value,))
+    return value
+
+
+def values(pool):
+    with pool.connection() as con:
+        return sorted(row[0] for row in con.execute('SELECT value FROM t'))
+
+
+def test_operations_are_grouped(pool):
+    write_queue = WriteQueue(pool, max_batch=50, max_delay=0.05)
+    futures = [write_queue.submit(insert, pool, i) for i in range(20)]
+    assert [f.result(5) for f in futures] == list(range(20))
+    write_queue.close()
+    assert values(pool) == list(range(20))
+    assert write_queue.batches < 20
+
+
+def test_failed_operation_is_rolled_back_alone(pool):
+    write_queue = WriteQueue(pool, max_delay=0.05)
+    futures = [write_queue.submit(insert, pool, value) for value in (1, 1, 2)]
+    assert futures[0].result(5) == 1
+    with pytest.raises(sqlite3.IntegrityError):
+        futures[1].result(5)
+    assert futures[2].result(5) == 2
+    write_queue.close()
+    assert values(pool) == [1, 2]
+
+
+def test_close_drains_queue(pool):
+    write_queue = WriteQueue(pool)
+    for i in range(10):
+        write_queue.submit(insert, pool, i)
+    write_queue.close()
+    assert values(pool) == list(range(10))
+    with pytest.raises(RuntimeError):
+        write_queue.submit(insert, pool, 100)
+
+
+def test_repository_writes_from_many_threads(tmp_path):
+    repos = SQLiteRepository.repository_factory(
+        models=[Category], db_file=str(tmp_path / 'repo.db'),
+        pragmas=WAL_PRAGMAS, group_commit=True
+    )
+    repo = repos[Category]
+
+    def worker(n):
+        for i in range(25):
+            repo.add(Category(f'{n}-{i}'))
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    objs = repo.get_all()
+    assert len(objs) == 200
+    assert sorted(c.pk for c in objs) == list(range(1, 201))
+    assert repo.write_queue.batches < 200
+    repo.add_many([Category('a'), Category('b')])
+    assert len(repo.get_all()) == 202
+    repo.close()
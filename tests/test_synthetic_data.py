@@ -0,0 +1,93 @@
+from collections import Counter
+
+from bookkeeper.budget_engine import BudgetEngine
+from bookkeeper.models.budget import Budget
+from bookkeeper.models.category import Category
+from bookkeeper.models.expense import Expense
+from bookkeeper.repository.memory_repository import MemoryRepository
+from bookkeeper.repository.sqlite_repository import SQLiteRepository
+from bookkeeper.synthetic_data import (
+    START, generate_budgets, generate_categories, iter_expenses,
+    write_repositories, write_sqlite
+)
+from bookkeeper.utils import CategoryTree
+
+import pytest
+
+
+def test_categories_tree():
+    categories = generate_categories(500, depth=3, fanout=4, seed=1)
+    assert [c.pk for c in categories] == list(range(1, 501))
+    assert len({c.name for c in categories}) == 500
+    seen = set()
+    for category in categories:
+        assert category.parent is None or category.parent in seen
+        seen.add(category.pk)
+    tree = CategoryTree.from_list(categories)
+    depths = {}
+    for category in categories:
+        parent = tree.get_parent(category.pk)
+        depths[category.pk] = 1 if parent is None else depths[parent] + 1
+    assert max(depths.values()) == 3
+
+
+def test_categories_depth_must_be_positive():
+    with pytest.raises(ValueError):
+        generate_categories(10, depth=0)
+
+
+def test_deterministic():
+    categories = generate_categories(50, seed=3)
+    assert categories == generate_categories(50, seed=3)
+    assert categories != generate_categories(50, seed=4)
+    first = list(iter_expenses(categories, 100, seed=3))
+    assert first == list(iter_expenses(categories, 100, seed=3))
+    assert generate_budgets(10, seed=3) == generate_budgets(10, seed=3)
+
+
+def test_expenses_skewed_and_in_period():
+    categories = generate_categories(100)
+    expenses = list(iter_expenses(categories, 5000, days=30))
+    assert len(expenses) == 5000
+    assert all(START <= e.expense_date <= START.replace(day=31) for e in expenses)
+    counts = Counter(e.category for e in expenses).most_common()
+    assert counts[0][1] > 10 * counts[-1][1]
+    weekend = sum(e.expense_date.weekday() >= 5 for e in expenses) / len(expenses)
+    assert weekend > 2 / 7
+
+
+def test_write_repositories_budget_amounts():
+    repos = {model: MemoryRepository() for model in (Category, Expense, Budget)}
+    categories = generate_categories(30)
+    budgets = generate_budgets(20, days=30)
+    write_repositories(repos, categories, iter_expenses(categories, 2000, days=30),
+                       budgets, batch_size=300)
+    assert len(repos[Category].get_all()) == 30
+    assert len(repos[Expense].get_all()) == 2000
+    engine = BudgetEngine(repos[Budget], repos[Expense])
+    for budget in repos[Budget].get_all():
+        assert budget.amount == pytest.approx(
+            engine.spent(budget.start_date, budget.expiration_date)
+        )
+
+
+def test_write_repositories_needs_empty_category_repository():
+    repos = {model: MemoryRepository() for model in (Category, Expense, Budget)}
+    repos[Category].add(Category('old'))
+    with pytest.raises(ValueError):
+        write_repositories(repos, generate_categories(3), [], [])
+
+
+def test_write_sqlite(tmp_path):
+    db_file = str(tmp_path / 'synthetic.db')
+    categories = generate_categories(40)
+    budgets = generate_budgets(10, days=30)
+    expenses = list(iter_expenses(categories, 500, days=30))
+    write_sqlite(db_file, categories, iter(expenses), budgets, batch_size=70)
+    write_sqlite(db_file, categories, iter(expenses), budgets)
+    repos = SQLiteRepository.repository_factory([Category, Expense, Budget], db_file)
+    assert repos[Category].get_all() == categories
+    assert repos[Expense].total('amount') == pytest.approx(
+        sum(e.amount for e in expenses))
+    assert [b.amount for b in repos[Budget].get_all()] == [b.amount for b in budgets]
+    repos[Category].close()
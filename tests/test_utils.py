@@ -3,7 +3,10 @@ from textwrap import dedent
 
 import pytest
 
-from bookkeeper.utils import read_tree
+from bookkeeper.models.category import Category
+from bookkeeper.utils import (
+    CategoryTree, build_dict_tree_from_list, iter_tree, read_tree
+)
 
 
 def test_create_tree():
@@ -71,3 +74,95 @@ def test_with_file():
             ('child2', 'parent1'),
             ('parent2', None)
         ]
+
+
+@pytest.fixture
+def categories():
+    return [
+        Category('мясные продукты', 2, 4),
+        Category('продукты', None, 1),
+        Category('мясо', 1, 2),
+        Category('сырое мясо', 2, 3),
+        Category('книги', None, 5),
+    ]
+
+
+def test_build_dict_tree_unsorted(categories):
+    assert build_dict_tree_from_list(categories) == {
+        1: {'name': 'продукты',
+            2: {'name': 'мясо',
+                4: {'name': 'мясные продукты'},
+                3: {'name': 'сырое мясо'}}},
+        5: {'name': 'книги'},
+    }
+
+
+def test_category_tree_lookup(categories):
+    tree = CategoryTree.from_list(categories)
+    assert len(tree) == 5
+    assert 4 in tree
+    assert tree.get(4).name == 'мясные продукты'
+    assert tree.get(100) is None
+    assert tree.get_parent(4) == 2
+    assert tree.get_parent(1) is None
+    assert [node.pk for node in tree.roots()] == [1, 5]
+    with pytest.raises(KeyError):
+        tree.add(1, 'дубль')
+
+
+def test_category_tree_rename_move(categories):
+    tree = CategoryTree.from_list(categories)
+    tree.rename(5, 'журналы')
+    tree.move(2, 5)
+    assert tree.to_dict() == {
+        1: {'name': 'продукты'},
+        5: {'name': 'журналы',
+            2: {'name': 'мясо',
+                4: {'name': 'мясные продукты'},
+                3: {'name': 'сырое мясо'}}},
+    }
+    with pytest.raises(ValueError):
+        tree.move(5, 4)
+    tree.move(2, None)
+    assert [node.pk for node in tree.roots()] == [1, 5, 2]
+
+
+def test_category_tree_delete_subtree(categories):
+    tree = CategoryTree.from_list(categories)
+    assert sorted(tree.delete(2)) == [2, 3, 4]
+    assert len(tree) == 2
+    assert 3 not in tree
+    assert tree.to_dict() == {1: {'name': 'продукты'}, 5: {'name': 'книги'}}
+
+
+def test_category_tree_waits_for_parent():
+    tree = CategoryTree()
+    tree.add(2, 'мясо', 1)
+    assert tree.to_dict() == {}
+    tree.add(1, 'продукты')
+    assert tree.to_dict() == {1: {'name': 'продукты', 2: {'name': 'мясо'}}}
+
+
+def test_iter_tree_is_lazy():
+    def lines():
+        yield 'parent'
+        yield '    child'
+        raise AssertionError('read too far')
+
+    pairs = iter_tree(lines())
+    assert next(pairs) == ('parent', None)
+    assert next(pairs) == ('child', 'parent')
+
+
+def test_category_tree_children_and_attached(categories):
+    tree = CategoryTree.from_list(categories)
+    assert list(tree.children(None)) == [1, 5]
+    assert list(tree.children(2)) == [4, 3]
+    assert tree.children(100) == {}
+    assert tree.is_attached(4)
+    tree.add(7, 'сироты', 6)
+    tree.add(8, 'внуки', 7)
+    assert not tree.is_attached(8)
+    assert not tree.is_attached(100)
+    tree.move(7, 5)
+    assert tree.is_attached(8)
@@ -0,0 +1,112 @@
+"""
+Тесты модели дерева категорий (без графического интерфейса)
+"""
+import pytest
+
+from bookkeeper.models.category import Category
+from bookkeeper.utils import CategoryTree
+from bookkeeper.view.categories_page import CategoryTreeModel
+
+
+@pytest.fixture
+def model():
+    return CategoryTreeModel(CategoryTree.from_list([
+        Category('еда', None, 1), Category('мясо', 1, 2), Category('рыба', 1, 3),
+        Category('овощи', 1, 4), Category('книги', None, 5),
+    ]))
+
+
+@pytest.fixture
+def signals(model):
+    """ Сигналы модели в виде (название, id родителя, первая, последняя строка) """
+    events = []
+
+    def record(name):
+        return lambda parent, first, last: events.append(
+            (name, model._pk(parent), first, last))
+
+    for name in ('rowsAboutToBeInserted', 'rowsInserted',
+                 'rowsAboutToBeRemoved', 'rowsRemoved'):
+        getattr(model, name).connect(record(name))
+    return events
+
+
+def names(model, parent=None):
+    """ Названия строк потомков parent, прочитанные через индексы модели """
+    parent_index = model._index_of(parent)
+    result = []
+    for row in range(model.rowCount(parent_index)):
+        index = model.index(row, 0, parent_index)
+        # строка и родитель индекса согласованы с моделью
+        assert model.parent(index) == parent_index
+        assert model._index_of(model._pk(index)).row() == row
+        result.append(model.data(index))
+    return result
+
+
+def test_rows(model):
+    assert names(model) == ['еда', 'книги']
+    assert names(model, 1) == ['мясо', 'рыба', 'овощи']
+    assert names(model, 5) == []
+    assert model.data(model.index(1, 1, model._index_of(1))) == '3'
+    assert not model.index(3, 0, model._index_of(1)).isValid()
+
+
+def test_add(model, signals):
+    names(model, 1)
+    model.category_added(6, 'фрукты', 1)
+    assert signals == [('rowsAboutToBeInserted', 1, 3, 3), ('rowsInserted', 1, 3, 3)]
+    assert names(model, 1) == ['мясо', 'рыба', 'овощи', 'фрукты']
+    signals.clear()
+    model.category_added(7, 'журналы', None)
+    assert signals == [('rowsAboutToBeInserted', None, 2, 2),
+                       ('rowsInserted', None, 2, 2)]
+    assert names(model) == ['еда', 'книги', 'журналы']
+
+
+def test_add_to_detached_parent(model, signals):
+    model.category_added(8, 'сыр', 7)
+    assert signals == []
+    model.category_added(7, 'молочное', 1)
+    assert names(model, 1) == ['мясо', 'рыба', 'овощи', 'молочное']
+    assert names(model, 7) == ['сыр']
+
+
+def test_rename(model, signals):
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append(
+        (model._pk(first), first.row())))
+    model.category_renamed(3, 'морепродукты')
+    assert changed == [(3, 1)]
+    assert signals == []
+    assert names(model, 1) == ['мясо', 'морепродукты', 'овощи']
+
+
+def test_delete(model, signals):
+    names(model, 1)
+    model.category_deleted(3)
+    assert signals == [('rowsAboutToBeRemoved', 1, 1, 1), ('rowsRemoved', 1, 1, 1)]
+    # строки следующих потомков сдвигаются
+    assert names(model, 1) == ['мясо', 'овощи']
+    assert model._index_of(4).row() == 1
+    signals.clear()
+    model.category_deleted(1)
+    assert signals == [('rowsAboutToBeRemoved', None, 0, 0),
+                       ('rowsRemoved', None, 0, 0)]
+    assert names(model) == ['книги']
+    assert 2 not in model.tree and 4 not in model.tree
+
+
+def test_move(model):
+    moved = []
+    model.rowsMoved.connect(lambda parent, first, last, destination, row: moved.append(
+        (model._pk(parent), first, model._pk(destination), row)))
+    names(model, 1)
+    names(model, 5)
+    model.category_moved(2, 5)
+    assert moved == [(1, 0, 5, 0)]
+    assert names(model, 1) == ['рыба', 'овощи']
+    assert names(model, 5) == ['мясо']
+    with pytest.raises(ValueError):
+        model.category_moved(1, 3)
+    assert names(model, 1) == ['рыба', 'овощи']
@@ -0,0 +1,137 @@
+"""
+Тесты модели таблицы расходов (без графического интерфейса)
+"""
+from datetime import datetime
+
+import pytest
+
+from bookkeeper.models.expense import Expense
+from bookkeeper.view.expenses_page import ExpensesTableModel
+
+
+class Presenter:
+    """ Страницы расходов и сохранение правок с ручным завершением """
+
+    def __init__(self, count: int) -> None:
+        self.expenses = {pk: Expense(float(pk), 'food', datetime(2023, 1, 1),
+                                     datetime(2023, 1, 1), '', pk)
+                         for pk in range(1, count + 1)}
+        self.requests: list[int] = []
+        self.edits: list[dict] = []
+
+    def get_page(self, after_pk: int, limit: int) -> list[Expense]:
+        self.requests.append(after_pk)
+        pks = [pk for pk in sorted(self.expenses) if pk > after_pk][:limit]
+        return [self.expenses[pk] for pk in pks]
+
+    def edit(self, pk, amount, category, expense_date, comment, on_saved, on_error):
+        self.edits.append({'pk': pk, 'amount': amount,
+                           'on_saved': on_saved, 'on_error': on_error})
+
+
+@pytest.fixture
+def presenter():
+    return Presenter(25)
+
+
+def make_model(presenter, errors=None, max_pages=2):
+    return ExpensesTableModel(page_getter=presenter.get_page,
+                              expenses_editor=presenter.edit,
+                              error_handler=errors.append if errors is not None else None,
+                              batch_size=10, max_pages=max_pages)
+
+
+def fetch_all(model):
+    while model.canFetchMore():
+        model.fetchMore()
+
+
+def amount(model, row):
+    return model.data(model.index(row, 1))
+
+
+def test_rows_across_pages(presenter):
+    model = make_model(presenter, max_pages=10)
+    inserted = []
+    model.rowsInserted.connect(lambda parent, first, last: inserted.append((first, last)))
+    assert model.rowCount() == 0
+    fetch_all(model)
+    assert inserted == [(0, 9), (10, 19), (20, 24)]
+    assert model.rowCount() == 25
+    assert not model.canFetchMore()
+    assert presenter.requests == [0, 10, 20]
+    assert [amount(model, row) for row in (0, 9, 10, 19, 20, 24)] == [
+        '1.0', '10.0', '11.0', '20.0', '21.0', '25.0'
+    ]
+    assert model.data(model.index(3, 0)) == '01-01-2023'
+    assert model.data(model.index(3, 2)) == 'Food'
+
+
+def test_pages_evicted_and_reloaded(presenter):
+    model = make_model(presenter, max_pages=2)
+    fetch_all(model)
+    assert len(model._pages) == 2
+    presenter.requests.clear()
+    assert amount(model, 5) == '6.0'
+    # страница 0 перечитана по ключу, вытеснена дальняя от нее страница 1
+    assert presenter.requests == [0]
+    assert sorted(model._pages) == [0, 2]
+    assert amount(model, 15) == '16.0'
+    assert presenter.requests == [0, 10]
+    assert sorted(model._pages) == [1, 2]
+    assert sum(len(page) for page in model._pages.values()) <= 20
+
+
+def test_edit_shown_before_save(presenter):
+    model = make_model(presenter)
+    fetch_all(model)
+    changed = []
+    model.dataChanged.connect(lambda first, last: changed.append(first.row()))
+    assert model.setData(model.index(20, 1), '99')
+    assert amount(model, 20) == '99.0'
+    assert changed == [20]
+    edit = presenter.edits.pop()
+    assert (edit['pk'], edit['amount']) == (21, 99.0)
+    edit['on_saved']()
+    assert amount(model, 20) == '99.0'
+    assert model._saved == {}
+
+
+def test_failed_edit_rolled_back(presenter):
+    model = make_model(presenter)
+    fetch_all(model)
+    model.setData(model.index(20, 1), '99')
+    presenter.edits.pop()['on_error'](RuntimeError('database is locked'))
+    assert amount(model, 20) == '21.0'
+    assert model._saved == {}
+
+
+def test_failed_edit_rolled_back_to_last_saved(presenter):
+    model = make_model(presenter)
+    fetch_all(model)
+    model.setData(model.index(20, 1), '1')
+    model.setData(model.index(20, 1), '2')
+    first, second = presenter.edits
+    first['on_saved']()
+    second['on_error'](RuntimeError())
+    assert amount(model, 20) == '1.0'
+
+
+def test_wrong_value_not_saved(presenter):
+    errors = []
+    model = make_model(presenter, errors)
+    fetch_all(model)
+    assert not model.setData(model.index(0, 0), '2023-01-01')
+    assert not model.setData(model.index(0, 1), 'много')
+    assert len(errors) == 2
+    assert presenter.edits == []
+    assert amount(model, 0) == '1.0'
+
+
+def test_expense_added_after_last_page(presenter):
+    model = make_model(presenter)
+    fetch_all(model)
+    expense = Expense(7.0, 'food', datetime(2023, 1, 2), datetime(2023, 1, 2), '', 26)
+    model.expense_added(expense)
+    assert model.rowCount() == 26
+    assert amount(model, 25) == '7.0'